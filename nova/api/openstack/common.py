@@ -48,6 +48,13 @@ osapi_opts = [
     cfg.StrOpt('osapi_glance_link_prefix',
                help='Base URL that will be presented to users in links '
                     'to glance resources'),
+    cfg.BoolOpt('osapi_server_page_cursors',
+                default=False,
+                help='Use opaque cursors holding the sort key values of the '
+                     'last server as the marker of the next link of server '
+                     'lists, instead of the server uuid. The database then '
+                     'does not have to look the marker server up. Uuid '
+                     'markers are accepted either way'),
 ]
 CONF = cfg.CONF
 CONF.register_opts(osapi_opts)
@@ -494,13 +501,8 @@ class ViewBuilder(object):
             int(request.params.get("limit", CONF.osapi_max_limit)),
             CONF.osapi_max_limit)
         if max_items and max_items == len(items):
-            last_item = items[-1]
-            if id_key in last_item:
-                last_item_id = last_item[id_key]
-            elif 'id' in last_item:
-                last_item_id = last_item["id"]
-            else:
-                last_item_id = last_item["flavorid"]
+            last_item_id = self._get_collection_marker(request, items[-1],
+                                                       id_key)
             links.append({
                 "rel": "next",
                 "href": self._get_next_link(request,
@@ -509,6 +511,15 @@ class ViewBuilder(object):
             })
         return links
 
+    def _get_collection_marker(self, request, last_item, id_key):
+        """Return the marker of the page following last_item."""
+        if id_key in last_item:
+            return last_item[id_key]
+        elif 'id' in last_item:
+            return last_item["id"]
+        else:
+            return last_item["flavorid"]
+
     def _update_link_prefix(self, orig_url, prefix):
         if not prefix:
             return orig_url
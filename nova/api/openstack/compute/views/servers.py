@@ -16,6 +16,7 @@
 
 import hashlib
 
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import timeutils
 
@@ -28,6 +29,8 @@ from nova.objects import base as obj_base
 from nova import utils
 
 
+CONF = cfg.CONF
+CONF.import_opt('osapi_server_page_cursors', 'nova.api.openstack.common')
 LOG = logging.getLogger(__name__)
 
 
@@ -145,6 +148,29 @@ class ViewBuilder(common.ViewBuilder):
 
         return servers_dict
 
+    def _get_collection_marker(self, request, instance, id_key):
+        """Return a keyset pagination cursor for the last server of a page.
+
+        The cursor holds the values of the sort keys of the server so that
+        the database does not have to look the marker server up again. The
+        uuid is used instead when a sort key is not loaded on the server.
+        """
+        if (not CONF.osapi_server_page_cursors or
+                not isinstance(instance, obj_base.NovaObject)):
+            return super(ViewBuilder, self)._get_collection_marker(
+                request, instance, id_key)
+
+        sort_keys, _sort_dirs = common.get_sort_params(request.params)
+        values = {'uuid': instance.uuid}
+        # NOTE: created_at and id are always appended to the sort keys by
+        # the database API.
+        for key in set(sort_keys) | set(['created_at', 'id']):
+            if (key not in instance.fields or
+                    not instance.obj_attr_is_set(key)):
+                return instance.uuid
+            values[key] = instance[key]
+        return utils.encode_page_cursor(values)
+
     @staticmethod
     def _get_metadata(instance):
         # FIXME(danms): Transitional support for objects
@@ -64,6 +64,7 @@ import netaddr
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
+from oslo_serialization import jsonutils
 from oslo_utils import importutils
 import six
 
@@ -939,7 +940,15 @@ class DbCommands(object):
 
     @args('--max_rows', metavar='<number>',
             help='Maximum number of deleted rows to archive')
-    def archive_deleted_rows(self, max_rows):
+    @args('--batch_size', metavar='<number>', default=1000,
+            help='Maximum number of rows to archive per transaction')
+    @args('--concurrency', metavar='<number>', default=1,
+            help='Number of tables to archive at a time')
+    @args('--progress_file', metavar='<path>',
+            help='File recording the progress of each table, to resume an '
+                 'interrupted or max_rows bounded run from')
+    def archive_deleted_rows(self, max_rows, batch_size=1000, concurrency=1,
+                             progress_file=None):
         """Move up to max_rows deleted rows from production tables to shadow
         tables.
         """
@@ -948,8 +957,35 @@ class DbCommands(object):
             if max_rows < 0:
                 print(_("Must supply a positive value for max_rows"))
                 return(1)
+        batch_size = int(batch_size)
+        concurrency = int(concurrency)
+        if batch_size < 1 or concurrency < 1:
+            print(_("Must supply a positive value for batch_size and "
+                    "concurrency"))
+            return(1)
+        progress = {}
+        if progress_file and os.path.exists(progress_file):
+            with open(progress_file) as f:
+                progress = jsonutils.load(f)
         admin_context = context.get_admin_context()
-        db.archive_deleted_rows(admin_context, max_rows)
+        try:
+            db.archive_deleted_rows(admin_context, max_rows,
+                                    batch_size=batch_size,
+                                    concurrency=concurrency,
+                                    progress=progress)
+        finally:
+            if progress_file:
+                with open(progress_file, 'w') as f:
+                    jsonutils.dump(progress, f)
+        for tablename in sorted(progress):
+            entry = progress[tablename]
+            if not entry['rows']:
+                continue
+            print(_("%(table)s: %(rows)d rows in %(seconds).1f seconds "
+                    "(%(rate).1f rows/s)") %
+                  {'table': tablename, 'rows': entry['rows'],
+                   'seconds': entry['seconds'],
+                   'rate': entry['rows'] / max(entry['seconds'], 0.001)})
 
     @args('--delete', action='store_true', dest='delete',
           help='If specified, automatically delete any records found where '
@@ -37,7 +37,6 @@ import uuid
 from cinderclient import exceptions as cinder_exception
 import eventlet.event
 from eventlet import greenthread
-import eventlet.semaphore
 import eventlet.timeout
 from keystoneclient import exceptions as keystone_exception
 from oslo_config import cfg
@@ -58,6 +57,7 @@ from nova.compute import build_results
 from nova.compute import power_state
 from nova.compute import resource_tracker
 from nova.compute import rpcapi as compute_rpcapi
+from nova.compute import stats as compute_stats
 from nova.compute import task_states
 from nova.compute import utils as compute_utils
 from nova.compute import vm_states
@@ -127,6 +127,34 @@ compute_opts = [
     cfg.IntOpt('max_concurrent_builds',
                default=10,
                help='Maximum number of instance builds to run concurrently'),
+    cfg.BoolOpt('build_phase_events',
+                default=False,
+                help='Record an instance action event for each phase of '
+                     'an instance build (claim, network, block_device, '
+                     'spawn). This costs two extra database writes per '
+                     'phase; the build phase histograms are kept '
+                     'regardless'),
+    cfg.IntOpt('max_concurrent_network_allocations',
+               default=0,
+               help='Maximum number of network allocations run concurrently '
+                    'by instance builds. A value of 0 means unlimited. '
+                    'Allocations run in the background while the image is '
+                    'fetched, so this only bounds the load on the network '
+                    'service'),
+    cfg.IntOpt('max_concurrent_disk_preps',
+               default=0,
+               help='Maximum number of instance builds preparing block '
+                    'devices concurrently. A value of 0 means unlimited'),
+    cfg.IntOpt('max_concurrent_spawns',
+               default=0,
+               help='Maximum number of instance builds running the virt '
+                    'driver spawn concurrently. A value of 0 means '
+                    'unlimited'),
+    cfg.IntOpt('init_instance_workers',
+               default=1,
+               help='Number of instances whose state is restored in '
+                    'parallel when the compute service starts. The running '
+                    'instances are restored first.'),
     cfg.IntOpt('block_device_allocate_retries',
                default=60,
                help='Number of times to retry block device'
@@ -148,6 +176,13 @@ interval_opts = [
                default=60,
                help="Number of seconds between instance network information "
                     "cache updates"),
+    cfg.IntOpt('heal_instance_info_cache_batch_size',
+               default=1,
+               help='Number of instances whose network information cache is '
+                    'updated on each run of the periodic task. With more '
+                    'than one, the network information of the instances is '
+                    'retrieved at once and only the caches which changed '
+                    'are written back.'),
     cfg.IntOpt('reclaim_instance_interval',
                default=0,
                help='Interval in seconds for reclaiming deleted instances'),
@@ -180,6 +215,12 @@ interval_opts = [
                     'that its view of instances is in sync with nova. If the '
                     'CONF option `scheduler_tracks_instance_changes` is '
                     'False, changing this option will have no effect.'),
+    cfg.IntOpt('build_phase_stats_interval',
+               default=600,
+               help='Interval in seconds for emitting the histograms of '
+                    'the time spent in each phase of instance builds as a '
+                    'compute.metrics.build_phases notification. Set to -1 '
+                    'to disable.'),
     cfg.IntOpt('update_resources_interval',
                default=0,
                help='Interval in seconds for updating compute resources. A '
@@ -453,6 +494,25 @@ def object_compat(function):
     return decorated_function
 
 
+def _power_state_in_sync(vm_state, vm_power_state):
+    """Return True if _sync_instance_power_state() would do nothing for an
+    instance in vm_state whose DB power state matches vm_power_state.
+    """
+    if vm_state == vm_states.ACTIVE:
+        return vm_power_state == power_state.RUNNING
+    elif vm_state == vm_states.STOPPED:
+        return vm_power_state in (power_state.NOSTATE,
+                                  power_state.SHUTDOWN,
+                                  power_state.CRASHED)
+    elif vm_state == vm_states.PAUSED:
+        return vm_power_state not in (power_state.SHUTDOWN,
+                                      power_state.CRASHED)
+    elif vm_state in (vm_states.SOFT_DELETED, vm_states.DELETED):
+        return vm_power_state in (power_state.NOSTATE,
+                                  power_state.SHUTDOWN)
+    return True
+
+
 class InstanceEvents(object):
     def __init__(self):
         self._events = {}
@@ -635,6 +695,7 @@ class ComputeVirtAPI(virtapi.VirtAPI):
                 # but don't stick around if not.
                 deadline = 0
         yield
+        start = time.time()
         with eventlet.timeout.Timeout(deadline):
             for event_name, event in events.items():
                 actual_event = event.wait()
@@ -643,6 +704,13 @@ class ComputeVirtAPI(virtapi.VirtAPI):
                 decision = error_callback(event_name, instance)
                 if decision is False:
                     break
+        # NOTE: Reboots, resizes and interface attachments wait for the
+        # VIFs too, only the waits of a build are part of its phases.
+        if (any(event_name.startswith('network-vif-plugged')
+                for event_name in events) and
+                instance.uuid in self._compute._spawning_instances):
+            self._compute._build_timings.add('vif_plugged',
+                                             time.time() - start)
 
 
 class ComputeManager(manager.Manager):
@@ -664,6 +732,7 @@ class ComputeManager(manager.Manager):
         self._last_host_check = 0
         self._last_bw_usage_poll = 0
         self._bw_usage_supported = True
+        self._last_vol_usages = {}
         self._last_bw_usage_cell_update = 0
         self.compute_api = compute.API()
         self.compute_rpcapi = compute_rpcapi.ComputeAPI()
@@ -679,11 +748,20 @@ class ComputeManager(manager.Manager):
         self._sync_power_pool = eventlet.GreenPool()
         self._syncs_in_progress = {}
         self.send_instance_updates = CONF.scheduler_tracks_instance_changes
-        if CONF.max_concurrent_builds != 0:
-            self._build_semaphore = eventlet.semaphore.Semaphore(
-                CONF.max_concurrent_builds)
-        else:
-            self._build_semaphore = compute_utils.UnlimitedSemaphore()
+        self._build_semaphore = compute_utils.get_semaphore(
+            CONF.max_concurrent_builds)
+        # NOTE: each phase of a build has its own limit on top of
+        # max_concurrent_builds so that a burst of boots can keep the
+        # host's disks busy without flooding the network service.
+        self._network_semaphore = compute_utils.get_semaphore(
+            CONF.max_concurrent_network_allocations)
+        self._disk_prep_semaphore = compute_utils.get_semaphore(
+            CONF.max_concurrent_disk_preps)
+        self._spawn_semaphore = compute_utils.get_semaphore(
+            CONF.max_concurrent_spawns)
+        self._build_timings = compute_stats.PhaseTimings()
+        # The uuids of the instances being spawned by a build
+        self._spawning_instances = set()
 
         super(ComputeManager, self).__init__(service_name="compute",
                                              *args, **kwargs)
@@ -1285,13 +1363,71 @@ class ComputeManager(manager.Manager):
         try:
             # checking that instance was not already evacuated to other host
             self._destroy_evacuated_instances(context)
-            for instance in instances:
-                self._init_instance(context, instance)
+            self._init_instances(context, instances)
         finally:
             if CONF.defer_iptables_apply:
                 self.driver.filter_defer_apply_off()
             self._update_scheduler_instance_info(context, instances)
 
+    @staticmethod
+    def _get_init_instance_priority(instance):
+        """Return the order in which instances are initialized.
+
+        Running instances come first, so that their networking and firewall
+        are restored as soon as possible, then the other active instances,
+        then the instances whose operations were interrupted.
+        """
+        if instance.task_state is not None:
+            return 3
+        if instance.vm_state == vm_states.ACTIVE:
+            if instance.power_state == power_state.RUNNING:
+                return 0
+            return 1
+        return 2
+
+    def _init_instances(self, context, instances):
+        """Initialize the instances of the host, init_instance_workers of
+        them at a time, and report the progress.
+        """
+        instances = sorted(instances, key=self._get_init_instance_priority)
+        total = len(instances)
+        if not total:
+            return
+        report_every = max(total // 10, 1)
+        progress = {'done': 0}
+        start = time.time()
+
+        def _init_instance(instance):
+            instance_start = time.time()
+            try:
+                self._init_instance(context, instance)
+            finally:
+                progress['done'] += 1
+                LOG.debug('Initialized instance in %.2f seconds',
+                          time.time() - instance_start, instance=instance)
+                if (progress['done'] % report_every == 0 and
+                        progress['done'] != total):
+                    LOG.info(_LI('Initialized %(done)d of %(total)d '
+                                 'instances'),
+                             {'done': progress['done'], 'total': total})
+
+        workers = min(CONF.init_instance_workers, total)
+        if workers > 1:
+            pool = eventlet.GreenPool(workers)
+            threads = [pool.spawn(_init_instance, instance)
+                       for instance in instances]
+            pool.waitall()
+            # Re-raise the failures like the serial initialization does
+            for thread in threads:
+                thread.wait()
+        else:
+            for instance in instances:
+                _init_instance(instance)
+
+        LOG.info(_LI('Initialized %(total)d instances in %(elapsed).2f '
+                     'seconds'), {'total': total,
+                                  'elapsed': time.time() - start})
+
     def cleanup_host(self):
         self.driver.register_event_listener(None)
         self.instance_events.cancel_all_events()
@@ -1534,12 +1670,14 @@ class ComputeManager(manager.Manager):
         retry_time = 1
         for attempt in range(1, attempts + 1):
             try:
-                nwinfo = self.network_api.allocate_for_instance(
-                        context, instance, vpn=is_vpn,
-                        requested_networks=requested_networks,
-                        macs=macs,
-                        security_groups=security_groups,
-                        dhcp_options=dhcp_options)
+                with self._network_semaphore:
+                    with self._build_phase(context, instance, 'network'):
+                        nwinfo = self.network_api.allocate_for_instance(
+                                context, instance, vpn=is_vpn,
+                                requested_networks=requested_networks,
+                                macs=macs,
+                                security_groups=security_groups,
+                                dhcp_options=dhcp_options)
                 LOG.debug('Instance network_info: |%s|', nwinfo,
                           instance=instance)
                 instance.system_metadata['network_allocated'] = 'True'
@@ -1965,7 +2103,9 @@ class ComputeManager(manager.Manager):
                 extra_usage_info={'image_name': image_name})
         try:
             rt = self._get_resource_tracker(node)
-            with rt.instance_claim(context, instance, limits):
+            with self._build_phase(context, instance, 'claim'):
+                claim = rt.instance_claim(context, instance, limits)
+            with claim:
                 # NOTE(russellb) It's important that this validation be done
                 # *after* the resource tracker instance claim, as that is where
                 # the host is set on the instance.
@@ -1983,10 +2123,20 @@ class ComputeManager(manager.Manager):
                             task_states.BLOCK_DEVICE_MAPPING)
                     block_device_info = resources['block_device_info']
                     network_info = resources['network_info']
-                    self.driver.spawn(context, instance, image,
-                                      injected_files, admin_password,
-                                      network_info=network_info,
-                                      block_device_info=block_device_info)
+                    # NOTE: network allocation is still running in the
+                    # background here, the driver fetches the image and
+                    # creates the disks before it waits for network_info.
+                    with self._spawn_semaphore:
+                        with self._build_phase(context, instance, 'spawn'):
+                            self._spawning_instances.add(instance.uuid)
+                            try:
+                                self.driver.spawn(context, instance, image,
+                                        injected_files, admin_password,
+                                        network_info=network_info,
+                                        block_device_info=block_device_info)
+                            finally:
+                                self._spawning_instances.discard(
+                                    instance.uuid)
         except (exception.InstanceNotFound,
                 exception.UnexpectedDeletingTaskStateError) as e:
             with excutils.save_and_reraise_exception():
@@ -2054,6 +2204,24 @@ class ComputeManager(manager.Manager):
                 extra_usage_info={'message': _('Success')},
                 network_info=network_info)
 
+    @contextlib.contextmanager
+    def _build_phase(self, context, instance, phase):
+        """Time one phase of an instance build.
+
+        The duration is added to the build phase histograms of the host
+        when the phase succeeds, and an instance action event is recorded
+        for it if build_phase_events is set.
+        """
+        start = time.time()
+        if CONF.build_phase_events:
+            event_name = 'compute_build_%s' % phase
+            with compute_utils.EventReporter(context, event_name,
+                                             instance.uuid):
+                yield
+        else:
+            yield
+        self._build_timings.add(phase, time.time() - start)
+
     @contextlib.contextmanager
     def _build_resources(self, context, instance, requested_networks,
             security_groups, image, block_device_mapping):
@@ -2088,8 +2256,10 @@ class ComputeManager(manager.Manager):
             instance.task_state = task_states.BLOCK_DEVICE_MAPPING
             instance.save()
 
-            block_device_info = self._prep_block_device(context, instance,
-                    block_device_mapping)
+            with self._disk_prep_semaphore:
+                with self._build_phase(context, instance, 'block_device'):
+                    block_device_info = self._prep_block_device(context,
+                            instance, block_device_mapping)
             resources['block_device_info'] = block_device_info
         except (exception.InstanceNotFound,
                 exception.UnexpectedDeletingTaskStateError):
@@ -4500,6 +4670,7 @@ class ComputeManager(manager.Manager):
                                                     wr_req, wr_bytes,
                                                     instance,
                                                     update_totals=True)
+                self._last_vol_usages.pop(volume_id, None)
 
         self._detach_volume(context, instance, bdm)
         connector = self.driver.get_volume_connector(instance)
@@ -5207,12 +5378,13 @@ class ComputeManager(manager.Manager):
         spacing=CONF.heal_instance_info_cache_interval)
     def _heal_instance_info_cache(self, context):
         """Called periodically.  On every call, try to update the
-        info_cache's network information for another instance by
+        info_cache's network information for other instances by
         calling to the network manager.
 
         This is implemented by keeping a cache of uuids of instances
-        that live on this host.  On each call, we pop one off of a
-        list, pull the DB record, and try the call to the network API.
+        that live on this host.  On each call, we pop
+        heal_instance_info_cache_batch_size of them off of a list, pull
+        the DB records, and try the call to the network API.
         If anything errors don't fail, as it's possible the instance
         has been deleted, etc.
         """
@@ -5220,8 +5392,9 @@ class ComputeManager(manager.Manager):
         if not heal_interval:
             return
 
+        batch_size = max(CONF.heal_instance_info_cache_batch_size, 1)
         instance_uuids = getattr(self, '_instance_uuids_to_heal', [])
-        instance = None
+        instances = []
 
         LOG.debug('Starting heal instance info cache')
 
@@ -5244,17 +5417,17 @@ class ComputeManager(manager.Manager):
                               'because it is being deleted.', instance=inst)
                     continue
 
-                if not instance:
-                    # Save the first one we find so we don't
-                    # have to get it again
-                    instance = inst
+                if len(instances) < batch_size:
+                    # Save the first ones we find so we don't
+                    # have to get them again
+                    instances.append(inst)
                 else:
                     instance_uuids.append(inst['uuid'])
 
             self._instance_uuids_to_heal = instance_uuids
         else:
-            # Find the next valid instance on the list
-            while instance_uuids:
+            # Find the next valid instances on the list
+            while instance_uuids and len(instances) < batch_size:
                 try:
                     inst = objects.Instance.get_by_uuid(
                             context, instance_uuids.pop(0),
@@ -5274,10 +5447,22 @@ class ComputeManager(manager.Manager):
                     LOG.debug('Skipping network cache update for instance '
                               'because it is being deleted.', instance=inst)
                 else:
-                    instance = inst
-                    break
+                    instances.append(inst)
 
-        if instance:
+        if len(instances) > 1:
+            try:
+                # Only the caches which changed are updated, the instances
+                # which are gone or failed to refresh are logged and skipped
+                nw_infos = self.network_api.get_instances_nw_info(context,
+                                                                  instances)
+                LOG.debug('Updated the network info_cache of %d instances',
+                          len(nw_infos))
+            except Exception:
+                LOG.error(_LE('An error occurred while refreshing the network '
+                              'cache of %d instances.'), len(instances),
+                          exc_info=True)
+        elif instances:
+            instance = instances[0]
             # We have an instance now to refresh
             try:
                 # Call to network API to get instance info.. this will
@@ -5540,26 +5725,34 @@ class ComputeManager(manager.Manager):
                 return
 
             refreshed = timeutils.utcnow()
+            uuids = list(set(bw_ctr['uuid'] for bw_ctr in bw_counters))
+            usages = self._get_bw_usages(context, uuids, start_time)
+            prev_usages = None
+            updates = []
             for bw_ctr in bw_counters:
-                # Allow switching of greenthreads between queries.
-                greenthread.sleep(0)
                 bw_in = 0
                 bw_out = 0
                 last_ctr_in = None
                 last_ctr_out = None
-                usage = objects.BandwidthUsage.get_by_instance_uuid_and_mac(
-                    context, bw_ctr['uuid'], bw_ctr['mac_address'],
-                    start_period=start_time, use_slave=True)
+                key = (bw_ctr['uuid'], bw_ctr['mac_address'])
+                usage = usages.get(key)
                 if usage:
+                    # NOTE: The usages of the top cell are only refreshed
+                    # on the passes which update cells, so the unchanged
+                    # usages are only skipped on the others.
+                    if (not update_cells and
+                            usage.last_ctr_in == bw_ctr['bw_in'] and
+                            usage.last_ctr_out == bw_ctr['bw_out']):
+                        continue
                     bw_in = usage.bw_in
                     bw_out = usage.bw_out
                     last_ctr_in = usage.last_ctr_in
                     last_ctr_out = usage.last_ctr_out
                 else:
-                    usage = (objects.BandwidthUsage.
-                             get_by_instance_uuid_and_mac(
-                        context, bw_ctr['uuid'], bw_ctr['mac_address'],
-                        start_period=prev_time, use_slave=True))
+                    if prev_usages is None:
+                        prev_usages = self._get_bw_usages(context, uuids,
+                                                          prev_time)
+                    usage = prev_usages.get(key)
                     if usage:
                         last_ctr_in = usage.last_ctr_in
                         last_ctr_out = usage.last_ctr_out
@@ -5578,16 +5771,26 @@ class ComputeManager(manager.Manager):
                     else:
                         bw_out += (bw_ctr['bw_out'] - last_ctr_out)
 
-                objects.BandwidthUsage(context=context).create(
-                                              bw_ctr['uuid'],
-                                              bw_ctr['mac_address'],
-                                              bw_in,
-                                              bw_out,
-                                              bw_ctr['bw_in'],
-                                              bw_ctr['bw_out'],
-                                              start_period=start_time,
-                                              last_refreshed=refreshed,
-                                              update_cells=update_cells)
+                updates.append({'uuid': bw_ctr['uuid'],
+                                'mac': bw_ctr['mac_address'],
+                                'bw_in': bw_in,
+                                'bw_out': bw_out,
+                                'last_ctr_in': bw_ctr['bw_in'],
+                                'last_ctr_out': bw_ctr['bw_out']})
+
+            if updates:
+                objects.BandwidthUsageList.update_all(
+                    context, start_time, updates, last_refreshed=refreshed,
+                    update_cells=update_cells)
+
+    @staticmethod
+    def _get_bw_usages(context, uuids, start_period):
+        """Return the bandwidth usages of instances in an audit period, by
+        instance uuid and mac address.
+        """
+        usages = objects.BandwidthUsageList.get_by_uuids(
+            context, uuids, start_period=start_period, use_slave=True)
+        return {(usage.instance_uuid, usage.mac): usage for usage in usages}
 
     def _get_host_volume_bdms(self, context, use_slave=False):
         """Return all block device mappings on a compute host."""
@@ -5604,16 +5807,34 @@ class ComputeManager(manager.Manager):
         return compute_host_bdms
 
     def _update_volume_usage_cache(self, context, vol_usages):
-        """Updates the volume usage cache table with a list of stats."""
+        """Updates the volume usage cache table with a list of stats.
+
+        The stats which did not change since they were last sent in the
+        current audit period are skipped, the others are sent at once.
+        """
+        period_start = utils.last_completed_audit_period()[1]
+        last_vol_usages = {}
+        updates = []
         for usage in vol_usages:
-            # Allow switching of greenthreads between queries.
-            greenthread.sleep(0)
-            self.conductor_api.vol_usage_update(context, usage['volume'],
-                                                usage['rd_req'],
-                                                usage['rd_bytes'],
-                                                usage['wr_req'],
-                                                usage['wr_bytes'],
-                                                usage['instance'])
+            instance = usage['instance']
+            stats = (instance.uuid, usage['rd_req'], usage['rd_bytes'],
+                     usage['wr_req'], usage['wr_bytes'], period_start)
+            last_vol_usages[usage['volume']] = stats
+            if self._last_vol_usages.get(usage['volume']) == stats:
+                continue
+            updates.append({'volume_id': usage['volume'],
+                            'rd_req': usage['rd_req'],
+                            'rd_bytes': usage['rd_bytes'],
+                            'wr_req': usage['wr_req'],
+                            'wr_bytes': usage['wr_bytes'],
+                            'instance_uuid': instance.uuid,
+                            'project_id': instance.project_id,
+                            'user_id': instance.user_id,
+                            'availability_zone': instance.availability_zone})
+
+        if updates:
+            self.conductor_api.vol_usage_update_bulk(context, updates)
+        self._last_vol_usages = last_vol_usages
 
     @periodic_task.periodic_task(spacing=CONF.volume_usage_poll_interval)
     def _poll_volume_usage(self, context, start_time=None):
@@ -5637,6 +5858,17 @@ class ComputeManager(manager.Manager):
 
         self._update_volume_usage_cache(context, vol_usages)
 
+    @periodic_task.periodic_task(spacing=CONF.build_phase_stats_interval)
+    def _report_build_phase_stats(self, context):
+        """Emit the build phase histograms gathered since the last run."""
+        if not len(self._build_timings):
+            return
+
+        payload = {'host': self.host,
+                   'host_ip': CONF.my_ip,
+                   'phases': self._build_timings.report(reset=True)}
+        self.notifier.info(context, 'compute.metrics.build_phases', payload)
+
     @periodic_task.periodic_task(spacing=CONF.sync_power_state_interval,
                                  run_immediately=True)
     def _sync_power_states(self, context):
@@ -5647,12 +5879,24 @@ class ComputeManager(manager.Manager):
         number of virtual machines known by the database, we proceed in a lazy
         loop, one database record at a time, checking if the hypervisor has the
         same power state as is in the database.
+
+        If the driver can return the power states of all its instances in one
+        call, the instances whose power state already matches the hypervisor
+        are skipped instead of being queried and synced one at a time.
         """
         db_instances = objects.InstanceList.get_by_host(context, self.host,
                                                         expected_attrs=[],
                                                         use_slave=True)
 
-        num_vm_instances = self.driver.get_num_instances()
+        try:
+            vm_power_states = self.driver.get_power_states()
+        except NotImplementedError:
+            vm_power_states = None
+
+        if vm_power_states is not None:
+            num_vm_instances = len(vm_power_states)
+        else:
+            num_vm_instances = self.driver.get_num_instances()
         num_db_instances = len(db_instances)
 
         if num_vm_instances != num_db_instances:
@@ -5663,13 +5907,20 @@ class ComputeManager(manager.Manager):
                         {'num_db_instances': num_db_instances,
                          'num_vm_instances': num_vm_instances})
 
+        def _get_vm_power_state(db_instance):
+            if vm_power_states is None:
+                return None
+            return vm_power_states.get(db_instance.uuid, power_state.NOSTATE)
+
         def _sync(db_instance):
             # NOTE(melwitt): This must be synchronized as we query state from
             #                two separate sources, the driver and the database.
             #                They are set (in stop_instance) and read, in sync.
             @utils.synchronized(db_instance.uuid)
             def query_driver_power_state_and_sync():
-                self._query_driver_power_state_and_sync(context, db_instance)
+                self._query_driver_power_state_and_sync(
+                    context, db_instance,
+                    vm_power_state=_get_vm_power_state(db_instance))
 
             try:
                 query_driver_power_state_and_sync()
@@ -5684,6 +5935,15 @@ class ComputeManager(manager.Manager):
             # process syncs asynchronously - don't want instance locking to
             # block entire periodic task thread
             uuid = db_instance.uuid
+            vm_power_state = _get_vm_power_state(db_instance)
+            # NOTE: The DB record may be slightly stale as it comes from the
+            # slave, in which case the instance is synced on the next run.
+            if (vm_power_state is not None and
+                    db_instance.task_state is None and
+                    db_instance.power_state == vm_power_state and
+                    _power_state_in_sync(db_instance.vm_state,
+                                         vm_power_state)):
+                continue
             if uuid in self._syncs_in_progress:
                 LOG.debug('Sync already in progress for %s' % uuid)
             else:
@@ -5691,18 +5951,21 @@ class ComputeManager(manager.Manager):
                 self._syncs_in_progress[uuid] = True
                 self._sync_power_pool.spawn_n(_sync, db_instance)
 
-    def _query_driver_power_state_and_sync(self, context, db_instance):
+    def _query_driver_power_state_and_sync(self, context, db_instance,
+                                           vm_power_state=None):
         if db_instance.task_state is not None:
             LOG.info(_LI("During sync_power_state the instance has a "
                          "pending task (%(task)s). Skip."),
                      {'task': db_instance.task_state}, instance=db_instance)
             return
-        # No pending tasks. Now try to figure out the real vm_power_state.
-        try:
-            vm_instance = self.driver.get_info(db_instance)
-            vm_power_state = vm_instance.state
-        except exception.InstanceNotFound:
-            vm_power_state = power_state.NOSTATE
+        # No pending tasks. Now try to figure out the real vm_power_state,
+        # unless it was already returned by the driver for all instances.
+        if vm_power_state is None:
+            try:
+                vm_instance = self.driver.get_info(db_instance)
+                vm_power_state = vm_instance.state
+            except exception.InstanceNotFound:
+                vm_power_state = power_state.NOSTATE
         # Note(maoy): the above get_info call might take a long time,
         # for example, because of a broken libvirt driver.
         try:
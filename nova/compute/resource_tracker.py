@@ -19,11 +19,14 @@ scheduler with useful information about availability through the ComputeNode
 model.
 """
 import copy
+import functools
+import threading
 
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import importutils
+from oslo_utils import timeutils
 
 from nova.compute import claims
 from nova.compute import monitors
@@ -53,6 +56,17 @@ resource_tracker_opts = [
     cfg.ListOpt('compute_resources',
                 default=['vcpu'],
                 help='The names of the extra resources to track.'),
+    cfg.IntOpt('resource_tracker_full_audit_interval',
+               default=0,
+               help='Interval in seconds between full audits of the '
+                    'resource usage of a compute node, which recompute the '
+                    'usage of all its instances and migrations. The audits '
+                    'in between only account for the instances added to or '
+                    'removed from the node since the previous audit, and '
+                    'fall back to a full audit when the hypervisor '
+                    'resources, the migrations or the orphaned instances '
+                    'change, or the usage of an instance drifts. 0 makes '
+                    'every audit a full one.'),
 ]
 
 CONF = cfg.CONF
@@ -60,10 +74,44 @@ CONF.register_opts(resource_tracker_opts)
 
 LOG = logging.getLogger(__name__)
 COMPUTE_RESOURCE_SEMAPHORE = "compute_resources"
+COMPUTE_REPORT_SEMAPHORE = "compute_resources_report"
+
+# The resources reported by the virt driver which the usage of the instances
+# is computed from. A full audit is needed when they change.
+AUDITED_RESOURCE_KEYS = ('vcpus', 'memory_mb', 'local_gb', 'numa_topology',
+                         'pci_passthrough_devices', 'stats')
+# The resources reported by the virt driver which the audits recompute from
+# the usage of the instances
+USAGE_RESOURCE_KEYS = ('vcpus_used', 'memory_mb_used', 'local_gb_used')
+# The instance fields the usage of an instance is computed from
+INSTANCE_USAGE_KEYS = ('memory_mb', 'vcpus', 'root_gb', 'ephemeral_gb')
+# The compute node fields holding serialized JSON, which are compared on
+# their parsed form
+JSON_COMPUTE_NODE_FIELDS = ('numa_topology', 'metrics')
 
 CONF.import_opt('my_ip', 'nova.netconf')
 
 
+def reports_after_release(function):
+    """Decorator sending the compute node report staged by _update() once
+    the resource lock taken by the decorated method is released, so that
+    the claims don't wait for the compute node to be saved.
+    """
+
+    @functools.wraps(function)
+    def decorated_function(self, *args, **kwargs):
+        state = self._report_state
+        state.depth = getattr(state, 'depth', 0) + 1
+        try:
+            return function(self, *args, **kwargs)
+        finally:
+            state.depth -= 1
+            if not state.depth:
+                self._send_report()
+
+    return decorated_function
+
+
 class ResourceTracker(object):
     """Compute helper class for keeping track of resource usage as instances
     are built and destroyed.
@@ -86,7 +134,17 @@ class ResourceTracker(object):
             ext_resources.ResourceHandler(CONF.compute_resources)
         self.old_resources = objects.ComputeNode()
         self.scheduler_client = scheduler_client.SchedulerClient()
-
+        # The time, hypervisor resources and orphaned instances of the last
+        # full audit
+        self._last_full_audit = None
+        self._audited_resources = None
+        self._audited_orphans = None
+        # The compute node report staged by _update() and not sent yet, and
+        # the greenthread local state of reports_after_release
+        self._pending_report = None
+        self._report_state = threading.local()
+
+    @reports_after_release
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def instance_claim(self, context, instance_ref, limits=None):
         """Indicate that some resources are needed for an upcoming compute
@@ -146,6 +204,7 @@ class ResourceTracker(object):
 
         return claim
 
+    @reports_after_release
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def resize_claim(self, context, instance, instance_type,
                      image_meta=None, limits=None):
@@ -223,6 +282,7 @@ class ResourceTracker(object):
         instance.node = self.nodename
         instance.save()
 
+    @reports_after_release
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def abort_instance_claim(self, context, instance):
         """Remove usage from the given instance."""
@@ -233,6 +293,7 @@ class ResourceTracker(object):
 
         self._update(context.elevated())
 
+    @reports_after_release
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def drop_resize_claim(self, context, instance, instance_type=None,
                           image_meta=None, prefix='new_'):
@@ -263,6 +324,7 @@ class ResourceTracker(object):
                 ctxt = context.elevated()
                 self._update(ctxt)
 
+    @reports_after_release
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def update_usage(self, context, instance):
         """Update the resource usage and stats after a change in an
@@ -401,10 +463,129 @@ class ResourceTracker(object):
 
         self._report_hypervisor_resource_view(resources)
 
-        self._update_available_resource(context, resources)
+        if not self._update_available_resource_incrementally(context,
+                                                             resources):
+            self._update_available_resource(context, resources)
+
+    def _get_audited_resources(self, resources):
+        return {key: resources.get(key) for key in AUDITED_RESOURCE_KEYS}
 
+    def _full_audit_needed(self, resources):
+        interval = CONF.resource_tracker_full_audit_interval
+        return (interval <= 0 or self.disabled or
+                self._last_full_audit is None or
+                timeutils.is_older_than(self._last_full_audit, interval) or
+                self._get_audited_resources(resources) !=
+                self._audited_resources)
+
+    def _update_available_resource_incrementally(self, context, resources):
+        """Account for the instances added to or removed from the node since
+        the last audit, instead of recomputing the usage of all of them.
+
+        The database and the hypervisor are queried without holding the
+        resource lock, so claims don't wait for them.
+
+        :returns: False if a full audit is needed instead, True otherwise
+        """
+        if self._full_audit_needed(resources):
+            return False
+
+        # NOTE: Claims save the host and node of their instance before they
+        # are tracked, under the resource lock. The instances tracked before
+        # the query are thus returned by it, unless they left the node.
+        tracked_uuids = set(self.tracked_instances)
+        instances = objects.InstanceList.get_by_host_and_node(
+            context, self.host, self.nodename,
+            expected_attrs=['system_metadata',
+                            'numa_topology'])
+        migrations = self._get_migrations(context)
+        orphans = self._find_orphaned_instances()
+        return self._update_usage_incrementally(context, resources,
+                                                tracked_uuids, instances,
+                                                migrations, orphans)
+
+    @reports_after_release
+    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
+    def _update_usage_incrementally(self, context, resources, tracked_uuids,
+                                    instances, migrations, orphans):
+        if self._full_audit_needed(resources):
+            return False
+
+        tracked_migration_ids = set(
+            migration.id for migration, itype in
+            self.tracked_migrations.values())
+        if set(migration.id for migration in migrations) != \
+                tracked_migration_ids:
+            LOG.debug("Migrations changed, running a full audit")
+            return False
+
+        orphan_usage = {orphan['uuid']: orphan['memory_mb']
+                        for orphan in orphans}
+        if orphan_usage != self._audited_orphans:
+            LOG.debug("Orphaned instances changed, running a full audit")
+            return False
+
+        instances = [instance for instance in instances
+                     if instance.vm_state != vm_states.DELETED]
+        for instance in instances:
+            tracked = self.tracked_instances.get(instance.uuid)
+            if tracked is not None and any(
+                    tracked.get(key) != instance[key]
+                    for key in INSTANCE_USAGE_KEYS):
+                LOG.debug("Usage of instance changed, running a full audit",
+                          instance=instance)
+                return False
+
+        # Remove the usage of the instances which left the node:
+        uuids = set(instance.uuid for instance in instances)
+        for uuid in tracked_uuids - uuids:
+            if uuid in self.tracked_instances:
+                deleted = dict(self.tracked_instances[uuid],
+                               vm_state=vm_states.DELETED)
+                self._update_usage_from_instance(context, deleted)
+
+        # Add the usage of the new instances and update the stats of the
+        # others, except the ones claimed or released since the query:
+        for instance in instances:
+            if ((instance.uuid in self.tracked_instances) !=
+                    (instance.uuid in tracked_uuids)):
+                continue
+            self._update_usage_from_instance(context, instance)
+
+        # The audited resources didn't change, and the usage is up to date
+        self.compute_node.update_from_virt_driver(
+            {key: value for key, value in resources.items()
+             if key not in AUDITED_RESOURCE_KEYS + USAGE_RESOURCE_KEYS})
+
+        self._report_final_resource_view()
+
+        metrics = self._get_host_metrics(context, self.nodename)
+        self.compute_node.metrics = jsonutils.dumps(metrics)
+
+        self._update(context)
+        LOG.info(_LI('Compute_service record updated incrementally for '
+                     '%(host)s:%(node)s'),
+                 {'host': self.host, 'node': self.nodename})
+        return True
+
+    def _get_migrations(self, context):
+        """Return the in-progress resize and migrate migrations of the
+        node.
+        """
+        migrations = objects.MigrationList.get_in_progress_by_host_and_node(
+                context, self.host, self.nodename)
+
+        # Only look at resize/migrate migration records
+        # NOTE(danms): RT should probably examine live migration
+        # records as well and do something smart. However, ignore
+        # those for now to avoid them being included in below calculations.
+        return [migration for migration in migrations
+                if migration.migration_type in ('resize', 'migrate')]
+
+    @reports_after_release
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def _update_available_resource(self, context, resources):
+        audited_resources = self._get_audited_resources(resources)
 
         # initialise the compute node object, creating it
         # if it does not already exist.
@@ -441,15 +622,7 @@ class ResourceTracker(object):
         self._update_usage_from_instances(context, instances)
 
         # Grab all in-progress migrations:
-        migrations = objects.MigrationList.get_in_progress_by_host_and_node(
-                context, self.host, self.nodename)
-
-        # Only look at resize/migrate migration records
-        # NOTE(danms): RT should probably examine live migration
-        # records as well and do something smart. However, ignore
-        # those for now to avoid them being included in below calculations.
-        migrations = [migration for migration in migrations
-                      if migration.migration_type in ('resize', 'migrate')]
+        migrations = self._get_migrations(context)
 
         self._update_usage_from_migrations(context, migrations)
 
@@ -481,6 +654,11 @@ class ResourceTracker(object):
         LOG.info(_LI('Compute_service record updated for %(host)s:%(node)s'),
                      {'host': self.host, 'node': self.nodename})
 
+        self._last_full_audit = timeutils.utcnow()
+        self._audited_resources = audited_resources
+        self._audited_orphans = {orphan['uuid']: orphan['memory_mb']
+                                 for orphan in orphans}
+
     def _get_compute_node(self, context):
         """Returns compute node for the host and nodename."""
         try:
@@ -577,22 +755,79 @@ class ResourceTracker(object):
                   'used_vcpus': ucpu,
                   'pci_stats': pci_stats})
 
+    @staticmethod
+    def _get_comparable_value(compute_node, field):
+        value = getattr(compute_node, field)
+        if field in JSON_COMPUTE_NODE_FIELDS and value:
+            try:
+                return jsonutils.loads(value)
+            except ValueError:
+                return value
+        if isinstance(value, list):
+            return [obj_base.obj_to_primitive(item) for item in value]
+        return obj_base.obj_to_primitive(value)
+
+    def _get_changed_fields(self):
+        """Return the fields of the compute node whose value changed since it
+        was last reported.
+        """
+        changed = set()
+        for field in self.compute_node.obj_fields:
+            is_set = self.compute_node.obj_attr_is_set(field)
+            if is_set != self.old_resources.obj_attr_is_set(field):
+                changed.add(field)
+            elif is_set and (
+                    self._get_comparable_value(self.compute_node, field) !=
+                    self._get_comparable_value(self.old_resources, field)):
+                changed.add(field)
+        return changed
+
     def _resource_change(self):
-        """Check to see if any resources have changed."""
-        if not obj_base.obj_equal_prims(self.compute_node, self.old_resources):
-            self.old_resources = copy.deepcopy(self.compute_node)
-            return True
-        return False
+        """Check to see if any resources have changed.
+
+        The fields of the compute node which didn't change are flagged as
+        unchanged, so that only the changed ones are written.
+        """
+        changed = self._get_changed_fields()
+        if not changed:
+            return False
+        unchanged = set(self.compute_node.obj_what_changed()) - changed
+        if unchanged:
+            self.compute_node.obj_reset_changes(unchanged)
+        self.old_resources = copy.deepcopy(self.compute_node)
+        return True
 
     def _update(self, context):
-        """Update partial stats locally and populate them to Scheduler."""
+        """Update partial stats locally and populate them to Scheduler.
+
+        When called by a method holding the resource lock, the stats are only
+        populated once the lock is released.
+        """
         self._write_ext_resources(self.compute_node)
         if not self._resource_change():
             return
-        # Persist the stats to the Scheduler
-        self.scheduler_client.update_resource_stats(self.compute_node)
+        # NOTE: A copy of the compute node is saved, so that saving it
+        # doesn't overwrite the usage claimed in the meantime.
+        report = copy.deepcopy(self.compute_node)
+        self.compute_node.obj_reset_changes()
+        if self._pending_report is not None:
+            # The changes of the report which was not sent yet need to be
+            # written too
+            for field in self._pending_report.obj_what_changed():
+                if report.obj_attr_is_set(field):
+                    setattr(report, field, getattr(report, field))
+        self._pending_report = report
         if self.pci_tracker:
             self.pci_tracker.save(context)
+        if not getattr(self._report_state, 'depth', 0):
+            self._send_report()
+
+    @utils.synchronized(COMPUTE_REPORT_SEMAPHORE)
+    def _send_report(self):
+        """Persist the latest staged compute node report to Scheduler."""
+        report, self._pending_report = self._pending_report, None
+        if report is not None:
+            self.scheduler_client.update_resource_stats(report)
 
     def _update_usage(self, usage, sign=1):
         mem_usage = usage['memory_mb']
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import bisect
+
 from oslo_serialization import jsonutils
 
 from nova.compute import task_states
@@ -147,3 +149,47 @@ class Stats(dict):
                                  os_type=os_type, project_id=project_id)
 
         return (vm_state, task_state, os_type, project_id)
+
+
+class PhaseTimings(object):
+    """Histograms of the time spent in each phase of an operation."""
+
+    # Upper bounds, in seconds, of the histogram buckets. Durations above
+    # the last bound are counted in an extra overflow bucket.
+    BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+
+    def __init__(self, buckets=None):
+        self.buckets = tuple(buckets or self.BUCKETS)
+        self._phases = {}
+
+    def __len__(self):
+        return len(self._phases)
+
+    def add(self, phase, duration):
+        """Record that one run of ``phase`` took ``duration`` seconds."""
+        hist = self._phases.get(phase)
+        if hist is None:
+            hist = self._phases[phase] = {
+                'count': 0, 'total': 0.0, 'max': 0.0,
+                'buckets': [0] * (len(self.buckets) + 1)}
+        hist['count'] += 1
+        hist['total'] += duration
+        hist['max'] = max(hist['max'], duration)
+        hist['buckets'][bisect.bisect_left(self.buckets, duration)] += 1
+
+    def report(self, reset=False):
+        """Return the histograms as a dict keyed by phase.
+
+        The buckets of each histogram are keyed by their upper bound,
+        '+Inf' being the overflow bucket.
+        """
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        phases = {}
+        for phase, hist in self._phases.items():
+            phases[phase] = {'count': hist['count'],
+                             'total': hist['total'],
+                             'max': hist['max'],
+                             'buckets': dict(zip(bounds, hist['buckets']))}
+        if reset:
+            self._phases = {}
+        return phases
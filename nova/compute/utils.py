@@ -18,6 +18,7 @@ import itertools
 import string
 import traceback
 
+import eventlet.semaphore
 import netifaces
 from oslo_config import cfg
 from oslo_log import log
@@ -470,9 +471,19 @@ class UnlimitedSemaphore(object):
     def __enter__(self):
         pass
 
-    def __exit__(self):
+    def __exit__(self, exc_type, exc_value, traceback):
         pass
 
     @property
     def balance(self):
         return 0
+
+
+def get_semaphore(limit):
+    """Return a semaphore allowing ``limit`` concurrent holders.
+
+    A limit of 0 means no limit at all.
+    """
+    if limit != 0:
+        return eventlet.semaphore.Semaphore(limit)
+    return UnlimitedSemaphore()
@@ -78,6 +78,10 @@ class LocalAPI(object):
                                               instance, last_refreshed,
                                               update_totals)
 
+    def vol_usage_update_bulk(self, context, vol_usages):
+        """Update the cached usage of several volumes at once."""
+        return self._manager.vol_usage_update_bulk(context, vol_usages)
+
     def compute_node_create(self, context, values):
         return self._manager.compute_node_create(context, values)
 
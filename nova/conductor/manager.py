@@ -78,7 +78,7 @@ class ConductorManager(manager.Manager):
     namespace.  See the ComputeTaskManager class for details.
     """
 
-    target = messaging.Target(version='2.1')
+    target = messaging.Target(version='2.2')
 
     def __init__(self, *args, **kwargs):
         super(ConductorManager, self).__init__(service_name='conductor',
@@ -267,6 +267,14 @@ class ConductorManager(manager.Manager):
         self.notifier.info(context, 'volume.usage',
                            compute_utils.usage_volume_info(vol_usage))
 
+    def vol_usage_update_bulk(self, context, vol_usages):
+        vol_usages = self.db.vol_usage_update_bulk(context, vol_usages)
+
+        # We have just updated the database, so send the notifications now
+        for vol_usage in vol_usages:
+            self.notifier.info(context, 'volume.usage',
+                               compute_utils.usage_volume_info(vol_usage))
+
     # NOTE(hanlind): This method can be removed in version 3.0 of the RPC API
     @messaging.expected_exceptions(exception.ComputeHostNotFound,
                                    exception.HostBinaryNotFound)
@@ -164,6 +164,8 @@ class ConductorAPI(object):
     existing methods in 2.x after that point should be done such
     that they can handle the version_cap being set to 2.1.
 
+    * 2.2  - Added vol_usage_update_bulk()
+
     * Remove get_ec2_ids()
     * Remove service_get_all_by()
     * Remove service_create()
@@ -223,6 +225,22 @@ class ConductorAPI(object):
                           instance=instance_p, last_refreshed=last_refreshed,
                           update_totals=update_totals)
 
+    def vol_usage_update_bulk(self, context, vol_usages):
+        if not self.client.can_send_version('2.2'):
+            for usage in vol_usages:
+                instance = {'uuid': usage['instance_uuid'],
+                            'project_id': usage['project_id'],
+                            'user_id': usage['user_id'],
+                            'availability_zone': usage['availability_zone']}
+                self.vol_usage_update(context, usage['volume_id'],
+                                      usage['rd_req'], usage['rd_bytes'],
+                                      usage['wr_req'], usage['wr_bytes'],
+                                      instance)
+            return
+        cctxt = self.client.prepare(version='2.2')
+        return cctxt.call(context, 'vol_usage_update_bulk',
+                          vol_usages=vol_usages)
+
     def compute_node_create(self, context, values):
         cctxt = self.client.prepare()
         return cctxt.call(context, 'compute_node_create', values=values)
@@ -209,6 +209,19 @@ def compute_node_get_all(context):
     return IMPL.compute_node_get_all(context)
 
 
+def compute_node_get_all_changed_since(context, since):
+    """Get all computeNodes created, updated or deleted since a point in time.
+
+    :param context: The security context
+    :param since: datetime after which a change must have happened for the
+                  compute node to be returned
+
+    :returns: List of dictionaries each containing compute node properties,
+              including soft-deleted ones
+    """
+    return IMPL.compute_node_get_all_changed_since(context, since)
+
+
 def compute_node_get_all_by_host(context, host, use_slave=False):
     """Get compute nodes by host name
 
@@ -714,9 +727,11 @@ def instance_get_all_by_host_and_node(context, host, node,
         context, host, node, columns_to_join=columns_to_join)
 
 
-def instance_get_all_by_host_and_not_type(context, host, type_id=None):
+def instance_get_all_by_host_and_not_type(context, host, type_id=None,
+                                          columns_to_join=None):
     """Get all instances belonging to a host with a different type_id."""
-    return IMPL.instance_get_all_by_host_and_not_type(context, host, type_id)
+    return IMPL.instance_get_all_by_host_and_not_type(
+        context, host, type_id, columns_to_join=columns_to_join)
 
 
 def instance_floating_address_get_all(context, instance_uuid):
@@ -1645,6 +1660,29 @@ def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
     return rv
 
 
+def bw_usage_update_bulk(context, start_period, usages, last_refreshed=None,
+                         update_cells=True):
+    """Update cached bandwidth usage for several instances' networks in a
+    given audit period.  Creates new records if needed.
+
+    Each usage is a dict with the uuid, mac, bw_in, bw_out, last_ctr_in and
+    last_ctr_out keys.
+    """
+    rv = IMPL.bw_usage_update_bulk(context, start_period, usages,
+                                   last_refreshed=last_refreshed)
+    if update_cells:
+        try:
+            for usage in usages:
+                cells_rpcapi.CellsAPI().bw_usage_update_at_top(context,
+                        usage['uuid'], usage['mac'], start_period,
+                        usage['bw_in'], usage['bw_out'],
+                        usage['last_ctr_in'], usage['last_ctr_out'],
+                        last_refreshed)
+        except Exception:
+            LOG.exception(_LE("Failed to notify cells of bw_usage update"))
+    return rv
+
+
 ###################
 
 
@@ -1666,6 +1704,17 @@ def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
                                  update_totals=update_totals)
 
 
+def vol_usage_update_bulk(context, usages):
+    """Update cached usage for several volumes.  Creates new records if
+    needed.
+
+    Each usage is a dict with the volume_id, rd_req, rd_bytes, wr_req,
+    wr_bytes, instance_uuid, project_id, user_id and availability_zone keys.
+    Returns the updated volume usages.
+    """
+    return IMPL.vol_usage_update_bulk(context, usages)
+
+
 ###################
 
 
@@ -1888,13 +1937,20 @@ def task_log_get(context, task_name, period_beginning,
 ####################
 
 
-def archive_deleted_rows(context, max_rows=None):
+def archive_deleted_rows(context, max_rows=None, batch_size=1000,
+                         concurrency=1, progress=None):
     """Move up to max_rows rows from production tables to corresponding shadow
-    tables.
+    tables, batch_size rows per transaction and up to concurrency tables at
+    a time.
 
+    :param progress: dict of per-table markers and throughput, updated in
+                     place and used to resume archiving.
     :returns: number of rows archived.
     """
-    return IMPL.archive_deleted_rows(context, max_rows=max_rows)
+    return IMPL.archive_deleted_rows(context, max_rows=max_rows,
+                                     batch_size=batch_size,
+                                     concurrency=concurrency,
+                                     progress=progress)
 
 
 def archive_deleted_rows_for_table(context, tablename, max_rows=None):
@@ -18,14 +18,18 @@
 """Implementation of SQLAlchemy backend."""
 
 import collections
+import contextlib
 import copy
 import datetime
 import functools
 import sys
 import threading
+import time
 import uuid
 
+import eventlet
 from oslo_config import cfg
+from oslo_context import context as common_context
 from oslo_db import api as oslo_db_api
 from oslo_db import exception as db_exc
 from oslo_db import options as oslo_db_options
@@ -39,6 +43,8 @@ import six
 from six.moves import range
 from sqlalchemy import and_
 from sqlalchemy import Boolean
+from sqlalchemy import DateTime
+from sqlalchemy import event
 from sqlalchemy.exc import NoSuchTableError
 from sqlalchemy import Integer
 from sqlalchemy import MetaData
@@ -67,6 +73,7 @@ from nova.db.sqlalchemy import models
 from nova import exception
 from nova.i18n import _, _LI, _LE, _LW
 from nova import quota
+from nova import utils
 
 db_opts = [
     cfg.StrOpt('osapi_compute_unique_server_name_scope',
@@ -74,6 +81,29 @@ db_opts = [
                help='When set, compute API will consider duplicate hostnames '
                     'invalid within the specified scope, regardless of case. '
                     'Should be empty, "project" or "global".'),
+    cfg.BoolOpt('db_route_reads_to_slave',
+                default=False,
+                help='Send DB API calls tagged as readers to '
+                     '[database]slave_connection when it is set. Requests '
+                     'which wrote to the database keep reading from the '
+                     'main database for db_slave_write_stickiness seconds.'),
+    cfg.IntOpt('db_slave_write_stickiness',
+               default=30,
+               help='Number of seconds the DB API calls of a request which '
+                    'wrote to the database keep reading from the main '
+                    'database, so that the request reads its own writes. '
+                    'It should exceed the replication lag of '
+                    '[database]slave_connection.'),
+    cfg.IntOpt('db_slave_max_lag',
+               default=30,
+               help='Maximum estimated replication lag, in seconds, of '
+                    '[database]slave_connection before routed reads fall '
+                    'back to the main database. Set to 0 to never check '
+                    'the lag.'),
+    cfg.IntOpt('db_slave_lag_check_interval',
+               default=10,
+               help='Number of seconds between estimates of the '
+                    'replication lag of [database]slave_connection.'),
 ]
 
 api_db_opts = [
@@ -181,6 +211,8 @@ def get_api_engine():
 
 
 def get_session(use_slave=False, **kwargs):
+    if not use_slave:
+        use_slave = bool(getattr(_ROUTING, 'use_slave', None))
     conf_group = CONF.database
     facade = _create_facade_lazily(_MAIN_FACADE, conf_group)
     return facade.get_session(use_slave=use_slave, **kwargs)
@@ -192,6 +224,124 @@ def get_api_session(**kwargs):
     return facade.get_session(**kwargs)
 
 
+# NOTE: DB API functions tagged with @reader get sessions on the slave
+# connection unless a function tagged with @writer is further up the stack,
+# the request recently wrote to the main database or the slave lags behind.
+_ROUTING = threading.local()
+_SLAVE_LAG = {'checked_at': None, 'lag': None}
+_RECENT_WRITES = {}
+_RECENT_WRITES_PRUNE_SIZE = 1024
+
+
+def _record_write(conn, cursor, statement, parameters, context,
+                  executemany):
+    if statement.lstrip()[:6].upper() not in ('INSERT', 'UPDATE', 'DELETE'):
+        return
+    ctxt = common_context.get_current()
+    if ctxt is None or not ctxt.request_id:
+        return
+    now = time.time()
+    if len(_RECENT_WRITES) >= _RECENT_WRITES_PRUNE_SIZE:
+        for request_id, written_at in list(_RECENT_WRITES.items()):
+            if now - written_at >= CONF.db_slave_write_stickiness:
+                _RECENT_WRITES.pop(request_id, None)
+    _RECENT_WRITES[ctxt.request_id] = now
+
+
+def _track_writes():
+    engine = get_engine()
+    if not event.contains(engine, 'before_cursor_execute', _record_write):
+        event.listen(engine, 'before_cursor_execute', _record_write)
+
+
+def _measure_slave_lag():
+    """Estimate how far the slave database is behind the main one.
+
+    Every service heartbeat updates its row in the services table, so the
+    difference between the newest heartbeat on each side is an estimate of
+    the replication lag with a resolution of report_interval.
+    """
+    query = sql.select([func.max(models.Service.updated_at)])
+    main = get_engine().scalar(query)
+    slave = get_engine(use_slave=True).scalar(query)
+    if main is None:
+        return 0
+    if slave is None:
+        return None
+    return max(0, timeutils.delta_seconds(slave, main))
+
+
+def _get_slave_lag():
+    now = time.time()
+    checked_at = _SLAVE_LAG['checked_at']
+    if (checked_at is None or
+            now - checked_at >= CONF.db_slave_lag_check_interval):
+        # NOTE: Set checked_at first so that concurrent readers keep using
+        # the previous estimate while this one is being measured.
+        _SLAVE_LAG['checked_at'] = now
+        try:
+            _SLAVE_LAG['lag'] = _measure_slave_lag()
+        except Exception:
+            LOG.exception(_LE('Failed to estimate the replication lag of '
+                              'the slave database'))
+            _SLAVE_LAG['lag'] = None
+    return _SLAVE_LAG['lag']
+
+
+def _use_slave_for_reads(context):
+    if not CONF.db_route_reads_to_slave or not CONF.database.slave_connection:
+        return False
+    _track_writes()
+    request_id = getattr(context, 'request_id', None)
+    written_at = _RECENT_WRITES.get(request_id)
+    if (written_at is not None and
+            time.time() - written_at < CONF.db_slave_write_stickiness):
+        return False
+    if CONF.db_slave_max_lag > 0:
+        lag = _get_slave_lag()
+        if lag is None or lag > CONF.db_slave_max_lag:
+            return False
+    return True
+
+
+def reader(f):
+    """Decorator to tag a DB API function as only reading from the DB.
+
+    Sessions created while it runs use the slave connection when
+    db_route_reads_to_slave allows it. The first argument to the wrapped
+    function must be the context.
+    """
+
+    @functools.wraps(f)
+    def wrapper(context, *args, **kwargs):
+        if getattr(_ROUTING, 'use_slave', None) is not None:
+            return f(context, *args, **kwargs)
+        _ROUTING.use_slave = _use_slave_for_reads(context)
+        try:
+            return f(context, *args, **kwargs)
+        finally:
+            _ROUTING.use_slave = None
+    return wrapper
+
+
+def writer(f):
+    """Decorator to tag a DB API function as writing to the DB.
+
+    Readers called while it runs use the main database, so that they see
+    what it wrote.
+    """
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        use_slave = getattr(_ROUTING, 'use_slave', None)
+        _ROUTING.use_slave = False
+        try:
+            return f(*args, **kwargs)
+        finally:
+            _ROUTING.use_slave = use_slave
+    return wrapper
+
+
 _SHADOW_TABLE_PREFIX = 'shadow_'
 _DEFAULT_QUOTA_NAME = 'default'
 PER_PROJECT_QUOTAS = ['fixed_ips', 'floating_ips', 'networks']
@@ -457,6 +607,7 @@ def service_get(context, service_id, use_slave=False):
                         use_slave=use_slave)
 
 
+@reader
 def service_get_all(context, disabled=None):
     query = model_query(context, models.Service)
 
@@ -602,10 +753,21 @@ def compute_node_get_all_by_host(context, host, use_slave=False):
     return result
 
 
+@reader
 def compute_node_get_all(context):
     return model_query(context, models.ComputeNode, read_deleted='no').all()
 
 
+def compute_node_get_all_changed_since(context, since):
+    # NOTE: soft_delete() keeps updated_at untouched, so deleted_at
+    # has to be checked too in order to report removed compute nodes.
+    return model_query(context, models.ComputeNode, read_deleted='yes').\
+            filter(or_(models.ComputeNode.created_at >= since,
+                       models.ComputeNode.updated_at >= since,
+                       models.ComputeNode.deleted_at >= since)).\
+            all()
+
+
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     field = models.ComputeNode.hypervisor_hostname
     return model_query(context, models.ComputeNode).\
@@ -1875,6 +2037,7 @@ def instance_get_all(context, columns_to_join=None):
     return _instances_fill_metadata(context, instances, manual_joins)
 
 
+@reader
 @require_context
 def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                                 limit=None, marker=None, columns_to_join=None,
@@ -1893,6 +2056,7 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                                             sort_dirs=[sort_dir])
 
 
+@reader
 @require_context
 def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
                                      columns_to_join=None, use_slave=False,
@@ -1947,6 +2111,10 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     |        'tag-any: [some-any-tag, some-another-any-tag]
     |    }
 
+    The marker is either the uuid of the last instance of the previous page
+    or a cursor built by nova.utils.encode_page_cursor() from the sort key
+    values of that instance, in which case the instance is not looked up.
+
     """
     # NOTE(mriedem): If the limit is 0 there is no point in even going
     # to the database since nothing is going to be returned anyway.
@@ -2064,6 +2232,19 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     query_prefix = _tag_instance_filter(context, query_prefix, filters)
 
     # paginate query
+    cursor = utils.decode_page_cursor(marker)
+    if cursor is not None:
+        keyset = _keyset_values(models.Instance, sort_keys, cursor)
+        if keyset is not None:
+            query_prefix = _keyset_filter(query_prefix, models.Instance,
+                                          sort_keys, sort_dirs, keyset)
+            marker = None
+        else:
+            # NOTE: the cursor does not hold every sort key (or holds a
+            # NULL), fall back to looking up the last instance it names.
+            if 'uuid' not in cursor:
+                raise exception.MarkerNotFound(marker=marker)
+            marker = cursor['uuid']
     if marker is not None:
         try:
             if deleted:
@@ -2087,6 +2268,58 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
 
 
+def _keyset_values(model, sort_keys, cursor):
+    """Return the values of a pagination cursor for the given sort keys.
+
+    Returns None if a sort key is missing from the cursor or has a NULL
+    value, as NULLs cannot be compared to seek past them.
+    """
+    values = []
+    for key in sort_keys:
+        column = model.__table__.columns.get(key)
+        if column is None:
+            raise exception.InvalidSortKey()
+        value = cursor.get(key)
+        if value is None:
+            return None
+        if isinstance(column.type, DateTime):
+            try:
+                value = timeutils.normalize_time(
+                    timeutils.parse_isotime(value))
+            except ValueError:
+                return None
+        values.append(value)
+    return values
+
+
+def _keyset_filter(query, model, sort_keys, sort_dirs, values):
+    """Filter a query down to the rows sorted after the given values.
+
+    Unlike the marker of paginate_query(), the values of the last row of
+    the previous page come from the pagination cursor so that row is not
+    looked up again. The range condition on the first sort key lets the
+    database seek into the (sort key, id) indexes instead of evaluating
+    the OR-chained comparisons over every row.
+    """
+    criteria = []
+    for i, (sort_key, sort_dir) in enumerate(zip(sort_keys, sort_dirs)):
+        crit_attrs = [getattr(model, sort_keys[j]) == values[j]
+                      for j in range(i)]
+        model_attr = getattr(model, sort_key)
+        if sort_dir == 'desc':
+            crit_attrs.append(model_attr < values[i])
+        else:
+            crit_attrs.append(model_attr > values[i])
+        criteria.append(and_(*crit_attrs))
+
+    first_attr = getattr(model, sort_keys[0])
+    if sort_dirs[0] == 'desc':
+        query = query.filter(first_attr <= values[0])
+    else:
+        query = query.filter(first_attr >= values[0])
+    return query.filter(or_(*criteria))
+
+
 def _tag_instance_filter(context, query, filters):
     """Applies tag filtering to an Instance query.
 
@@ -2361,10 +2594,14 @@ def _instance_get_all_query(context, project_only=False,
 def instance_get_all_by_host(context, host,
                              columns_to_join=None,
                              use_slave=False):
+    if columns_to_join is None:
+        manual_joins = None
+    else:
+        manual_joins, columns_to_join = _manual_join_columns(columns_to_join)
     return _instances_fill_metadata(context,
-      _instance_get_all_query(context,
+      _instance_get_all_query(context, joins=columns_to_join,
                               use_slave=use_slave).filter_by(host=host).all(),
-                              manual_joins=columns_to_join,
+                              manual_joins=manual_joins,
                               use_slave=use_slave)
 
 
@@ -2399,10 +2636,17 @@ def instance_get_all_by_host_and_node(context, host, node,
 
 
 @require_admin_context
-def instance_get_all_by_host_and_not_type(context, host, type_id=None):
+def instance_get_all_by_host_and_not_type(context, host, type_id=None,
+                                          columns_to_join=None):
+    if columns_to_join is None:
+        manual_joins = None
+    else:
+        manual_joins, columns_to_join = _manual_join_columns(columns_to_join)
     return _instances_fill_metadata(context,
-        _instance_get_all_query(context).filter_by(host=host).
-                   filter(models.Instance.instance_type_id != type_id).all())
+        _instance_get_all_query(context, joins=columns_to_join).
+                   filter_by(host=host).
+                   filter(models.Instance.instance_type_id != type_id).all(),
+        manual_joins=manual_joins)
 
 
 @require_context
@@ -3467,20 +3711,156 @@ def _calculate_overquota(project_quotas, user_quotas, deltas,
     return overs
 
 
+def _is_quota_refresh_pending(quota_usage, max_age):
+    """Determines if reserving against a quota usage may need a refresh.
+
+    Unlike _is_quota_refresh_needed, this does not count down until_refresh.
+
+    :param quota_usage:   A QuotaUsage object for a given resource.
+    :param max_age:       Number of seconds between subsequent usage refreshes.
+    :return:              True if a refresh may be needed, False otherwise.
+    """
+    return (quota_usage.in_use < 0 or
+            quota_usage.until_refresh is not None or
+            bool(max_age and (timeutils.utcnow() -
+                              quota_usage.updated_at).seconds >= max_age))
+
+
+class _QuotaUsagesChanged(Exception):
+    pass
+
+
+def _quota_reserve_fast(context, project_quotas, user_quotas, deltas,
+                        expire, max_age, project_id, user_id):
+    """Reserve deltas without locking the quota usages up front.
+
+    The quota check runs against an unlocked read of the usages of the
+    project for the resources in deltas. It is then applied with one
+    conditional UPDATE per resource, which only matches if none of those
+    usages changed in the meantime, and one insert of all reservations.
+
+    :returns: list of reservation uuids, or None if the usages have to be
+              created or refreshed, the request looks over quota or the
+              usages changed concurrently. quota_reserve then falls back to
+              locking the usages.
+    """
+    rows = model_query(context, models.QuotaUsage, read_deleted="no").\
+                   filter_by(project_id=project_id).\
+                   filter(models.QuotaUsage.resource.in_(list(deltas))).\
+                   all()
+    project_rows = collections.defaultdict(list)
+    project_usages = {}
+    user_usages = {}
+    for row in rows:
+        project_rows[row.resource].append(row)
+        usage = project_usages.setdefault(row.resource,
+                                          dict(in_use=0, reserved=0, total=0))
+        usage['in_use'] += row.in_use
+        usage['reserved'] += row.reserved
+        usage['total'] += row.in_use + row.reserved
+        if row.user_id is None or row.user_id == user_id:
+            user_usages[row.resource] = row
+    for res in deltas:
+        if (res not in user_usages or
+                _is_quota_refresh_pending(user_usages[res], max_age)):
+            return None
+    if _calculate_overquota(project_quotas, user_quotas, deltas,
+                            project_usages, user_usages):
+        return None
+
+    now = timeutils.utcnow()
+    session = get_session()
+    try:
+        with session.begin():
+            checked = []
+            for res, delta in sorted(deltas.items()):
+                # NOTE: Like quota_reserve, only positive increments are
+                # reserved and checked against the quotas.
+                if delta <= 0:
+                    continue
+                usage_id = user_usages[res].id
+                query = model_query(context, models.QuotaUsage,
+                                    read_deleted="no", session=session)
+                if user_quotas[res] < 0:
+                    expected = [user_usages[res]]
+                    query = query.filter_by(id=usage_id)
+                else:
+                    expected = project_rows[res]
+                    checked.append(res)
+                    query = query.filter(or_(*[
+                        and_(models.QuotaUsage.id == row.id,
+                             models.QuotaUsage.in_use == row.in_use,
+                             models.QuotaUsage.reserved == row.reserved)
+                        for row in expected]))
+                is_user_usage = models.QuotaUsage.id == usage_id
+                updated = query.update(
+                    {'reserved': sql.case(
+                        [(is_user_usage, models.QuotaUsage.reserved + delta)],
+                        else_=models.QuotaUsage.reserved),
+                     'updated_at': sql.case(
+                        [(is_user_usage, now)],
+                        else_=models.QuotaUsage.updated_at)},
+                    synchronize_session=False)
+                if updated != len(expected):
+                    raise _QuotaUsagesChanged()
+
+            # The conditional updates cannot see usages created since they
+            # were read, which would count towards the project usage.
+            if checked:
+                count = model_query(context, models.QuotaUsage,
+                                    (func.count(models.QuotaUsage.id),),
+                                    read_deleted="no", session=session).\
+                            filter_by(project_id=project_id).\
+                            filter(models.QuotaUsage.resource.in_(checked)).\
+                            scalar()
+                if count != sum(len(project_rows[res]) for res in checked):
+                    raise _QuotaUsagesChanged()
+
+            reservations = []
+            new_entries = []
+            for res, delta in deltas.items():
+                reservations.append(str(uuid.uuid4()))
+                new_entries.append({'uuid': reservations[-1],
+                                    'usage_id': user_usages[res].id,
+                                    'project_id': project_id,
+                                    'user_id': user_id,
+                                    'resource': res,
+                                    'delta': delta,
+                                    'expire': expire})
+            session.execute(models.Reservation.__table__.insert(),
+                            new_entries)
+    except _QuotaUsagesChanged:
+        LOG.debug('Quota usages of project %s changed concurrently, locking '
+                  'them to reserve', project_id)
+        return None
+
+    unders = [res for res, delta in deltas.items()
+              if delta < 0 and delta + user_usages[res].in_use < 0]
+    if unders:
+        LOG.warning(_LW("Change will make usage less than 0 for the following "
+                        "resources: %s"), unders)
+    return reservations
+
+
 @require_context
 @oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
 def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
                   expire, until_refresh, max_age, project_id=None,
                   user_id=None):
+    if project_id is None:
+        project_id = context.project_id
+    if user_id is None:
+        user_id = context.user_id
+
+    reservations = _quota_reserve_fast(context, project_quotas, user_quotas,
+                                       deltas, expire, max_age, project_id,
+                                       user_id)
+    if reservations is not None:
+        return reservations
+
     elevated = context.elevated()
     session = get_session()
     with session.begin():
-
-        if project_id is None:
-            project_id = context.project_id
-        if user_id is None:
-            user_id = context.user_id
-
         # Get the current usages
         project_usages, user_usages = _get_project_user_quota_usages(
                 context, session, project_id, user_id)
@@ -3617,48 +3997,59 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
     return reservations
 
 
-def _quota_reservations_query(session, context, reservations):
-    """Return the relevant reservations."""
-
-    # Get the listed reservations
-    return model_query(context, models.Reservation,
-                       read_deleted="no",
-                       session=session).\
+def _quota_reservations_finish(context, reservations, commit):
+    """Move the deltas of reservations out of the reserved usages, adding
+    them to the usages in use if commit is True, and delete them.
+    """
+    session = get_session()
+    with session.begin():
+        rows = model_query(context, models.Reservation, read_deleted="no",
+                           session=session).\
                    filter(models.Reservation.uuid.in_(reservations)).\
-                   with_lockmode('update')
+                   all()
+        if not rows:
+            return
+        in_use = collections.defaultdict(int)
+        reserved = collections.defaultdict(int)
+        for reservation in rows:
+            if reservation.delta >= 0:
+                reserved[reservation.usage_id] -= reservation.delta
+            if commit:
+                in_use[reservation.usage_id] += reservation.delta
+        # NOTE: Relative updates only lock the usages the reservations were
+        # made against, and they are taken before the reservations.
+        for usage_id in sorted(set(in_use) | set(reserved)):
+            model_query(context, models.QuotaUsage, read_deleted="no",
+                        session=session).\
+                filter_by(id=usage_id).\
+                update({'in_use': models.QuotaUsage.in_use + in_use[usage_id],
+                        'reserved': (models.QuotaUsage.reserved +
+                                     reserved[usage_id])},
+                       synchronize_session=False)
+        deleted = model_query(context, models.Reservation, read_deleted="no",
+                              session=session).\
+                      filter(models.Reservation.id.in_(
+                          [reservation.id for reservation in rows])).\
+                      soft_delete(synchronize_session=False)
+        if deleted != len(rows):
+            LOG.debug('Reservations were committed, rolled back or expired '
+                      'in a concurrent transaction, retrying')
+            raise db_exc.RetryRequest(exception.ReservationNotFound(
+                uuid=', '.join(reservations)))
 
 
 @require_context
-@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True,
+                           retry_on_request=True)
 def reservation_commit(context, reservations, project_id=None, user_id=None):
-    session = get_session()
-    with session.begin():
-        _project_usages, user_usages = _get_project_user_quota_usages(
-                context, session, project_id, user_id)
-        reservation_query = _quota_reservations_query(session, context,
-                                                      reservations)
-        for reservation in reservation_query.all():
-            usage = user_usages[reservation.resource]
-            if reservation.delta >= 0:
-                usage.reserved -= reservation.delta
-            usage.in_use += reservation.delta
-        reservation_query.soft_delete(synchronize_session=False)
+    _quota_reservations_finish(context, reservations, commit=True)
 
 
 @require_context
-@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True,
+                           retry_on_request=True)
 def reservation_rollback(context, reservations, project_id=None, user_id=None):
-    session = get_session()
-    with session.begin():
-        _project_usages, user_usages = _get_project_user_quota_usages(
-                context, session, project_id, user_id)
-        reservation_query = _quota_reservations_query(session, context,
-                                                      reservations)
-        for reservation in reservation_query.all():
-            usage = user_usages[reservation.resource]
-            if reservation.delta >= 0:
-                usage.reserved -= reservation.delta
-        reservation_query.soft_delete(synchronize_session=False)
+    _quota_reservations_finish(context, reservations, commit=False)
 
 
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
@@ -4642,6 +5033,7 @@ def _flavor_get_query(context, session=None, read_deleted=None):
     return query
 
 
+@reader
 @require_context
 def flavor_get_all(context, inactive=False, filters=None,
                    sort_key='flavorid', sort_dir='asc', limit=None,
@@ -5170,6 +5562,59 @@ def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
             pass
 
 
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+def bw_usage_update_bulk(context, start_period, usages, last_refreshed=None):
+    if not usages:
+        return
+
+    session = get_session()
+
+    if last_refreshed is None:
+        last_refreshed = timeutils.utcnow()
+
+    counter_keys = ('bw_in', 'bw_out', 'last_ctr_in', 'last_ctr_out')
+    with session.begin():
+        ts_values = {'last_refreshed': last_refreshed,
+                     'start_period': start_period}
+        ts_keys = ('start_period', 'last_refreshed')
+        ts_values = convert_objects_related_datetimes(ts_values, *ts_keys)
+
+        current_usages = {}
+        rows = model_query(context, models.BandwidthUsage,
+                           session=session, read_deleted="yes").\
+                   filter(models.BandwidthUsage.uuid.in_(
+                       set(usage['uuid'] for usage in usages))).\
+                   filter_by(start_period=ts_values['start_period']).\
+                   all()
+        for row in rows:
+            current_usages.setdefault((row.uuid, row.mac), []).append(row)
+
+        updates = []
+        inserts = []
+        for usage in usages:
+            values = {key: usage[key] for key in counter_keys}
+            values['last_refreshed'] = ts_values['last_refreshed']
+            current_rows = current_usages.get((usage['uuid'], usage['mac']))
+            if not current_rows:
+                values.update(uuid=usage['uuid'], mac=usage['mac'],
+                              start_period=ts_values['start_period'])
+                inserts.append(values)
+                continue
+            for row in current_rows:
+                # NOTE: Counters which did not change are not written back.
+                if any(row[key] != values[key] for key in counter_keys):
+                    updates.append(dict(values, _id=row.id))
+
+        table = models.BandwidthUsage.__table__
+        if updates:
+            session.execute(
+                table.update().where(table.c.id == sql.bindparam('_id')),
+                updates)
+        if inserts:
+            session.execute(table.insert(), inserts)
+
+
 ####################
 
 
@@ -5291,6 +5736,81 @@ def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
         return vol_usage
 
 
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+def vol_usage_update_bulk(context, usages):
+    if not usages:
+        return []
+
+    session = get_session()
+
+    refreshed = timeutils.utcnow()
+    volume_ids = [usage['volume_id'] for usage in usages]
+    counter_keys = (('rd_req', 'curr_reads', 'tot_reads'),
+                    ('rd_bytes', 'curr_read_bytes', 'tot_read_bytes'),
+                    ('wr_req', 'curr_writes', 'tot_writes'),
+                    ('wr_bytes', 'curr_write_bytes', 'tot_write_bytes'))
+    with session.begin():
+        current_usages = {}
+        rows = model_query(context, models.VolumeUsage,
+                           session=session, read_deleted="yes").\
+                   filter(models.VolumeUsage.volume_id.in_(volume_ids)).\
+                   all()
+        for row in rows:
+            current_usages.setdefault(row.volume_id, row)
+
+        updates = []
+        updates_with_totals = []
+        inserts = []
+        for usage in usages:
+            values = {'curr_last_refreshed': refreshed,
+                      'instance_uuid': usage['instance_uuid'],
+                      'project_id': usage['project_id'],
+                      'user_id': usage['user_id'],
+                      'availability_zone': usage['availability_zone']}
+            for key, curr_key, tot_key in counter_keys:
+                values[curr_key] = usage[key]
+
+            current_usage = current_usages.get(usage['volume_id'])
+            if current_usage is None:
+                values['volume_id'] = usage['volume_id']
+                inserts.append(values)
+                continue
+
+            values['_id'] = current_usage.id
+            if any(values[curr_key] < current_usage[curr_key]
+                   for key, curr_key, tot_key in counter_keys):
+                LOG.info(_LI("Volume(%s) has lower stats then what is in "
+                             "the database. Instance must have been rebooted "
+                             "or crashed. Updating totals."),
+                         usage['volume_id'])
+                updates_with_totals.append(values)
+            else:
+                updates.append(values)
+
+        # NOTE: Each statement is executed once for all the rows, the
+        # parameters of the rows of a statement must have the same keys.
+        # The totals are computed by the database from the stored counters,
+        # like vol_usage_update() does, so that concurrent updates of a
+        # volume aren't lost. The totals precede the counters in the SET
+        # clause, MySQL evaluates them from left to right.
+        table = models.VolumeUsage.__table__
+        update = table.update().where(table.c.id == sql.bindparam('_id'))
+        if updates:
+            session.execute(update, updates)
+        if updates_with_totals:
+            totals = {tot_key: table.c[tot_key] + table.c[curr_key]
+                      for key, curr_key, tot_key in counter_keys}
+            session.execute(update.values(**totals), updates_with_totals)
+        if inserts:
+            session.execute(table.insert(), inserts)
+
+        return model_query(context, models.VolumeUsage,
+                           session=session, read_deleted="yes").\
+                   filter(models.VolumeUsage.volume_id.in_(volume_ids)).\
+                   all()
+
+
 ####################
 
 
@@ -5349,6 +5869,7 @@ def _aggregate_get_query(context, model_class, id_field=None, id=None,
     return query
 
 
+@writer
 def aggregate_create(context, values, metadata=None):
     session = get_session()
     query = _aggregate_get_query(context,
@@ -5373,6 +5894,7 @@ def aggregate_create(context, values, metadata=None):
     return aggregate_get(context, aggregate.id)
 
 
+@reader
 def aggregate_get(context, aggregate_id):
     query = _aggregate_get_query(context,
                                  models.Aggregate,
@@ -5386,6 +5908,7 @@ def aggregate_get(context, aggregate_id):
     return aggregate
 
 
+@reader
 def aggregate_get_by_host(context, host, key=None):
     """Return rows that match host (mandatory) and metadata key (optional).
 
@@ -5404,6 +5927,7 @@ def aggregate_get_by_host(context, host, key=None):
     return query.all()
 
 
+@reader
 def aggregate_metadata_get_by_host(context, host, key=None):
     query = model_query(context, models.Aggregate)
     query = query.join("_hosts")
@@ -5422,6 +5946,7 @@ def aggregate_metadata_get_by_host(context, host, key=None):
     return dict(metadata)
 
 
+@reader
 def aggregate_get_by_metadata_key(context, key):
     """Return rows that match metadata key.
 
@@ -5435,6 +5960,7 @@ def aggregate_get_by_metadata_key(context, key):
     return query.all()
 
 
+@writer
 def aggregate_update(context, aggregate_id, values):
     session = get_session()
 
@@ -5478,6 +6004,7 @@ def aggregate_update(context, aggregate_id, values):
         raise exception.AggregateNotFound(aggregate_id=aggregate_id)
 
 
+@writer
 def aggregate_delete(context, aggregate_id):
     session = get_session()
     with session.begin():
@@ -5497,6 +6024,7 @@ def aggregate_delete(context, aggregate_id):
                     soft_delete()
 
 
+@reader
 def aggregate_get_all(context):
     return _aggregate_get_query(context, models.Aggregate).all()
 
@@ -5510,6 +6038,7 @@ def _aggregate_metadata_get_query(context, aggregate_id, session=None,
                 filter_by(aggregate_id=aggregate_id)
 
 
+@reader
 @require_aggregate_exists
 def aggregate_metadata_get(context, aggregate_id):
     rows = model_query(context,
@@ -5519,6 +6048,7 @@ def aggregate_metadata_get(context, aggregate_id):
     return {r['key']: r['value'] for r in rows}
 
 
+@writer
 @require_aggregate_exists
 def aggregate_metadata_delete(context, aggregate_id, key):
     count = _aggregate_get_query(context,
@@ -5532,6 +6062,7 @@ def aggregate_metadata_delete(context, aggregate_id, key):
                                                   metadata_key=key)
 
 
+@writer
 @require_aggregate_exists
 def aggregate_metadata_add(context, aggregate_id, metadata, set_delete=False,
                            max_retries=10):
@@ -5581,6 +6112,7 @@ def aggregate_metadata_add(context, aggregate_id, metadata, set_delete=False,
                     LOG.warn(msg)
 
 
+@reader
 @require_aggregate_exists
 def aggregate_host_get_all(context, aggregate_id):
     rows = model_query(context,
@@ -5590,6 +6122,7 @@ def aggregate_host_get_all(context, aggregate_id):
     return [r.host for r in rows]
 
 
+@writer
 @require_aggregate_exists
 def aggregate_host_delete(context, aggregate_id, host):
     count = _aggregate_get_query(context,
@@ -5603,6 +6136,7 @@ def aggregate_host_delete(context, aggregate_id, host):
                                               host=host)
 
 
+@writer
 @require_aggregate_exists
 def aggregate_host_add(context, aggregate_id, host):
     host_ref = models.AggregateHost()
@@ -5931,34 +6465,49 @@ def _get_default_deleted_value(table):
         return None
 
 
-@require_admin_context
-def archive_deleted_rows_for_table(context, tablename, max_rows):
-    """Move up to max_rows rows from one tables to the corresponding
-    shadow table. The context argument is only used for the decorator.
+def _get_shadow_table(tablename):
+    """Return the shadow table of a table, or None if it has none."""
+    metadata = MetaData()
+    metadata.bind = get_engine()
+    try:
+        return Table(_SHADOW_TABLE_PREFIX + tablename, metadata,
+                     autoload=True)
+    except NoSuchTableError:
+        return None
 
-    :returns: number of rows archived
-    """
-    # NOTE(guochbo): There is a circular import, nova.db.sqlalchemy.utils
-    # imports nova.db.sqlalchemy.api.
-    from nova.db.sqlalchemy import utils as db_utils
 
-    engine = get_engine()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.bind = engine
+def _archive_deleted_rows_for_table(tablename, max_rows, marker=None,
+                                    conn=None, shadow_table=None):
+    """Move up to max_rows deleted rows following marker from one table to
+    the corresponding shadow table in a single transaction.
+
+    :param conn: Optional connection to archive with, so that the batches
+                 of a table share one.
+    :param shadow_table: Optional shadow table returned by
+                         _get_shadow_table(), so that it is reflected once
+                         for all the batches of a table.
+    :returns: tuple of the number of rows archived and the key of the last
+              row archived, which is None once there is nothing left to
+              archive after marker.
+    """
+    if max_rows is not None and max_rows <= 0:
+        return 0, marker
     # NOTE(tdurakov): table metadata should be received
     # from models, not db tables. Default value specified by SoftDeleteMixin
     # is known only by models, not DB layer.
     # IMPORTANT: please do not change source of metadata information for table.
     table = models.BASE.metadata.tables[tablename]
 
-    shadow_tablename = _SHADOW_TABLE_PREFIX + tablename
-    rows_archived = 0
-    try:
-        shadow_table = Table(shadow_tablename, metadata, autoload=True)
-    except NoSuchTableError:
-        # No corresponding shadow table; skip it.
-        return rows_archived
+    if shadow_table is None:
+        shadow_table = _get_shadow_table(tablename)
+        if shadow_table is None:
+            # No corresponding shadow table; skip it.
+            return 0, None
+    if conn is None:
+        with contextlib.closing(get_engine().connect()) as conn:
+            return _archive_deleted_rows_for_table(
+                tablename, max_rows, marker=marker, conn=conn,
+                shadow_table=shadow_table)
 
     if tablename == "dns_domains":
         # We have one table (dns_domains) where the key is called
@@ -5966,25 +6515,38 @@ def archive_deleted_rows_for_table(context, tablename, max_rows):
         column = table.c.domain
     else:
         column = table.c.id
-    # NOTE(guochbo): Use DeleteFromSelect to avoid
-    # database's limit of maximum parameter in one SQL statement.
     deleted_column = table.c.deleted
+    where = deleted_column != deleted_column.default.arg
+    if marker is not None:
+        where = and_(where, column > marker)
     columns = [c.name for c in table.c]
-    insert = shadow_table.insert(inline=True).\
-        from_select(columns,
-                    sql.select([table],
-                               deleted_column != deleted_column.default.arg).
-                    order_by(column).limit(max_rows))
-    query_delete = sql.select([column],
-                          deleted_column != deleted_column.default.arg).\
-                          order_by(column).limit(max_rows)
-
-    delete_statement = db_utils.DeleteFromSelect(table, query_delete, column)
+    # Group the insert and delete in a transaction.
+    with conn.begin():
+        # NOTE: Bound the batch by the key of its last row rather than by a
+        # LIMIT, so that the insert and delete cover the same range of the
+        # index and the next batch starts right after it.
+        last = None
+        if max_rows is not None:
+            last = conn.execute(sql.select([column], where).
+                                order_by(column).
+                                offset(max_rows - 1).limit(1)).scalar()
+        if last is not None:
+            where = and_(where, column <= last)
+        conn.execute(shadow_table.insert(inline=True).
+                     from_select(columns, sql.select([table], where)))
+        result_delete = conn.execute(table.delete().where(where))
+    return result_delete.rowcount, last
+
+
+@require_admin_context
+def archive_deleted_rows_for_table(context, tablename, max_rows):
+    """Move up to max_rows rows from one tables to the corresponding
+    shadow table. The context argument is only used for the decorator.
+
+    :returns: number of rows archived
+    """
     try:
-        # Group the insert and delete in a transaction.
-        with conn.begin():
-            conn.execute(insert)
-            result_delete = conn.execute(delete_statement)
+        return _archive_deleted_rows_for_table(tablename, max_rows)[0]
     except db_exc.DBError:
         # TODO(ekudryashova): replace by DBReferenceError when db layer
         # raise it.
@@ -5993,31 +6555,99 @@ def archive_deleted_rows_for_table(context, tablename, max_rows):
         # skip this table for now; we'll come back to it later.
         msg = _("IntegrityError detected when archiving table %s") % tablename
         LOG.warn(msg)
-        return rows_archived
+        return 0
 
-    rows_archived = result_delete.rowcount
 
-    return rows_archived
+def _archive_table_levels():
+    """Group the tables to archive so that every table is in a later group
+    than the tables with foreign keys to it.
+    """
+    referencing = collections.defaultdict(set)
+    for table in models.BASE.metadata.sorted_tables:
+        for fk in table.foreign_keys:
+            if fk.column.table is not table:
+                referencing[fk.column.table.name].add(table.name)
+    levels = {}
+    # NOTE: sorted_tables lists referenced tables first, so walking it
+    # backwards sees every referencing table before the tables it refers to.
+    for table in reversed(models.BASE.metadata.sorted_tables):
+        levels[table.name] = max([levels[name] + 1
+                                  for name in referencing[table.name]] or [0])
+    groups = collections.defaultdict(list)
+    for tablename, level in six.iteritems(levels):
+        groups[level].append(tablename)
+    return [sorted(groups[level]) for level in sorted(groups)]
 
 
 @require_admin_context
-def archive_deleted_rows(context, max_rows=None):
+def archive_deleted_rows(context, max_rows=None, batch_size=1000,
+                         concurrency=1, progress=None):
     """Move up to max_rows rows from production tables to the corresponding
     shadow tables.
 
+    Rows are moved in transactions of up to batch_size rows. Tables are
+    archived after the tables with foreign keys to them, up to concurrency
+    tables at a time.
+
+    :param progress: Optional dict updated with a dict of the 'marker' to
+                     resume from, the 'rows' archived and the 'seconds'
+                     spent for each table. Passing it back in resumes
+                     each table after its marker.
     :returns: Number of rows archived.
     """
     # The context argument is only used for the decorator.
-    tablenames = []
-    for model_class in six.itervalues(models.__dict__):
-        if hasattr(model_class, "__tablename__"):
-            tablenames.append(model_class.__tablename__)
+    if progress is None:
+        progress = {}
+    budget = {'remaining': max_rows}
+
+    def _archive_table(tablename):
+        entry = progress.setdefault(tablename,
+                                    {'marker': None, 'rows': 0, 'seconds': 0})
+        archived = 0
+        start = time.time()
+        shadow_table = _get_shadow_table(tablename)
+        if shadow_table is None:
+            # No corresponding shadow table; skip it.
+            return 0
+        # NOTE: The batches of a table share its shadow table and a
+        # connection, only the rows are fetched again for each of them.
+        with contextlib.closing(get_engine().connect()) as conn:
+            while True:
+                limit = batch_size
+                if budget['remaining'] is not None:
+                    limit = min(limit, budget['remaining'])
+                    if limit <= 0:
+                        break
+                    budget['remaining'] -= limit
+                rows = 0
+                try:
+                    rows, entry['marker'] = _archive_deleted_rows_for_table(
+                        tablename, limit, marker=entry['marker'], conn=conn,
+                        shadow_table=shadow_table)
+                except db_exc.DBError:
+                    LOG.warn(_LW("IntegrityError detected when archiving "
+                                 "table %s"), tablename)
+                    entry['marker'] = None
+                if budget['remaining'] is not None:
+                    budget['remaining'] += limit - rows
+                archived += rows
+                if entry['marker'] is None:
+                    break
+        elapsed = time.time() - start
+        entry['rows'] += archived
+        entry['seconds'] += elapsed
+        if archived:
+            LOG.info(_LI("Archived %(rows)d rows from %(table)s in "
+                         "%(seconds).1f seconds (%(rate).1f rows/s)"),
+                     {'rows': archived, 'table': tablename,
+                      'seconds': elapsed,
+                      'rate': archived / max(elapsed, 0.001)})
+        return archived
+
     rows_archived = 0
-    for tablename in tablenames:
-        rows_archived += archive_deleted_rows_for_table(context, tablename,
-                                         max_rows=max_rows - rows_archived)
-        if rows_archived >= max_rows:
-            break
+    pool = eventlet.GreenPool(max(1, concurrency))
+    for tablenames in _archive_table_levels():
+        rows_archived += sum(pool.imap(_archive_table, tablenames))
     return rows_archived
 
 
@@ -204,6 +204,12 @@ class Instance(BASE, NovaBase):
               'host', 'node', 'deleted'),
         Index('instances_host_deleted_cleaned_idx',
               'host', 'deleted', 'cleaned'),
+        Index('instances_created_at_id_idx',
+              'created_at', 'id'),
+        Index('instances_updated_at_id_idx',
+              'updated_at', 'id'),
+        Index('instances_display_name_id_idx',
+              'display_name', 'id'),
         schema.UniqueConstraint('uuid', name='uniq_instances0uuid'),
     )
     injected_files = []
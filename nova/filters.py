@@ -17,6 +17,8 @@
 Filter support
 """
 
+import time
+
 from oslo_log import log as logging
 
 from nova.i18n import _LI
@@ -65,17 +67,29 @@ class BaseFilterHandler(loadables.BaseLoader):
     This class should be subclassed where one needs to use filters.
     """
 
-    def get_filtered_objects(self, filters, objs, filter_properties, index=0):
+    def get_filtered_objects(self, filters, objs, filter_properties, index=0,
+                             trace=None):
+        """Return the objects passing all filters.
+
+        :param trace: Optional object whose add_filter() method is called
+                      with the name, object counts and duration of each
+                      filter run.
+        """
         list_objs = list(objs)
         LOG.debug("Starting with %d host(s)", len(list_objs))
         for filter_ in filters:
             if filter_.run_filter_for_index(index):
                 cls_name = filter_.__class__.__name__
+                start = time.time()
                 objs = filter_.filter_all(list_objs, filter_properties)
                 if objs is None:
                     LOG.debug("Filter %s says to stop filtering", cls_name)
                     return
+                num_objs = len(list_objs)
                 list_objs = list(objs)
+                if trace is not None:
+                    trace.add_filter(cls_name, num_objs, len(list_objs),
+                                     time.time() - start)
                 if not list_objs:
                     LOG.info(_LI("Filter %s returned 0 hosts"), cls_name)
                     break
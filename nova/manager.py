@@ -51,15 +51,42 @@ This module provides Manager, a base class for managers.
 
 """
 
+import hashlib
+import time
+
+import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 
 from nova.db import base
+from nova.i18n import _LE, _LI, _LW
 from nova.openstack.common import periodic_task
 from nova import rpc
 
+periodic_opts = [
+    cfg.IntOpt('periodic_task_jitter',
+               default=0,
+               help='Maximum percentage of its interval the first run of '
+                    'each periodic task is delayed by. The delay of a task '
+                    'is derived from the host name, so that the tasks of '
+                    'services restarted together are staggered instead of '
+                    'running in waves. 0 disables it.'),
+    cfg.FloatOpt('periodic_task_max_backoff',
+                 default=4.0,
+                 help='Maximum factor the interval of a periodic task is '
+                      'multiplied by when its runs take longer than its '
+                      'interval. The interval is doubled after each such '
+                      'run, and restored after a run which takes less '
+                      'time than the interval. 1 disables the back off.'),
+    cfg.IntOpt('periodic_task_workers',
+               default=1,
+               help='Number of periodic tasks of a service which can run '
+                    'in parallel. With 1, the due tasks run one after the '
+                    'other.'),
+]
 
 CONF = cfg.CONF
+CONF.register_opts(periodic_opts)
 CONF.import_opt('host', 'nova.netconf')
 LOG = logging.getLogger(__name__)
 
@@ -75,11 +102,140 @@ class Manager(base.Base, periodic_task.PeriodicTasks):
         self.notifier = rpc.get_notifier(self.service_name, self.host)
         self.additional_endpoints = []
         super(Manager, self).__init__(db_driver)
+        self._periodic_stats = {}
+        self._periodic_backoff = {}
+        self._periodic_running = set()
+        self._periodic_pool = None
+        self._stagger_periodic_tasks()
 
     def periodic_tasks(self, context, raise_on_error=False):
         """Tasks to be run at a periodic interval."""
         return self.run_periodic_tasks(context, raise_on_error=raise_on_error)
 
+    def _stagger_periodic_tasks(self):
+        """Delay the first run of each periodic task by up to
+        periodic_task_jitter percent of its interval.
+        """
+        if CONF.periodic_task_jitter <= 0:
+            return
+        now = time.time()
+        for task_name, task in self._periodic_tasks:
+            spacing = self._periodic_spacing[task_name]
+            key = '%s:%s' % (self.host, task_name)
+            digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+            delay = (spacing * CONF.periodic_task_jitter / 100.0 *
+                     int(digest, 16) / 2 ** 128)
+            last_run = self._periodic_last_run[task_name]
+            if last_run is None:
+                # The task was to run immediately
+                last_run = now - spacing
+            self._periodic_last_run[task_name] = last_run + delay
+
+    def get_periodic_task_stats(self):
+        """Return the number of runs, total and maximum duration, number of
+        overruns and current interval of the periodic tasks which ran.
+        """
+        stats = {}
+        for task_name, task_stats in self._periodic_stats.items():
+            stats[task_name] = dict(task_stats,
+                                    interval=self._get_periodic_spacing(
+                                        task_name))
+        return stats
+
+    def _get_periodic_spacing(self, task_name):
+        return (self._periodic_spacing[task_name] *
+                self._periodic_backoff.get(task_name, 1))
+
+    def run_periodic_tasks(self, context, raise_on_error=False):
+        """Tasks to be run at a periodic interval.
+
+        Unlike the base implementation, the tasks overrunning their interval
+        are backed off, the duration of each run is recorded, and the due
+        tasks run in parallel when periodic_task_workers allows it.
+        """
+        parallel = CONF.periodic_task_workers > 1 and not raise_on_error
+        idle_for = periodic_task.DEFAULT_INTERVAL
+        for task_name, task in self._periodic_tasks:
+            spacing = self._get_periodic_spacing(task_name)
+            last_run = self._periodic_last_run[task_name]
+
+            # Check if due, if not skip
+            idle_for = min(idle_for, spacing)
+            if last_run is not None:
+                delta = last_run + spacing - time.time()
+                if delta > 0:
+                    idle_for = min(idle_for, delta)
+                    continue
+            if task_name in self._periodic_running:
+                # The previous run didn't finish yet
+                continue
+
+            self._periodic_last_run[task_name] = (
+                periodic_task._nearest_boundary(last_run, spacing))
+            if parallel:
+                if self._periodic_pool is None:
+                    self._periodic_pool = eventlet.GreenPool(
+                        CONF.periodic_task_workers)
+                self._periodic_running.add(task_name)
+                self._periodic_pool.spawn_n(self._run_periodic_task, context,
+                                            task_name, task, False)
+            else:
+                self._run_periodic_task(context, task_name, task,
+                                        raise_on_error)
+                time.sleep(0)
+
+        return idle_for
+
+    def _run_periodic_task(self, context, task_name, task, raise_on_error):
+        full_task_name = '.'.join([self.__class__.__name__, task_name])
+        LOG.debug("Running periodic task %(full_task_name)s",
+                  {"full_task_name": full_task_name})
+        start = time.time()
+        try:
+            task(self, context)
+        except Exception:
+            if raise_on_error:
+                raise
+            LOG.exception(_LE("Error during %(full_task_name)s"),
+                          {"full_task_name": full_task_name})
+        finally:
+            self._periodic_running.discard(task_name)
+            self._record_periodic_task_run(task_name, time.time() - start)
+
+    def _record_periodic_task_run(self, task_name, elapsed):
+        """Record the duration of a run of a periodic task, and back it off
+        if the run overran its interval.
+        """
+        stats = self._periodic_stats.setdefault(
+            task_name, {'runs': 0, 'time': 0.0, 'max_time': 0.0,
+                        'overruns': 0})
+        stats['runs'] += 1
+        stats['time'] += elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
+
+        spacing = self._periodic_spacing[task_name]
+        backoff = self._periodic_backoff.get(task_name, 1)
+        if elapsed > spacing:
+            stats['overruns'] += 1
+            new_backoff = min(backoff * 2,
+                              max(CONF.periodic_task_max_backoff, 1))
+            if new_backoff != backoff:
+                self._periodic_backoff[task_name] = new_backoff
+                LOG.warning(_LW("Periodic task %(task)s took %(elapsed).2f "
+                                "seconds, more than its %(spacing)s seconds "
+                                "interval. Running it every %(interval)s "
+                                "seconds."),
+                            {'task': task_name, 'elapsed': elapsed,
+                             'spacing': spacing,
+                             'interval': spacing * new_backoff})
+        elif backoff != 1:
+            del self._periodic_backoff[task_name]
+            LOG.info(_LI("Periodic task %(task)s is running every "
+                         "%(spacing)s seconds again."),
+                     {'task': task_name, 'spacing': spacing})
+        LOG.debug("Periodic task %(task)s ran in %(elapsed).2f seconds",
+                  {'task': task_name, 'elapsed': elapsed})
+
     def init_host(self):
         """Hook to do additional manager initialization when one requests
         the service be started.  This is called before any service record
@@ -18,9 +18,11 @@ import inspect
 
 from oslo_concurrency import lockutils
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 from oslo_utils import excutils
 
 from nova.db import base
+from nova import exception
 from nova import hooks
 from nova.i18n import _, _LE
 from nova.network import model as network_model
@@ -53,6 +55,19 @@ def update_instance_cache_with_nw_info(impl, context, instance,
             LOG.exception(_LE('Failed storing info cache'), instance=instance)
 
 
+def _nw_info_changed(instance, nw_info):
+    """Returns whether nw_info differs from the info_cache of instance."""
+    if instance.info_cache is None:
+        return True
+    cached_nw_info = instance.info_cache.network_info
+    if cached_nw_info is None:
+        return True
+    # NOTE: The models only compare some of their keys, compare everything
+    # which is stored instead.
+    return (jsonutils.loads(cached_nw_info.json()) !=
+            jsonutils.loads(nw_info.json()))
+
+
 def refresh_cache(f):
     """Decorator to update the instance_info_cache
 
@@ -253,6 +268,69 @@ class NetworkAPI(base.Base):
         """Template method, so a subclass can implement for neutron/network."""
         raise NotImplementedError()
 
+    def get_instances_nw_info(self, context, instances):
+        """Returns the network info of several instances, by instance uuid.
+
+        Unlike get_instance_nw_info(), the info_cache of an instance is only
+        updated when its network info changed. The instances whose network
+        info could not be refreshed are logged and left out of the result.
+        """
+        prefetched = self._prefetch_instances_nw_info(context, instances)
+        nw_infos = {}
+        for instance in instances:
+            try:
+                with lockutils.lock('refresh_cache-%s' % instance.uuid):
+                    nw_info = self._get_prefetched_instance_nw_info_locked(
+                        context, instance, prefetched)
+                    if _nw_info_changed(instance, nw_info):
+                        update_instance_cache_with_nw_info(
+                            self, context, instance, nw_info=nw_info,
+                            update_cells=False)
+            except (exception.InstanceNotFound,
+                    exception.InstanceInfoCacheNotFound):
+                LOG.debug('Instance no longer exists. Unable to refresh',
+                          instance=instance)
+                continue
+            except Exception:
+                LOG.error(_LE('An error occurred while refreshing the network '
+                              'cache.'), instance=instance, exc_info=True)
+                continue
+            nw_infos[instance.uuid] = nw_info
+        return nw_infos
+
+    def _get_prefetched_instance_nw_info_locked(self, context, instance,
+                                                prefetched):
+        # NOTE: An interface or a floating IP may have been added or removed
+        # since the network info was prefetched. The info_cache written then
+        # must not be overwritten with the stale prefetched data.
+        if prefetched is not None:
+            info_cache = objects.InstanceInfoCache.get_by_instance_uuid(
+                context, instance.uuid)
+            if _nw_info_changed(instance, info_cache.network_info or
+                                network_model.NetworkInfo()):
+                LOG.debug('The info_cache changed since the network info '
+                          'was prefetched, building it from scratch',
+                          instance=instance)
+                instance.info_cache = info_cache
+                return self._get_instance_nw_info(context, instance)
+        return self._get_prefetched_instance_nw_info(context, instance,
+                                                     prefetched)
+
+    def _prefetch_instances_nw_info(self, context, instances):
+        """Template method, so a subclass can retrieve at once what the
+        network info of several instances is built from.
+        """
+        return None
+
+    def _get_prefetched_instance_nw_info(self, context, instance,
+                                         prefetched):
+        """Template method, so a subclass can build the network info of an
+        instance from the data returned by _prefetch_instances_nw_info().
+
+        It is called with the refresh_cache-%(instance_uuid) lock held.
+        """
+        return self._get_instance_nw_info(context, instance)
+
     def create_pci_requests_for_sriov_ports(self, context,
                                             pci_requests,
                                             requested_networks):
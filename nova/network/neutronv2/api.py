@@ -212,6 +212,76 @@ def get_client(context, admin=False):
                             region_name=CONF.neutron.region_name)
 
 
+class _PrefetchedClient(object):
+    """Read only neutron client answering the queries made to build the
+    network info of instances from their ports, networks, subnets and
+    floating IPs, which are retrieved at once with a few filtered requests.
+    """
+
+    def __init__(self, client, instances):
+        self._ports = client.list_ports(
+            device_id=[instance.uuid for instance in instances]).get(
+                'ports', [])
+        self._networks = []
+        self._subnets = []
+        self._floatingips = []
+
+        net_ids = set(port['network_id'] for port in self._ports)
+        for instance in instances:
+            net_ids.update(
+                vif['network']['id']
+                for vif in compute_utils.get_nw_info_for_instance(instance))
+        if net_ids:
+            self._networks = client.list_networks(id=list(net_ids)).get(
+                'networks', [])
+
+        subnet_ids = set(fixed_ip['subnet_id'] for port in self._ports
+                         for fixed_ip in port.get('fixed_ips', []))
+        if subnet_ids:
+            self._subnets = client.list_subnets(id=list(subnet_ids)).get(
+                'subnets', [])
+        port_ids = [port['id'] for port in self._ports]
+        if port_ids:
+            try:
+                self._floatingips = client.list_floatingips(
+                    port_id=port_ids).get('floatingips', [])
+            # If a neutron plugin does not implement the L3 API a 404 from
+            # list_floatingips will be raised.
+            except neutron_client_exc.NeutronClientException as e:
+                if e.status_code != 404:
+                    raise
+
+        dhcp_net_ids = set(subnet['network_id'] for subnet in self._subnets)
+        if dhcp_net_ids:
+            self._ports += client.list_ports(
+                network_id=list(dhcp_net_ids),
+                device_owner='network:dhcp').get('ports', [])
+
+    @staticmethod
+    def _filter(resources, search_opts):
+        def _matches(resource):
+            for key, value in search_opts.items():
+                if isinstance(value, list):
+                    if resource.get(key) not in value:
+                        return False
+                elif resource.get(key) != value:
+                    return False
+            return True
+        return [resource for resource in resources if _matches(resource)]
+
+    def list_ports(self, **search_opts):
+        return {'ports': self._filter(self._ports, search_opts)}
+
+    def list_networks(self, **search_opts):
+        return {'networks': self._filter(self._networks, search_opts)}
+
+    def list_subnets(self, **search_opts):
+        return {'subnets': self._filter(self._subnets, search_opts)}
+
+    def list_floatingips(self, **search_opts):
+        return {'floatingips': self._filter(self._floatingips, search_opts)}
+
+
 class API(base_api.NetworkAPI):
     """API for interacting with the neutron 2.x API."""
 
@@ -866,8 +936,21 @@ class API(base_api.NetworkAPI):
                                                  preexisting_port_ids)
         return network_model.NetworkInfo.hydrate(nw_info)
 
+    def _prefetch_instances_nw_info(self, context, instances):
+        """Retrieve the ports, networks, subnets and floating IPs of several
+        instances at once, instead of with several requests for each
+        instance.
+        """
+        return _PrefetchedClient(get_client(context, admin=True), instances)
+
+    def _get_prefetched_instance_nw_info(self, context, instance,
+                                         prefetched):
+        nw_info = self._build_network_info_model(context, instance,
+                                                 admin_client=prefetched)
+        return network_model.NetworkInfo.hydrate(nw_info)
+
     def _gather_port_ids_and_networks(self, context, instance, networks=None,
-                                      port_ids=None):
+                                      port_ids=None, neutron=None):
         """Return an instance's complete list of port_ids and networks."""
 
         if ((networks is None and port_ids is not None) or
@@ -886,7 +969,7 @@ class API(base_api.NetworkAPI):
         if networks is None:
             networks = self._get_available_networks(context,
                                                     instance.project_id,
-                                                    net_ids)
+                                                    net_ids, neutron=neutron)
         # an interface was added/removed from instance.
         else:
             # Since networks does not contain the existing networks on the
@@ -1495,8 +1578,8 @@ class API(base_api.NetworkAPI):
             network_IPs.append(fixed)
         return network_IPs
 
-    def _nw_info_get_subnets(self, context, port, network_IPs):
-        subnets = self._get_subnets_from_port(context, port)
+    def _nw_info_get_subnets(self, context, port, network_IPs, client=None):
+        subnets = self._get_subnets_from_port(context, port, client=client)
         for subnet in subnets:
             subnet['ips'] = [fixed_ip for fixed_ip in network_IPs
                              if fixed_ip.is_in_subnet(subnet)]
@@ -1589,7 +1672,9 @@ class API(base_api.NetworkAPI):
                           instance in order of attachment. If value is None
                           this value will be populated from the existing
                           cached value.
-        :param admin_client - a neutron client for the admin context.
+        :param admin_client - a neutron client for the admin context. All
+                              the requests are made with it when it is a
+                              _PrefetchedClient.
         :param preexisting_port_ids - List of port_ids that nova didn't
         allocate and there shouldn't be deleted when an instance is
         de-allocated. Supplied list will be added to the cached list of
@@ -1607,8 +1692,14 @@ class API(base_api.NetworkAPI):
 
         current_neutron_ports = data.get('ports', [])
         nw_info_refresh = networks is None and port_ids is None
+        # NOTE: A prefetched client also answers the queries which are
+        # otherwise made with the client of the context.
+        prefetched_client = None
+        if isinstance(client, _PrefetchedClient):
+            prefetched_client = client
         networks, port_ids = self._gather_port_ids_and_networks(
-                context, instance, networks, port_ids)
+                context, instance, networks, port_ids,
+                neutron=prefetched_client)
         nw_info = network_model.NetworkInfo()
 
         if preexisting_port_ids is None:
@@ -1638,7 +1729,8 @@ class API(base_api.NetworkAPI):
                                                     current_neutron_port)
                 subnets = self._nw_info_get_subnets(context,
                                                     current_neutron_port,
-                                                    network_IPs)
+                                                    network_IPs,
+                                                    client=prefetched_client)
 
                 devname = "tap" + current_neutron_port['id']
                 devname = devname[:network_model.NIC_NAME_LEN]
@@ -1671,7 +1763,7 @@ class API(base_api.NetworkAPI):
 
         return nw_info
 
-    def _get_subnets_from_port(self, context, port):
+    def _get_subnets_from_port(self, context, port, client=None):
         """Return the subnets for a given port."""
 
         fixed_ips = port['fixed_ips']
@@ -1682,8 +1774,10 @@ class API(base_api.NetworkAPI):
         # related to the port. To avoid this, the method returns here.
         if not fixed_ips:
             return []
+        if client is None:
+            client = get_client(context)
         search_opts = {'id': [ip['subnet_id'] for ip in fixed_ips]}
-        data = get_client(context).list_subnets(**search_opts)
+        data = client.list_subnets(**search_opts)
         ipam_subnets = data.get('subnets', [])
         subnets = []
 
@@ -1697,7 +1791,7 @@ class API(base_api.NetworkAPI):
             # attempt to populate DHCP server field
             search_opts = {'network_id': subnet['network_id'],
                            'device_owner': 'network:dhcp'}
-            data = get_client(context).list_ports(**search_opts)
+            data = client.list_ports(**search_opts)
             dhcp_ports = data.get('ports', [])
             for p in dhcp_ports:
                 for ip_pair in p['fixed_ips']:
@@ -74,7 +74,8 @@ class BandwidthUsageList(base.ObjectListBase, base.NovaObject):
     # Version 1.0: Initial version
     # Version 1.1: Add use_slave to get_by_uuids
     # Version 1.2: BandwidthUsage <= version 1.2
-    VERSION = '1.2'
+    # Version 1.3: Add update_all()
+    VERSION = '1.3'
     fields = {
         'objects': fields.ListOfObjectsField('BandwidthUsage'),
     }
@@ -82,6 +83,7 @@ class BandwidthUsageList(base.ObjectListBase, base.NovaObject):
         '1.0': '1.0',
         '1.1': '1.1',
         '1.2': '1.2',
+        '1.3': '1.2',
     }
 
     @base.serialize_args
@@ -91,3 +93,17 @@ class BandwidthUsageList(base.ObjectListBase, base.NovaObject):
                                                 start_period=start_period,
                                                 use_slave=use_slave)
         return base.obj_make_list(context, cls(), BandwidthUsage, db_bw_usages)
+
+    @base.serialize_args
+    @base.remotable_classmethod
+    def update_all(cls, context, start_period, usages, last_refreshed=None,
+                   update_cells=True):
+        """Update the bandwidth usages of several instances' networks in a
+        given audit period at once.
+
+        Each usage is a dict with the uuid, mac, bw_in, bw_out, last_ctr_in
+        and last_ctr_out keys.
+        """
+        db.bw_usage_update_bulk(context, start_period, usages,
+                                last_refreshed=last_refreshed,
+                                update_cells=update_cells)
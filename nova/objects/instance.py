@@ -13,6 +13,7 @@
 #    under the License.
 
 import contextlib
+import weakref
 
 from oslo_config import cfg
 from oslo_db import exception as db_exc
@@ -66,7 +67,9 @@ def _expected_cols(expected_attrs):
     requested attribute requires another.
     """
     if not expected_attrs:
-        return expected_attrs
+        # NOTE: only the expected attributes are set on the objects, so do
+        # not let the database layer join its default columns for nothing.
+        return []
 
     if ('system_metadata' in expected_attrs and
             'flavor' not in expected_attrs):
@@ -238,6 +241,9 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
     def __init__(self, *args, **kwargs):
         super(Instance, self).__init__(*args, **kwargs)
         self._reset_metadata_tracking()
+        # NOTE: weak reference to the InstanceList holding this instance,
+        # used to lazy-load joined attributes for the whole list at once.
+        self._instance_list = None
 
     def _reset_metadata_tracking(self, fields=None):
         if fields is None or 'system_metadata' in fields:
@@ -911,6 +917,39 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
                 action='obj_load_attr',
                 reason='loading %s requires recursion' % attrname)
 
+    def _load_for_list(self, attrname):
+        """Lazy-load a joined attribute on the instances of our list.
+
+        All the instances of the InstanceList holding this one which lack
+        the attribute get it from a single query instead of one each.
+
+        :returns: False if the attribute could not be loaded this way
+        """
+        inst_list = self._instance_list and self._instance_list()
+        if inst_list is None:
+            return False
+        instances = [inst for inst in inst_list
+                     if not inst.obj_attr_is_set(attrname)]
+        if (len(instances) < 2 or
+                not any(inst is self for inst in instances)):
+            return False
+
+        LOG.debug("Lazy-loading `%(attr)s' on %(count)d instances",
+                  {'attr': attrname, 'count': len(instances)})
+        loaded = InstanceList.get_by_filters(
+            self._context, {'uuid': [inst.uuid for inst in instances]},
+            expected_attrs=[attrname])
+        loaded = {inst.uuid: inst for inst in loaded}
+        for inst in instances:
+            loaded_inst = loaded.get(inst.uuid)
+            if loaded_inst is None or not loaded_inst.obj_attr_is_set(
+                    attrname):
+                continue
+            inst[attrname] = loaded_inst[attrname]
+            if inst is not self:
+                inst.obj_reset_changes([attrname])
+        return self.obj_attr_is_set(attrname)
+
     def _load_fault(self):
         self.fault = objects.InstanceFault.get_latest_for_instance(
             self._context, self.uuid)
@@ -1022,6 +1061,9 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
             self._load_ec2_ids()
         elif 'flavor' in attrname:
             self._load_flavor()
+        elif (attrname in _INSTANCE_OPTIONAL_JOINED_FIELDS and
+                self._load_for_list(attrname)):
+            pass
         else:
             # FIXME(comstud): This should be optimized to only load the attr.
             self._load_generic(attrname)
@@ -1140,6 +1182,7 @@ def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
             inst_obj.fault = inst_faults.get(inst_obj.uuid, None)
         inst_list.objects.append(inst_obj)
     inst_list.obj_reset_changes()
+    inst_list._link_instances()
     return inst_list
 
 
@@ -1190,6 +1233,18 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         '1.17': '1.20',
         }
 
+    @classmethod
+    def _obj_from_primitive(cls, context, objver, primitive):
+        self = super(InstanceList, cls)._obj_from_primitive(context, objver,
+                                                            primitive)
+        self._link_instances()
+        return self
+
+    def _link_instances(self):
+        ref = weakref.ref(self)
+        for inst in self.objects:
+            inst._instance_list = ref
+
     @base.remotable_classmethod
     def get_by_filters(cls, context, filters,
                        sort_key='created_at', sort_dir='desc', limit=None,
@@ -1228,7 +1283,8 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
     def get_by_host_and_not_type(cls, context, host, type_id=None,
                                  expected_attrs=None):
         db_inst_list = db.instance_get_all_by_host_and_not_type(
-            context, host, type_id=type_id)
+            context, host, type_id=type_id,
+            columns_to_join=_expected_cols(expected_attrs))
         return _make_instance_list(context, cls(), db_inst_list,
                                    expected_attrs)
 
@@ -42,6 +42,7 @@ import nova.ipv6.api
 import nova.keymgr
 import nova.keymgr.barbican
 import nova.keymgr.conf_key_mgr
+import nova.manager
 import nova.netconf
 import nova.notifications
 import nova.objects.network
@@ -88,6 +89,7 @@ def list_opts():
              nova.db.sqlalchemy.api.db_opts,
              nova.exception.exc_log_opts,
              nova.image.s3.s3_opts,
+             nova.manager.periodic_opts,
              nova.netconf.netconf_opts,
              nova.notifications.notify_opts,
              nova.objects.network.network_opts,
@@ -56,6 +56,7 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
 
     def run_periodic_tasks(self, context):
         """Called from a periodic tasks in the manager."""
+        super(CachingScheduler, self).run_periodic_tasks(context)
         elevated = context.elevated()
         # NOTE(johngarbutt) Fetching the list of hosts before we get
         # a user request, so no user requests have to wait while we
@@ -19,17 +19,20 @@ You can customize this scheduler by specifying your own Host Filters and
 Weighing Functions.
 """
 
+import hashlib
 import random
 
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 from six.moves import range
 
 from nova import exception
-from nova.i18n import _
+from nova.i18n import _, _LI
 from nova import rpc
 from nova.scheduler import driver
 from nova.scheduler import scheduler_options
+from nova.scheduler import tracing
 
 
 CONF = cfg.CONF
@@ -45,10 +48,43 @@ filter_scheduler_opts = [
                     'chosen from. A value of 1 chooses the '
                     'first host returned by the weighing functions. '
                     'This value must be at least 1. Any value less than 1 '
-                    'will be ignored, and 1 will be used instead')
+                    'will be ignored, and 1 will be used instead'),
+    cfg.BoolOpt('scheduler_host_sharding',
+                default=False,
+                help='When several schedulers are running, spread the hosts '
+                     'across them and make each scheduler prefer the hosts '
+                     'assigned to it. This keeps concurrent schedulers from '
+                     'picking the same hosts and racing for their resources. '
+                     'A scheduler still falls back to the hosts assigned to '
+                     'its peers when none of its own hosts fit a request.'),
+    cfg.BoolOpt('scheduler_tracing',
+                default=False,
+                help='Record the time spent in each filter and weigher, the '
+                     'number of hosts each filter eliminated and the hit '
+                     'rates of the filter result caches for every request. '
+                     'The records are logged with each request, and their '
+                     'totals are logged by the periodic tasks of the '
+                     'scheduler.'),
+    cfg.BoolOpt('scheduler_tracing_notifications',
+                default=False,
+                help='Also emit the records of scheduler_tracing as '
+                     'scheduler.select_destinations.trace notifications.'),
 ]
 
 CONF.register_opts(filter_scheduler_opts)
+CONF.import_opt('host', 'nova.netconf')
+CONF.import_opt('scheduler_topic', 'nova.scheduler.rpcapi')
+
+
+def _shard_weight(scheduler_host, host_state):
+    """Return the weight of a scheduler for owning a host.
+
+    Each host is owned by the scheduler with the highest weight, so that
+    only the hosts owned by a scheduler which went away or the hosts taken
+    over by a new scheduler change owners.
+    """
+    key = '%s:%s:%s' % (scheduler_host, host_state.host, host_state.nodename)
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
 
 
 class FilterScheduler(driver.Scheduler):
@@ -57,6 +93,33 @@ class FilterScheduler(driver.Scheduler):
         super(FilterScheduler, self).__init__(*args, **kwargs)
         self.options = scheduler_options.SchedulerOptions()
         self.notifier = rpc.get_notifier('scheduler')
+        # Owning scheduler of each host, keyed by (host, node), for the set
+        # of schedulers in _shard_schedulers
+        self._shard_owners = {}
+        self._shard_schedulers = ()
+        # Totals of the request traces since the last periodic report
+        self._trace_totals = tracing.RequestTrace()
+
+    def run_periodic_tasks(self, context):
+        """Log the totals of the request traces, and save the instances of
+        the hosts.
+        """
+        if self._trace_totals.requests:
+            totals, self._trace_totals = (self._trace_totals,
+                                          tracing.RequestTrace())
+            LOG.info(_LI("Scheduling trace totals: %(trace)s"),
+                     {'trace': jsonutils.dumps(totals.to_dict())})
+        self.host_manager.save_instance_info_snapshot()
+
+    def _report_trace(self, context, trace):
+        trace.finish()
+        self._trace_totals.merge(trace)
+        record = trace.to_dict()
+        LOG.info(_LI("Scheduling trace: %(trace)s"),
+                 {'trace': jsonutils.dumps(record)})
+        if CONF.scheduler_tracing_notifications:
+            self.notifier.info(context, 'scheduler.select_destinations.trace',
+                               record)
 
     def select_destinations(self, context, request_spec, filter_properties):
         """Selects a filtered set of hosts and nodes."""
@@ -64,8 +127,17 @@ class FilterScheduler(driver.Scheduler):
                            dict(request_spec=request_spec))
 
         num_instances = request_spec['num_instances']
-        selected_hosts = self._schedule(context, request_spec,
-                                        filter_properties)
+        trace = None
+        if CONF.scheduler_tracing:
+            trace = tracing.RequestTrace()
+            filter_properties[tracing.TRACE_KEY] = trace
+        try:
+            selected_hosts = self._schedule(context, request_spec,
+                                            filter_properties)
+        finally:
+            if trace is not None:
+                del filter_properties[tracing.TRACE_KEY]
+                self._report_trace(context, trace)
 
         # Couldn't fulfill the request_spec
         if len(selected_hosts) < num_instances:
@@ -138,9 +210,15 @@ class FilterScheduler(driver.Scheduler):
         # traverse this list once. This can bite you if the hosts
         # are being scanned in a filter or weighing function.
         hosts = self._get_all_host_states(elevated)
+        if CONF.scheduler_host_sharding:
+            self._update_shard_schedulers(elevated)
 
-        selected_hosts = []
         num_instances = request_spec.get('num_instances', 1)
+        if num_instances > 1 and update_group_hosts is not True:
+            return self._schedule_batch(hosts, instance_properties,
+                                        filter_properties, num_instances)
+
+        selected_hosts = []
         for num in range(num_instances):
             # Filter local hosts based on requirements ...
             hosts = self.host_manager.get_filtered_hosts(hosts,
@@ -151,16 +229,17 @@ class FilterScheduler(driver.Scheduler):
 
             LOG.debug("Filtered %(hosts)s", {'hosts': hosts})
 
-            weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
-                    filter_properties)
+            # Only the best hosts are needed to choose one from
+            scheduler_host_subset_size = max(CONF.scheduler_host_subset_size,
+                                             1)
+            weighed_hosts = self.host_manager.get_weighed_hosts(
+                    self._get_preferred_hosts(hosts), filter_properties,
+                    limit=scheduler_host_subset_size)
 
             LOG.debug("Weighed %(hosts)s", {'hosts': weighed_hosts})
 
-            scheduler_host_subset_size = CONF.scheduler_host_subset_size
             if scheduler_host_subset_size > len(weighed_hosts):
                 scheduler_host_subset_size = len(weighed_hosts)
-            if scheduler_host_subset_size < 1:
-                scheduler_host_subset_size = 1
 
             chosen_host = random.choice(
                 weighed_hosts[0:scheduler_host_subset_size])
@@ -180,6 +259,94 @@ class FilterScheduler(driver.Scheduler):
                 filter_properties['group_hosts'].add(chosen_host.obj.host)
         return selected_hosts
 
+    def _schedule_batch(self, hosts, instance_properties, filter_properties,
+                        num_instances):
+        """Returns the hosts selected for num_instances instances, ordered
+        like _schedule() would.
+
+        The hosts are only filtered and weighed once for the whole request.
+        Consuming an instance on a host only changes the state of that host,
+        so only the chosen host is filtered and weighed again before
+        selecting the host of the next instance. This must not be used for
+        server groups, since choosing a host changes the group hosts every
+        host is filtered against.
+        """
+        hosts = self.host_manager.get_filtered_hosts(hosts,
+                filter_properties, index=0)
+        if not hosts:
+            return []
+
+        LOG.debug("Filtered %(hosts)s", {'hosts': hosts})
+
+        # Only the best hosts are needed to choose one from
+        scheduler_host_subset_size = max(CONF.scheduler_host_subset_size, 1)
+        weighing = None
+        full_hosts = set()
+        selected_hosts = []
+        for num in range(num_instances):
+            if not weighing:
+                # Weigh the remaining hosts, preferring the hosts owned by
+                # this scheduler again if some of them are left
+                if full_hosts:
+                    hosts = [host_state for host_state in hosts
+                             if host_state not in full_hosts]
+                    full_hosts = set()
+                if not hosts:
+                    break
+                weighing = self.host_manager.get_incremental_weighing(
+                        self._get_preferred_hosts(hosts), filter_properties)
+
+            weighed_hosts = weighing.get_best(scheduler_host_subset_size)
+            LOG.debug("Weighed %(hosts)s", {'hosts': weighed_hosts})
+
+            chosen_host = random.choice(weighed_hosts)
+            LOG.debug("Selected host: %(host)s", {'host': chosen_host})
+            selected_hosts.append(chosen_host)
+
+            # Now consume the resources, and check if the host still fits
+            # the next instance.
+            host_state = chosen_host.obj
+            host_state.consume_from_instance(instance_properties)
+            if num + 1 == num_instances:
+                break
+            if self.host_manager.get_filtered_hosts(
+                    [host_state], filter_properties, index=num + 1):
+                weighing.update(host_state)
+            else:
+                weighing.remove(host_state)
+                full_hosts.add(host_state)
+        return selected_hosts
+
+    def _update_shard_schedulers(self, context):
+        """Refresh the set of schedulers the hosts are spread across."""
+        schedulers = tuple(sorted(set(self.hosts_up(context,
+                                                    CONF.scheduler_topic))))
+        if schedulers != self._shard_schedulers:
+            LOG.debug("Spreading hosts across schedulers %(schedulers)s",
+                      {'schedulers': schedulers})
+            self._shard_schedulers = schedulers
+            self._shard_owners = {}
+
+    def _get_preferred_hosts(self, hosts):
+        """Return the hosts owned by this scheduler when host sharding is
+        enabled, or all the hosts if it owns none of them.
+        """
+        if (not CONF.scheduler_host_sharding or
+                len(self._shard_schedulers) < 2):
+            return hosts
+
+        owned_hosts = []
+        for host_state in hosts:
+            state_key = (host_state.host, host_state.nodename)
+            owner = self._shard_owners.get(state_key)
+            if owner is None:
+                owner = max(self._shard_schedulers,
+                            key=lambda s: _shard_weight(s, host_state))
+                self._shard_owners[state_key] = owner
+            if owner == CONF.host:
+                owned_hosts.append(host_state)
+        return owned_hosts or hosts
+
     def _get_all_host_states(self, context):
         """Template method, so a subclass can implement caching."""
         return self.host_manager.get_all_host_states(context)
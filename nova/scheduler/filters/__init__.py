@@ -17,11 +17,58 @@
 Scheduler host filters
 """
 
+import collections
+
+from oslo_config import cfg
+from oslo_serialization import jsonutils
+
 from nova import filters
+from nova.scheduler import tracing
+
+filter_cache_size_opt = cfg.IntOpt('scheduler_filter_cache_size',
+        default=0,
+        help='Maximum number of host filter results cached by each filter '
+             'declaring the request keys it depends on. Cached results are '
+             'reused for a host as long as its state and the values of '
+             'those keys do not change. 0 disables the cache.')
+
+CONF = cfg.CONF
+CONF.register_opt(filter_cache_size_opt)
+
+
+class FilterResultCache(object):
+    """Bounded LRU cache of host filter results."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._results = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, key):
+        """Return the cached result for key, or None if there is none."""
+        result = self._results.pop(key, None)
+        if result is not None:
+            self._results[key] = result
+        return result
+
+    def set(self, key, result):
+        self._results.pop(key, None)
+        self._results[key] = result
+        if len(self._results) > self.max_size:
+            self._results.popitem(last=False)
 
 
 class BaseHostFilter(filters.BaseFilter):
     """Base class for host filters."""
+
+    # Set in a subclass to the filter_properties key paths host_passes()
+    # depends on, e.g. (('instance_type', 'extra_specs'),), if its result is
+    # only a function of the HostState and of those values. The results are
+    # then cached per host state generation and request values.
+    cached_request_keys = None
+
     def _filter_one(self, obj, filter_properties):
         """Return True if the object passes the filter, otherwise False."""
         return self.host_passes(obj, filter_properties)
@@ -32,6 +79,52 @@ class BaseHostFilter(filters.BaseFilter):
         """
         raise NotImplementedError()
 
+    def _request_fingerprint(self, filter_properties):
+        values = []
+        for key_path in self.cached_request_keys:
+            value = filter_properties
+            for key in key_path:
+                value = value.get(key, None) if value is not None else None
+            values.append(value)
+        return jsonutils.dumps(values, sort_keys=True)
+
+    def _get_result_cache(self):
+        cache = getattr(self, '_result_cache', None)
+        if cache is None or cache.max_size != CONF.scheduler_filter_cache_size:
+            cache = self._result_cache = FilterResultCache(
+                CONF.scheduler_filter_cache_size)
+        return cache
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts passing the filter, reusing cached results when
+        the filter declares the request keys it depends on.
+        """
+        if (self.cached_request_keys is None or
+                CONF.scheduler_filter_cache_size <= 0):
+            for obj in super(BaseHostFilter, self).filter_all(
+                    filter_obj_list, filter_properties):
+                yield obj
+            return
+
+        cache = self._get_result_cache()
+        fingerprint = self._request_fingerprint(filter_properties)
+        misses = 0
+        for host_state in filter_obj_list:
+            key = (host_state.host, host_state.nodename,
+                   host_state.generation, fingerprint)
+            passes = cache.get(key)
+            if passes is None:
+                misses += 1
+                passes = self.host_passes(host_state, filter_properties)
+                cache.set(key, passes)
+            if passes:
+                yield host_state
+
+        trace = tracing.get_trace(filter_properties)
+        if trace is not None:
+            trace.add_cache_lookups(self.__class__.__name__,
+                                    len(filter_obj_list) - misses, misses)
+
 
 class HostFilterHandler(filters.BaseFilterHandler):
     def __init__(self):
@@ -40,20 +40,13 @@ class BaseCoreFilter(filters.BaseHostFilter):
     def _get_cpu_allocation_ratio(self, host_state, filter_properties):
         raise NotImplementedError
 
-    def host_passes(self, host_state, filter_properties):
-        """Return True if host has sufficient CPU cores."""
-        instance_type = filter_properties.get('instance_type')
-        if not instance_type:
-            return True
-
+    def _host_has_vcpus(self, host_state, instance_vcpus,
+                        cpu_allocation_ratio):
         if not host_state.vcpus_total:
             # Fail safe
             LOG.warning(_LW("VCPUs not set; assuming CPU collection broken"))
             return True
 
-        instance_vcpus = instance_type['vcpus']
-        cpu_allocation_ratio = self._get_cpu_allocation_ratio(host_state,
-                                                          filter_properties)
         vcpus_total = host_state.vcpus_total * cpu_allocation_ratio
 
         # Only provide a VCPU limit to compute if the virt driver is reporting
@@ -73,6 +66,38 @@ class BaseCoreFilter(filters.BaseHostFilter):
 
         return True
 
+    def host_passes(self, host_state, filter_properties):
+        """Return True if host has sufficient CPU cores."""
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return True
+
+        cpu_allocation_ratio = self._get_cpu_allocation_ratio(host_state,
+                                                          filter_properties)
+        return self._host_has_vcpus(host_state, instance_type['vcpus'],
+                                    cpu_allocation_ratio)
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts with sufficient CPU cores.
+
+        The requested vCPUs are only looked up once per request, and the
+        allocation ratio once per set of aggregates.
+        """
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return iter(filter_obj_list)
+        instance_vcpus = instance_type['vcpus']
+
+        def get_ratio(host_state):
+            return self._get_cpu_allocation_ratio(host_state,
+                                                  filter_properties)
+
+        def has_vcpus(host_state, ratio):
+            return self._host_has_vcpus(host_state, instance_vcpus, ratio)
+
+        return utils.filter_hosts_by_aggregate_value(filter_obj_list,
+                                                     get_ratio, has_vcpus)
+
 
 class CoreFilter(BaseCoreFilter):
     """CoreFilter filters based on CPU core utilization."""
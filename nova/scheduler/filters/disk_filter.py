@@ -35,19 +35,11 @@ class DiskFilter(filters.BaseHostFilter):
     def _get_disk_allocation_ratio(self, host_state, filter_properties):
         return CONF.disk_allocation_ratio
 
-    def host_passes(self, host_state, filter_properties):
-        """Filter based on disk usage."""
-        instance_type = filter_properties.get('instance_type')
-        requested_disk = (1024 * (instance_type['root_gb'] +
-                                 instance_type['ephemeral_gb']) +
-                         instance_type['swap'])
-
+    def _host_has_disk(self, host_state, requested_disk,
+                       disk_allocation_ratio):
         free_disk_mb = host_state.free_disk_mb
         total_usable_disk_mb = host_state.total_usable_disk_gb * 1024
 
-        disk_allocation_ratio = self._get_disk_allocation_ratio(
-            host_state, filter_properties)
-
         disk_mb_limit = total_usable_disk_mb * disk_allocation_ratio
         used_disk_mb = total_usable_disk_mb - free_disk_mb
         usable_disk_mb = disk_mb_limit - used_disk_mb
@@ -64,6 +56,39 @@ class DiskFilter(filters.BaseHostFilter):
         host_state.limits['disk_gb'] = disk_gb_limit
         return True
 
+    @staticmethod
+    def _requested_disk(filter_properties):
+        instance_type = filter_properties.get('instance_type')
+        return (1024 * (instance_type['root_gb'] +
+                        instance_type['ephemeral_gb']) +
+                instance_type['swap'])
+
+    def host_passes(self, host_state, filter_properties):
+        """Filter based on disk usage."""
+        requested_disk = self._requested_disk(filter_properties)
+        disk_allocation_ratio = self._get_disk_allocation_ratio(
+            host_state, filter_properties)
+        return self._host_has_disk(host_state, requested_disk,
+                                   disk_allocation_ratio)
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts with sufficient disk.
+
+        The requested disk is only computed once per request, and the
+        allocation ratio once per set of aggregates.
+        """
+        requested_disk = self._requested_disk(filter_properties)
+
+        def get_ratio(host_state):
+            return self._get_disk_allocation_ratio(host_state,
+                                                   filter_properties)
+
+        def has_disk(host_state, ratio):
+            return self._host_has_disk(host_state, requested_disk, ratio)
+
+        return utils.filter_hosts_by_aggregate_value(filter_obj_list,
+                                                     get_ratio, has_disk)
+
 
 class AggregateDiskFilter(DiskFilter):
     """AggregateDiskFilter with per-aggregate disk allocation ratio flag.
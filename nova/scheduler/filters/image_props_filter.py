@@ -41,6 +41,8 @@ class ImagePropertiesFilter(filters.BaseHostFilter):
     # a request
     run_filter_once_per_request = True
 
+    cached_request_keys = (('request_spec', 'image', 'properties'),)
+
     def _instance_supported(self, host_state, image_props,
                             hypervisor_version):
         img_arch = image_props.get('architecture', None)
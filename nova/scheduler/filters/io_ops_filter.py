@@ -39,13 +39,8 @@ class IoOpsFilter(filters.BaseHostFilter):
     def _get_max_io_ops_per_host(self, host_state, filter_properties):
         return CONF.max_io_ops_per_host
 
-    def host_passes(self, host_state, filter_properties):
-        """Use information about current vm and task states collected from
-        compute node statistics to decide whether to filter.
-        """
+    def _host_passes_io_ops(self, host_state, max_io_ops):
         num_io_ops = host_state.num_io_ops
-        max_io_ops = self._get_max_io_ops_per_host(
-            host_state, filter_properties)
         passes = num_io_ops < max_io_ops
         if not passes:
             LOG.debug("%(host_state)s fails I/O ops check: Max IOs per host "
@@ -54,6 +49,26 @@ class IoOpsFilter(filters.BaseHostFilter):
                          'max_io_ops': max_io_ops})
         return passes
 
+    def host_passes(self, host_state, filter_properties):
+        """Use information about current vm and task states collected from
+        compute node statistics to decide whether to filter.
+        """
+        max_io_ops = self._get_max_io_ops_per_host(
+            host_state, filter_properties)
+        return self._host_passes_io_ops(host_state, max_io_ops)
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts with few enough concurrent I/O operations.
+
+        The maximum is only looked up once per set of aggregates.
+        """
+        def get_max_io_ops(host_state):
+            return self._get_max_io_ops_per_host(host_state,
+                                                 filter_properties)
+
+        return utils.filter_hosts_by_aggregate_value(
+            filter_obj_list, get_max_io_ops, self._host_passes_io_ops)
+
 
 class AggregateIoOpsFilter(IoOpsFilter):
     """AggregateIoOpsFilter with per-aggregate the max io operations.
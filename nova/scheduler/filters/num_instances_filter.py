@@ -36,10 +36,8 @@ class NumInstancesFilter(filters.BaseHostFilter):
     def _get_max_instances_per_host(self, host_state, filter_properties):
         return CONF.max_instances_per_host
 
-    def host_passes(self, host_state, filter_properties):
+    def _host_passes_num_instances(self, host_state, max_instances):
         num_instances = host_state.num_instances
-        max_instances = self._get_max_instances_per_host(
-            host_state, filter_properties)
         passes = num_instances < max_instances
         if not passes:
             LOG.debug("%(host_state)s fails num_instances check: Max "
@@ -48,6 +46,24 @@ class NumInstancesFilter(filters.BaseHostFilter):
                          'max_instances': max_instances})
         return passes
 
+    def host_passes(self, host_state, filter_properties):
+        max_instances = self._get_max_instances_per_host(
+            host_state, filter_properties)
+        return self._host_passes_num_instances(host_state, max_instances)
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts with few enough instances.
+
+        The maximum is only looked up once per set of aggregates.
+        """
+        def get_max_instances(host_state):
+            return self._get_max_instances_per_host(host_state,
+                                                    filter_properties)
+
+        return utils.filter_hosts_by_aggregate_value(
+            filter_obj_list, get_max_instances,
+            self._host_passes_num_instances)
+
 
 class AggregateNumInstancesFilter(NumInstancesFilter):
     """AggregateNumInstancesFilter with per-aggregate the max num instances.
@@ -39,16 +39,10 @@ class BaseRamFilter(filters.BaseHostFilter):
     def _get_ram_allocation_ratio(self, host_state, filter_properties):
         raise NotImplementedError
 
-    def host_passes(self, host_state, filter_properties):
-        """Only return hosts with sufficient available RAM."""
-        instance_type = filter_properties.get('instance_type')
-        requested_ram = instance_type['memory_mb']
+    def _host_has_ram(self, host_state, requested_ram, ram_allocation_ratio):
         free_ram_mb = host_state.free_ram_mb
         total_usable_ram_mb = host_state.total_usable_ram_mb
 
-        ram_allocation_ratio = self._get_ram_allocation_ratio(host_state,
-                                                          filter_properties)
-
         memory_mb_limit = total_usable_ram_mb * ram_allocation_ratio
         used_ram_mb = total_usable_ram_mb - free_ram_mb
         usable_ram = memory_mb_limit - used_ram_mb
@@ -64,6 +58,34 @@ class BaseRamFilter(filters.BaseHostFilter):
         host_state.limits['memory_mb'] = memory_mb_limit
         return True
 
+    def host_passes(self, host_state, filter_properties):
+        """Only return hosts with sufficient available RAM."""
+        instance_type = filter_properties.get('instance_type')
+        requested_ram = instance_type['memory_mb']
+        ram_allocation_ratio = self._get_ram_allocation_ratio(host_state,
+                                                          filter_properties)
+        return self._host_has_ram(host_state, requested_ram,
+                                  ram_allocation_ratio)
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts with sufficient available RAM.
+
+        The requested RAM is only looked up once per request, and the
+        allocation ratio once per set of aggregates.
+        """
+        instance_type = filter_properties.get('instance_type')
+        requested_ram = instance_type['memory_mb']
+
+        def get_ratio(host_state):
+            return self._get_ram_allocation_ratio(host_state,
+                                                  filter_properties)
+
+        def has_ram(host_state, ratio):
+            return self._host_has_ram(host_state, requested_ram, ratio)
+
+        return utils.filter_hosts_by_aggregate_value(filter_obj_list,
+                                                     get_ratio, has_ram)
+
 
 class RamFilter(BaseRamFilter):
     """Ram Filter with over subscription flag."""
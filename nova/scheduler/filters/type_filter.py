@@ -25,6 +25,8 @@ class TypeAffinityFilter(filters.BaseHostFilter):
     (spread) set to 1 (default).
     """
 
+    cached_request_keys = (('instance_type', 'id'),)
+
     def host_passes(self, host_state, filter_properties):
         """Dynamically limits hosts to one instance type
 
@@ -48,6 +50,8 @@ class AggregateTypeAffinityFilter(filters.BaseHostFilter):
     # Aggregate data does not change within a request
     run_filter_once_per_request = True
 
+    cached_request_keys = (('instance_type', 'name'),)
+
     def host_passes(self, host_state, filter_properties):
         instance_type = filter_properties.get('instance_type')
 
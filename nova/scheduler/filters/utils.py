@@ -33,6 +33,22 @@ def aggregate_values_from_key(host_state, key_name):
               }
 
 
+def filter_hosts_by_aggregate_value(host_states, get_value, host_passes):
+    """Yield the host states passing host_passes(host_state, value).
+
+    The value is given by get_value(host_state), which must only depend on
+    the aggregates of the host: it is computed once for all the hosts
+    belonging to the same aggregates rather than once per host.
+    """
+    values = {}
+    for host_state in host_states:
+        key = tuple(id(aggr) for aggr in host_state.aggregates)
+        if key not in values:
+            values[key] = get_value(host_state)
+        if host_passes(host_state, values[key]):
+            yield host_state
+
+
 def aggregate_metadata_get_by_host(host_state, key=None):
     """Returns a dict of all metadata based on a metadata key for a specific
     host. If the key is not provided, returns a dict of all metadata.
@@ -18,6 +18,9 @@ Manage hosts in the current zone.
 """
 
 import collections
+import datetime
+import itertools
+import os
 import time
 try:
     from collections import UserDict as IterableUserDict   # Python 3
@@ -40,6 +43,7 @@ from nova.i18n import _, _LI, _LW
 from nova import objects
 from nova.pci import stats as pci_stats
 from nova.scheduler import filters
+from nova.scheduler import tracing
 from nova.scheduler import weights
 from nova import utils
 from nova.virt import hardware
@@ -71,6 +75,26 @@ host_manager_opts = [
                default=True,
                help='Determines if the Scheduler tracks changes to instances '
                     'to help with its filtering decisions.'),
+    cfg.BoolOpt('scheduler_incremental_host_states',
+               default=False,
+               help='Keep the host states in memory between requests and only '
+                    'reload the compute nodes that changed since the last '
+                    'request, instead of loading all of them each time. A '
+                    'full reload is still done periodically, see '
+                    'scheduler_host_states_full_refresh_interval.'),
+    cfg.IntOpt('scheduler_host_states_full_refresh_interval',
+               default=600,
+               help='Interval in seconds between full reloads of the compute '
+                    'nodes when scheduler_incremental_host_states is enabled. '
+                    'Full reloads reconcile the in-memory host states with '
+                    'the database.'),
+    cfg.StrOpt('scheduler_instance_info_snapshot',
+               help='Path of a file the scheduler periodically saves the '
+                    'instances of the hosts to, when it tracks the instance '
+                    'changes. At start-up, the instances are loaded from '
+                    'this file instead of the database, and the instance '
+                    'syncs of the compute nodes correct the hosts whose '
+                    'instances changed since the file was saved.'),
 ]
 
 CONF = cfg.CONF
@@ -78,6 +102,15 @@ CONF.register_opts(host_manager_opts)
 
 LOG = logging.getLogger(__name__)
 HOST_INSTANCE_SEMAPHORE = "host_instance"
+# Number of seconds the incremental compute node queries overlap the previous
+# one, to cope with clock drift between the nodes writing updated_at.
+HOST_STATE_DELTA_OVERLAP = 5
+# Version of the format of the instance info snapshots
+INSTANCE_INFO_SNAPSHOT_VERSION = 1
+# Host state generations are unique within the process, so that a HostState
+# recreated for a node does not hit the filter results cached for the one
+# it replaces.
+_GENERATIONS = itertools.count()
 
 
 class ReadOnlyDict(IterableUserDict):
@@ -157,6 +190,10 @@ class HostState(object):
         # Instances on this host
         self.instances = {}
 
+        # Changed each time the state of the host changes, so that the
+        # filter results cached for a generation are not reused for another
+        self.generation = next(_GENERATIONS)
+
         self.updated = None
         if compute:
             self.update_from_compute_node(compute)
@@ -164,6 +201,10 @@ class HostState(object):
     def update_service(self, service):
         self.service = ReadOnlyDict(service)
 
+    def new_generation(self):
+        """Invalidate the filter results cached for the host state."""
+        self.generation = next(_GENERATIONS)
+
     def _update_metrics_from_compute_node(self, compute):
         """Update metrics from a ComputeNode object."""
         # NOTE(llu): The 'or []' is to avoid json decode failure of None
@@ -190,6 +231,8 @@ class HostState(object):
         if (self.updated and compute.updated_at
                 and self.updated > compute.updated_at):
             return
+        if self.updated is None or self.updated != compute.updated_at:
+            self.new_generation()
         all_ram_mb = compute.memory_mb
 
         # Assume virtual size is all consumed by instances if use qcow2 disk.
@@ -247,6 +290,7 @@ class HostState(object):
 
     def consume_from_instance(self, instance):
         """Incrementally update host state from an instance."""
+        self.new_generation()
         disk_mb = (instance['root_gb'] + instance['ephemeral_gb']) * 1024
         ram_mb = instance['memory_mb']
         vcpus = instance['vcpus']
@@ -331,6 +375,10 @@ class HostManager(object):
         # to those aggregates
         self.host_aggregates_map = collections.defaultdict(set)
         self._init_aggregates()
+        # Times of the last compute node reload, used when the host states
+        # are incrementally refreshed
+        self._last_full_refresh = None
+        self._last_refresh = None
         self.tracks_instance_changes = CONF.scheduler_tracks_instance_changes
         # Dict of instances and status, keyed by host
         self._instance_info = {}
@@ -384,6 +432,10 @@ class HostManager(object):
         The async method allows us to simply mock out the _init_instance_info()
         method in tests.
         """
+        instance_info = self._load_instance_info_snapshot()
+        if instance_info is not None:
+            self._instance_info = instance_info
+            return
 
         def _async_init_instance_info():
             context = context_module.get_admin_context()
@@ -402,8 +454,8 @@ class HostManager(object):
                 end_node += batch_size
                 filters = {"host": [curr_node.host
                                     for curr_node in curr_nodes]}
-                result = objects.InstanceList.get_by_filters(context,
-                                                             filters)
+                result = objects.InstanceList.get_by_filters(
+                    context, filters, expected_attrs=[])
                 instances = result.objects
                 LOG.debug("Adding %s instances for hosts %s-%s",
                           len(instances), start_node, end_node)
@@ -421,6 +473,79 @@ class HostManager(object):
         # Run this async so that we don't block the scheduler start-up
         utils.spawn_n(_async_init_instance_info)
 
+    def _load_instance_info_snapshot(self):
+        """Returns the instance info saved by save_instance_info_snapshot(),
+        or None if there is no usable snapshot.
+        """
+        path = CONF.scheduler_instance_info_snapshot
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path) as snapshot_file:
+                snapshot = jsonutils.load(snapshot_file)
+        except (IOError, ValueError) as e:
+            LOG.warning(_LW("Could not load the instance info snapshot "
+                            "%(path)s: %(error)s"),
+                        {'path': path, 'error': e})
+            return None
+        if not isinstance(snapshot, dict):
+            snapshot = {}
+        if snapshot.get('version') != INSTANCE_INFO_SNAPSHOT_VERSION:
+            LOG.info(_LI("Ignoring the instance info snapshot %(path)s of "
+                         "version %(version)s"),
+                     {'path': path, 'version': snapshot.get('version')})
+            return None
+
+        # NOTE: Only the fields used by the filters are saved. The hosts are
+        # not marked as updated, so that their instances are loaded from the
+        # database until their compute node confirms the instances.
+        instance_info = {}
+        try:
+            for host_name, instances in six.iteritems(snapshot['hosts']):
+                instance_info[host_name] = {
+                    "instances": {
+                        uuid: objects.Instance(
+                            uuid=uuid, instance_type_id=instance_type_id)
+                        for uuid, instance_type_id in six.iteritems(
+                            instances)},
+                    "updated": False}
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            LOG.warning(_LW("Could not load the instance info snapshot "
+                            "%(path)s: %(error)s"),
+                        {'path': path, 'error': e})
+            return None
+        LOG.info(_LI("Loaded the instances of %(num_hosts)d hosts from the "
+                     "snapshot %(path)s"),
+                 {'num_hosts': len(instance_info), 'path': path})
+        return instance_info
+
+    @utils.synchronized(HOST_INSTANCE_SEMAPHORE)
+    def _get_instance_info_snapshot(self):
+        hosts = {}
+        for host_name, host_info in six.iteritems(self._instance_info):
+            hosts[host_name] = {
+                uuid: (instance.instance_type_id
+                       if instance.obj_attr_is_set('instance_type_id')
+                       else None)
+                for uuid, instance in six.iteritems(host_info["instances"])}
+        return {'version': INSTANCE_INFO_SNAPSHOT_VERSION, 'hosts': hosts}
+
+    def save_instance_info_snapshot(self):
+        """Saves the instances of the hosts, to be loaded at the next start."""
+        path = CONF.scheduler_instance_info_snapshot
+        if not path or not self.tracks_instance_changes:
+            return
+        snapshot = self._get_instance_info_snapshot()
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as snapshot_file:
+                jsonutils.dump(snapshot, snapshot_file)
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as e:
+            LOG.warning(_LW("Could not save the instance info snapshot "
+                            "%(path)s: %(error)s"),
+                        {'path': path, 'error': e})
+
     def _choose_host_filters(self, filter_cls_names):
         """Since the caller may specify which filters to use we need
         to have an authoritative list of what is permissible. This
@@ -520,12 +645,57 @@ class HostManager(object):
             hosts = six.itervalues(name_to_cls_map)
 
         return self.filter_handler.get_filtered_objects(filters,
-                hosts, filter_properties, index)
+                hosts, filter_properties, index,
+                trace=tracing.get_trace(filter_properties))
 
-    def get_weighed_hosts(self, hosts, weight_properties):
-        """Weigh the hosts."""
+    def get_weighed_hosts(self, hosts, weight_properties, limit=None):
+        """Weigh the hosts, only returning the limit best ones if set."""
         return self.weight_handler.get_weighed_objects(self.weighers,
-                hosts, weight_properties)
+                hosts, weight_properties, limit=limit,
+                trace=tracing.get_trace(weight_properties))
+
+    def get_incremental_weighing(self, hosts, weight_properties):
+        """Weigh the hosts, so that they can be weighed again one by one."""
+        return self.weight_handler.get_incremental_weighing(self.weighers,
+                hosts, weight_properties,
+                trace=tracing.get_trace(weight_properties))
+
+    def _get_compute_nodes(self, context):
+        """Returns the compute nodes to use for refreshing the host states.
+
+        The second item of the returned tuple tells whether the list contains
+        all the compute nodes, or only the ones that changed since the last
+        refresh when scheduler_incremental_host_states is set.
+        """
+        now = timeutils.utcnow()
+        if (not CONF.scheduler_incremental_host_states or
+                self._last_full_refresh is None or
+                timeutils.is_older_than(
+                    self._last_full_refresh,
+                    CONF.scheduler_host_states_full_refresh_interval)):
+            self._last_full_refresh = self._last_refresh = now
+            return objects.ComputeNodeList.get_all(context), True
+
+        since = self._last_refresh - datetime.timedelta(
+            seconds=HOST_STATE_DELTA_OVERLAP)
+        self._last_refresh = now
+        compute_nodes = objects.ComputeNodeList.get_all_changed_since(
+            context, since).objects
+        changed_keys = set((compute.host, compute.hypervisor_hostname)
+                           for compute in compute_nodes)
+        # NOTE: The filter scheduler resets the updated field of the host
+        # states it consumed when a request fails, so that their resources
+        # are released. Those have to be reloaded even if they didn't change.
+        for state_key, host_state in six.iteritems(self.host_state_map):
+            if host_state.updated is not None or state_key in changed_keys:
+                continue
+            try:
+                compute_nodes.append(
+                    objects.ComputeNode.get_by_host_and_nodename(
+                        context, *state_key))
+            except exception.ComputeHostNotFound:
+                pass
+        return compute_nodes, False
 
     def get_all_host_states(self, context):
         """Returns a list of HostStates that represents all the hosts
@@ -537,46 +707,62 @@ class HostManager(object):
                         for service in objects.ServiceList.get_by_binary(
                             context, 'nova-compute')}
         # Get resource usage across the available compute nodes:
-        compute_nodes = objects.ComputeNodeList.get_all(context)
+        compute_nodes, full_refresh = self._get_compute_nodes(context)
         seen_nodes = set()
+        dead_nodes = set()
         for compute in compute_nodes:
-            service = service_refs.get(compute.host)
-
-            if not service:
-                LOG.warning(_LW(
-                    "No compute service record found for host %(host)s"),
-                    {'host': compute.host})
-                continue
             host = compute.host
             node = compute.hypervisor_hostname
             state_key = (host, node)
+            if not full_refresh and compute.deleted:
+                dead_nodes.add(state_key)
+                continue
+            if host not in service_refs:
+                LOG.warning(_LW(
+                    "No compute service record found for host %(host)s"),
+                    {'host': host})
+                dead_nodes.add(state_key)
+                continue
             host_state = self.host_state_map.get(state_key)
             if host_state:
                 host_state.update_from_compute_node(compute)
             else:
                 host_state = self.host_state_cls(host, node, compute=compute)
                 self.host_state_map[state_key] = host_state
-            # We force to update the aggregates info each time a new request
-            # comes in, because some changes on the aggregates could have been
-            # happening after setting this field for the first time
-            host_state.aggregates = [self.aggs_by_id[agg_id] for agg_id in
-                                     self.host_aggregates_map[
-                                         host_state.host]]
-            host_state.update_service(dict(service))
-            self._add_instance_info(context, compute, host_state)
             seen_nodes.add(state_key)
 
-        # remove compute nodes from host_state_map if they are not active
-        dead_nodes = set(self.host_state_map.keys()) - seen_nodes
+        if full_refresh:
+            # remove compute nodes from host_state_map if they are not active
+            dead_nodes = set(self.host_state_map.keys()) - seen_nodes
+        else:
+            # remove the compute nodes whose service went away since they
+            # were loaded, but keep the ones re-created after a deletion
+            dead_nodes.update(state_key for state_key in self.host_state_map
+                              if state_key[0] not in service_refs)
+            dead_nodes -= seen_nodes
         for state_key in dead_nodes:
+            if state_key not in self.host_state_map:
+                continue
             host, node = state_key
             LOG.info(_LI("Removing dead compute node %(host)s:%(node)s "
                          "from scheduler"), {'host': host, 'node': node})
             del self.host_state_map[state_key]
 
+        for host_state in six.itervalues(self.host_state_map):
+            # We force to update the aggregates info each time a new request
+            # comes in, because some changes on the aggregates could have been
+            # happening after setting this field for the first time
+            aggregates = [self.aggs_by_id[agg_id] for agg_id in
+                          self.host_aggregates_map[host_state.host]]
+            if aggregates != host_state.aggregates:
+                host_state.aggregates = aggregates
+                host_state.new_generation()
+            host_state.update_service(dict(service_refs[host_state.host]))
+            self._add_instance_info(context, host_state.host, host_state)
+
         return six.itervalues(self.host_state_map)
 
-    def _add_instance_info(self, context, compute, host_state):
+    def _add_instance_info(self, context, host_name, host_state):
         """Adds the host instance info to the host_state object.
 
         Some older compute nodes may not be sending instance change updates to
@@ -586,7 +772,6 @@ class HostManager(object):
         In those cases, we need to grab the current InstanceList instead of
         relying on the version in _instance_info.
         """
-        host_name = compute.host
         host_info = self._instance_info.get(host_name)
         if host_info and host_info.get("updated"):
             inst_dict = host_info["instances"]
@@ -595,13 +780,24 @@ class HostManager(object):
             inst_list = objects.InstanceList.get_by_host(context, host_name)
             inst_dict = {instance.uuid: instance
                          for instance in inst_list.objects}
-        host_state.instances = inst_dict
+        if host_state.instances is not inst_dict:
+            host_state.instances = inst_dict
+            host_state.new_generation()
+
+    def _instance_info_changed(self, host_name):
+        """Invalidates the filter results cached for the host states of a
+        host whose instances were updated in place.
+        """
+        for host_state in six.itervalues(self.host_state_map):
+            if host_state.host == host_name:
+                host_state.new_generation()
 
     def _recreate_instance_info(self, context, host_name):
         """Get the InstanceList for the specified host, and store it in the
         _instance_info dict.
         """
-        instances = objects.InstanceList.get_by_host(context, host_name)
+        instances = objects.InstanceList.get_by_host(context, host_name,
+                                                     expected_attrs=[])
         inst_dict = {instance.uuid: instance for instance in instances}
         host_info = self._instance_info[host_name] = {}
         host_info["instances"] = inst_dict
@@ -622,6 +818,7 @@ class HostManager(object):
                 # Overwrite the entry (if any) with the new info.
                 inst_dict[instance.uuid] = instance
             host_info["updated"] = True
+            self._instance_info_changed(host_name)
         else:
             instances = instance_info.objects
             if len(instances) > 1:
@@ -648,25 +845,32 @@ class HostManager(object):
             # Remove the existing Instance object, if any
             inst_dict.pop(instance_uuid, None)
             host_info["updated"] = True
+            self._instance_info_changed(host_name)
         else:
             self._recreate_instance_info(context, host_name)
             LOG.info(_LI("Received a delete update from an unknown host '%s'. "
                          "Re-created its InstanceList."), host_name)
 
     @utils.synchronized(HOST_INSTANCE_SEMAPHORE)
-    def sync_instance_info(self, context, host_name, instance_uuids):
-        """Receives the uuids of the instances on a host.
+    def sync_instance_info(self, context, host_name, instance_uuids=None,
+                           checksum=None):
+        """Receives the uuids of the instances on a host, or their checksum.
 
         This method is periodically called by the compute nodes, which send a
-        list of all the UUID values for the instances on that node. This is
+        list of all the UUID values for the instances on that node, or only
+        the utils.get_set_hash_str() checksum of those values. This is
         used by the scheduler's HostManager to detect when its view of the
         compute node's instances is out of sync.
         """
         host_info = self._instance_info.get(host_name)
         if host_info:
-            local_set = set(host_info["instances"].keys())
-            compute_set = set(instance_uuids)
-            if not local_set == compute_set:
+            if checksum is not None:
+                in_sync = checksum == utils.get_set_hash_str(
+                    host_info["instances"])
+            else:
+                in_sync = (set(host_info["instances"].keys()) ==
+                           set(instance_uuids))
+            if not in_sync:
                 self._recreate_instance_info(context, host_name)
                 LOG.info(_LI("The instance sync for host '%s' did not match. "
                              "Re-created its InstanceList."), host_name)
@@ -64,6 +64,8 @@ class IronicNodeState(host_manager.HostState):
 
     def update_from_compute_node(self, compute):
         """Update information about a host from a ComputeNode object."""
+        if self.updated is None or self.updated != compute.updated_at:
+            self.new_generation()
         self.vcpus_total = compute.vcpus
         self.vcpus_used = compute.vcpus_used
 
@@ -87,6 +89,7 @@ class IronicNodeState(host_manager.HostState):
 
     def consume_from_instance(self, instance):
         """Consume nodes entire resources regardless of instance request."""
+        self.new_generation()
         self.free_ram_mb = 0
         self.free_disk_mb = 0
         self.vcpus_used = self.vcpus_total
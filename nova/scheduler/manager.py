@@ -55,7 +55,7 @@ QUOTAS = quota.QUOTAS
 class SchedulerManager(manager.Manager):
     """Chooses a host to run instances on."""
 
-    target = messaging.Target(version='4.2')
+    target = messaging.Target(version='4.3')
 
     def __init__(self, scheduler_driver=None, *args, **kwargs):
         if not scheduler_driver:
@@ -119,12 +119,14 @@ class SchedulerManager(manager.Manager):
         self.driver.host_manager.delete_instance_info(context, host_name,
                                                       instance_uuid)
 
-    def sync_instance_info(self, context, host_name, instance_uuids):
+    def sync_instance_info(self, context, host_name, instance_uuids=None,
+                           checksum=None):
         """Receives a sync request from a host, and passes it on to the
         driver's HostManager.
         """
         self.driver.host_manager.sync_instance_info(context, host_name,
-                                                    instance_uuids)
+                                                    instance_uuids,
+                                                    checksum=checksum)
 
 
 class _SchedulerManagerV3Proxy(object):
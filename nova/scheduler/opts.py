@@ -14,6 +14,7 @@ import itertools
 
 import nova.scheduler.driver
 import nova.scheduler.filter_scheduler
+import nova.scheduler.filters
 import nova.scheduler.filters.aggregate_image_properties_isolation
 import nova.scheduler.filters.core_filter
 import nova.scheduler.filters.disk_filter
@@ -37,6 +38,7 @@ def list_opts():
     return [
         ('DEFAULT',
          itertools.chain(
+             [nova.scheduler.filters.filter_cache_size_opt],
              [nova.scheduler.filters.core_filter.cpu_allocation_ratio_opt],
              [nova.scheduler.filters.disk_filter.disk_allocation_ratio_opt],
              [nova.scheduler.filters.io_ops_filter.max_io_ops_per_host_opt],
@@ -21,6 +21,7 @@ import oslo_messaging as messaging
 
 from nova.objects import base as objects_base
 from nova import rpc
+from nova import utils
 
 rpcapi_opts = [
     cfg.StrOpt('scheduler_topic',
@@ -95,6 +96,9 @@ class SchedulerAPI(object):
         methods in 4.x after that point should be done such that they can
         handle the version_cap being set to 4.2.
 
+        * 4.3 - Made sync_instance_info() accept a checksum of the instance
+                uuids instead of the uuids
+
     '''
 
     VERSION_ALIASES = {
@@ -140,6 +144,12 @@ class SchedulerAPI(object):
                           instance_uuid=instance_uuid)
 
     def sync_instance_info(self, ctxt, host_name, instance_uuids):
-        cctxt = self.client.prepare(version='4.2', fanout=True)
-        return cctxt.cast(ctxt, 'sync_instance_info', host_name=host_name,
-                          instance_uuids=instance_uuids)
+        version = '4.3'
+        msg_args = {'host_name': host_name,
+                    'checksum': utils.get_set_hash_str(instance_uuids)}
+        if not self.client.can_send_version(version):
+            version = '4.2'
+            msg_args = {'host_name': host_name,
+                        'instance_uuids': instance_uuids}
+        cctxt = self.client.prepare(version=version, fanout=True)
+        return cctxt.cast(ctxt, 'sync_instance_info', **msg_args)
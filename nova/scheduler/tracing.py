@@ -0,0 +1,100 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Tracing of the filters and weighers run for scheduling requests.
+
+A RequestTrace stored in the filter properties under TRACE_KEY is filled by
+the filter and weight handlers with the time spent in each filter and
+weigher, the number of hosts each filter was given and kept, and the hit
+counts of the filter result caches.
+"""
+
+import collections
+import time
+
+import six
+
+TRACE_KEY = 'scheduler_trace'
+
+
+def get_trace(properties):
+    """Return the RequestTrace of the filter properties, if any."""
+    if not isinstance(properties, dict):
+        return None
+    return properties.get(TRACE_KEY)
+
+
+class RequestTrace(object):
+    """Timings and host counts of the filters and weighers of requests."""
+
+    def __init__(self):
+        self.start = time.time()
+        self.requests = 0
+        self.elapsed = 0.0
+        self.filters = collections.OrderedDict()
+        self.weighers = collections.OrderedDict()
+        self.caches = collections.OrderedDict()
+
+    def add_filter(self, name, hosts_in, hosts_out, elapsed):
+        record = self.filters.setdefault(
+            name, {'calls': 0, 'time': 0.0, 'hosts_in': 0, 'hosts_out': 0})
+        record['calls'] += 1
+        record['time'] += elapsed
+        record['hosts_in'] += hosts_in
+        record['hosts_out'] += hosts_out
+
+    def add_weigher(self, name, num_objs, elapsed):
+        record = self.weighers.setdefault(
+            name, {'calls': 0, 'time': 0.0, 'objects': 0})
+        record['calls'] += 1
+        record['time'] += elapsed
+        record['objects'] += num_objs
+
+    def add_cache_lookups(self, name, hits, misses):
+        record = self.caches.setdefault(name, {'hits': 0, 'misses': 0})
+        record['hits'] += hits
+        record['misses'] += misses
+
+    def finish(self):
+        """Record the end of the traced request."""
+        self.requests += 1
+        self.elapsed += time.time() - self.start
+
+    def merge(self, trace):
+        """Add the records of another trace to this one."""
+        self.requests += trace.requests
+        self.elapsed += trace.elapsed
+        for name, record in six.iteritems(trace.filters):
+            self.add_filter(name, record['hosts_in'], record['hosts_out'],
+                            record['time'])
+            self.filters[name]['calls'] += record['calls'] - 1
+        for name, record in six.iteritems(trace.weighers):
+            self.add_weigher(name, record['objects'], record['time'])
+            self.weighers[name]['calls'] += record['calls'] - 1
+        for name, record in six.iteritems(trace.caches):
+            self.add_cache_lookups(name, record['hits'], record['misses'])
+
+    def to_dict(self):
+        caches = collections.OrderedDict()
+        for name, record in six.iteritems(self.caches):
+            lookups = record['hits'] + record['misses']
+            caches[name] = dict(record, hit_rate=(
+                float(record['hits']) / lookups if lookups else 0.0))
+        return {'requests': self.requests,
+                'time': self.elapsed,
+                'filters': self.filters,
+                'weighers': self.weighers,
+                'caches': caches}
@@ -585,6 +585,20 @@ class ServersControllerTest(ControllerTest):
         expected = {'limit': ['3'], 'marker': [fakes.get_fake_uuid(2)]}
         self.assertThat(params, matchers.DictMatches(expected))
 
+    def test_get_server_details_with_limit_page_cursor(self):
+        self.flags(osapi_server_page_cursors=True)
+        req = fakes.HTTPRequest.blank('/fake/servers/detail?limit=3')
+        res = self.controller.detail(req)
+
+        servers_links = res['servers_links']
+        href_parts = urlparse.urlparse(servers_links[0]['href'])
+        params = urlparse.parse_qs(href_parts.query)
+        self.assertEqual(['3'], params['limit'])
+        values = nova_utils.decode_page_cursor(params['marker'][0])
+        self.assertEqual(fakes.get_fake_uuid(2), values['uuid'])
+        self.assertIn('id', values)
+        self.assertIn('created_at', values)
+
     def test_get_server_details_with_limit_bad_value(self):
         req = fakes.HTTPRequest.blank('/fake/servers/detail?limit=aaa')
         self.assertRaises(webob.exc.HTTPBadRequest,
@@ -23,7 +23,6 @@ from mox3 import mox
 from oslo_config import cfg
 import oslo_messaging as messaging
 from oslo_utils import importutils
-from oslo_utils import timeutils
 from oslo_utils import uuidutils
 import six
 
@@ -44,6 +43,7 @@ from nova.network import model as network_model
 from nova import objects
 from nova.objects import block_device as block_device_obj
 from nova import test
+from nova.tests.unit.compute import eventlet_utils
 from nova.tests.unit.compute import fake_resource_tracker
 from nova.tests.unit import fake_block_device
 from nova.tests.unit import fake_instance
@@ -340,6 +340,66 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
         self.assertIsInstance(compute._build_semaphore,
                               compute_utils.UnlimitedSemaphore)
 
+    def test_build_phase_semaphores(self):
+        self.flags(max_concurrent_network_allocations=2,
+                   max_concurrent_disk_preps=0,
+                   max_concurrent_spawns=3)
+        compute = manager.ComputeManager()
+        self.assertEqual(2, compute._network_semaphore.balance)
+        self.assertIsInstance(compute._disk_prep_semaphore,
+                              compute_utils.UnlimitedSemaphore)
+        self.assertEqual(3, compute._spawn_semaphore.balance)
+
+    def test_build_phase(self):
+        instance = fake_instance.fake_instance_obj(self.context)
+        with mock.patch.object(compute_utils,
+                               'EventReporter') as mock_reporter:
+            with self.compute._build_phase(self.context, instance, 'claim'):
+                pass
+        self.assertFalse(mock_reporter.called)
+        self.assertEqual(
+            1, self.compute._build_timings.report()['claim']['count'])
+
+    def test_build_phase_events(self):
+        self.flags(build_phase_events=True)
+        instance = fake_instance.fake_instance_obj(self.context)
+        with mock.patch.object(compute_utils,
+                               'EventReporter') as mock_reporter:
+            with self.compute._build_phase(self.context, instance, 'spawn'):
+                pass
+        mock_reporter.assert_called_once_with(
+            self.context, 'compute_build_spawn', instance.uuid)
+
+    def test_build_phase_failed(self):
+        instance = fake_instance.fake_instance_obj(self.context)
+
+        def do_test():
+            with self.compute._build_phase(self.context, instance, 'spawn'):
+                raise test.TestingException()
+
+        self.assertRaises(test.TestingException, do_test)
+        self.assertEqual({}, self.compute._build_timings.report())
+
+    def test_report_build_phase_stats(self):
+        with mock.patch.object(self.compute, 'notifier') as mock_notifier:
+            self.compute._report_build_phase_stats(self.context)
+            self.assertFalse(mock_notifier.info.called)
+
+            self.compute._build_timings.add('spawn', 3)
+            self.compute._report_build_phase_stats(self.context)
+        payload = mock_notifier.info.call_args[0][2]
+        mock_notifier.info.assert_called_once_with(
+            self.context, 'compute.metrics.build_phases', payload)
+        self.assertEqual(self.compute.host, payload['host'])
+        self.assertEqual(1, payload['phases']['spawn']['count'])
+        self.assertEqual(0, len(self.compute._build_timings))
+
+    def test_unlimited_semaphore_context(self):
+        sem = compute_utils.get_semaphore(0)
+        with sem:
+            pass
+        self.assertEqual(0, sem.balance)
+
     def test_init_host(self):
         our_host = self.compute.host
         inst = fake_instance.fake_db_instance(
@@ -400,6 +460,43 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
         self.mox.VerifyAll()
         self.mox.UnsetStubs()
 
+    def test_init_instances_parallel(self):
+        self.flags(init_instance_workers=2)
+        instances = [
+            objects.Instance(uuid='rebooting', vm_state=vm_states.ACTIVE,
+                             power_state=power_state.RUNNING,
+                             task_state=task_states.REBOOTING),
+            objects.Instance(uuid='stopped', vm_state=vm_states.STOPPED,
+                             power_state=power_state.SHUTDOWN,
+                             task_state=None),
+            objects.Instance(uuid='resizing', vm_state=vm_states.STOPPED,
+                             power_state=power_state.SHUTDOWN,
+                             task_state=task_states.RESIZE_MIGRATING),
+            objects.Instance(uuid='shutdown', vm_state=vm_states.ACTIVE,
+                             power_state=power_state.SHUTDOWN,
+                             task_state=None),
+            objects.Instance(uuid='running', vm_state=vm_states.ACTIVE,
+                             power_state=power_state.RUNNING,
+                             task_state=None)]
+        calls = []
+
+        def fake_init_instance(context, instance):
+            calls.append(('start', instance.uuid))
+            time.sleep(0)
+            calls.append(('end', instance.uuid))
+
+        with mock.patch.object(self.compute, '_init_instance',
+                               side_effect=fake_init_instance):
+            self.compute._init_instances(self.context, instances)
+
+        self.assertEqual(['running', 'shutdown', 'stopped', 'rebooting',
+                          'resizing'],
+                         [uuid for event, uuid in calls if event == 'start'])
+        # The first two instances are initialized at the same time
+        self.assertEqual([('start', 'running'), ('start', 'shutdown')],
+                         calls[:2])
+        self.assertEqual(10, len(calls))
+
     @mock.patch('nova.objects.InstanceList')
     def test_cleanup_host(self, mock_instance_list):
         # just testing whether the cleanup_host method
@@ -1097,7 +1194,7 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                 self.context,
                 {'uuid': [inst['uuid'] for
                           inst in driver_instances]},
-                'created_at', 'desc', columns_to_join=None,
+                'created_at', 'desc', columns_to_join=[],
                 limit=None, marker=None,
                 use_slave=True).AndReturn(
                         driver_instances)
@@ -1148,7 +1245,7 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                 [inst['name'] for inst in driver_instances])
         db.instance_get_all_by_filters(
                 self.context, filters,
-                'created_at', 'desc', columns_to_join=None,
+                'created_at', 'desc', columns_to_join=[],
                 limit=None, marker=None,
                 use_slave=True).AndReturn(all_instances)
 
@@ -1181,6 +1278,37 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
         self.mox.ReplayAll()
         self.compute._instance_usage_audit(self.context)
 
+    @mock.patch.object(objects.Instance, 'get_by_uuid')
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_heal_instance_info_cache_batch(self, mock_get_by_host,
+                                            mock_get_by_uuid):
+        self.flags(heal_instance_info_cache_batch_size=2)
+        instances = [objects.Instance(uuid='fake-uuid-%s' % i,
+                                      host=self.compute.host,
+                                      vm_state=vm_states.ACTIVE,
+                                      task_state=None)
+                     for i in range(3)]
+        mock_get_by_host.return_value = instances
+        mock_get_by_uuid.return_value = instances[2]
+        with contextlib.nested(
+            mock.patch.object(self.compute.network_api,
+                              'get_instances_nw_info'),
+            mock.patch.object(self.compute.network_api,
+                              'get_instance_nw_info')
+        ) as (mock_get_nw_infos, mock_get_nw_info):
+            self.compute._heal_instance_info_cache(self.context)
+            mock_get_nw_infos.assert_called_once_with(self.context,
+                                                      instances[:2])
+            self.assertFalse(mock_get_nw_info.called)
+            self.assertEqual(['fake-uuid-2'],
+                             self.compute._instance_uuids_to_heal)
+
+            # The last instance is refreshed alone
+            self.compute._heal_instance_info_cache(self.context)
+            mock_get_nw_info.assert_called_once_with(self.context,
+                                                     instances[2])
+            self.assertEqual(1, mock_get_nw_infos.call_count)
+
     @mock.patch.object(objects.InstanceList, 'get_by_host')
     def test_sync_power_states(self, mock_get):
         instance = mock.Mock()
@@ -1193,6 +1321,38 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                                         use_slave=True)
             mock_spawn.assert_called_once_with(mock.ANY, instance)
 
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_sync_power_states_bulk(self, mock_get):
+        synced = objects.Instance(uuid='synced', task_state=None,
+                                  vm_state=vm_states.ACTIVE,
+                                  power_state=power_state.RUNNING)
+        stopped = objects.Instance(uuid='stopped', task_state=None,
+                                   vm_state=vm_states.ACTIVE,
+                                   power_state=power_state.RUNNING)
+        missing = objects.Instance(uuid='missing', task_state=None,
+                                   vm_state=vm_states.STOPPED,
+                                   power_state=power_state.SHUTDOWN)
+        mock_get.return_value = [synced, stopped, missing]
+        self.compute._sync_power_pool = eventlet_utils.SyncPool()
+        with contextlib.nested(
+            mock.patch.object(self.compute.driver, 'get_power_states',
+                              return_value={'synced': power_state.RUNNING,
+                                            'stopped': power_state.SHUTDOWN}),
+            mock.patch.object(self.compute.driver, 'get_num_instances'),
+            mock.patch.object(self.compute.driver, 'get_info'),
+            mock.patch.object(self.compute, '_sync_instance_power_state')
+        ) as (mock_states, mock_num, mock_info, mock_sync):
+            self.compute._sync_power_states(mock.sentinel.context)
+        self.assertFalse(mock_num.called)
+        self.assertFalse(mock_info.called)
+        # The instances the driver doesn't know are synced with NOSTATE
+        self.assertEqual(2, mock_sync.call_count)
+        mock_sync.assert_has_calls([
+            mock.call(mock.sentinel.context, stopped, power_state.SHUTDOWN,
+                      use_slave=True),
+            mock.call(mock.sentinel.context, missing, power_state.NOSTATE,
+                      use_slave=True)], any_order=True)
+
     def _get_sync_instance(self, power_state, vm_state, task_state=None,
                            shutdown_terminate=False):
         instance = objects.Instance()
@@ -2333,36 +2493,72 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
             return_value=(0, 0))
     @mock.patch.object(time, 'time', side_effect=[10, 20, 21])
     @mock.patch.object(objects.InstanceList, 'get_by_host', return_value=[])
-    @mock.patch.object(objects.BandwidthUsage, 'get_by_instance_uuid_and_mac')
-    @mock.patch.object(db, 'bw_usage_update')
-    def test_poll_bandwidth_usage(self, bw_usage_update, get_by_uuid_mac,
+    @mock.patch.object(objects.BandwidthUsageList, 'get_by_uuids')
+    @mock.patch.object(objects.BandwidthUsageList, 'update_all')
+    def test_poll_bandwidth_usage(self, update_all, get_by_uuids,
             get_by_host, time, last_completed_audit):
         bw_counters = [{'uuid': 'fake-uuid', 'mac_address': 'fake-mac',
-                        'bw_in': 1, 'bw_out': 2}]
-        usage = objects.BandwidthUsage()
-        usage.bw_in = 3
-        usage.bw_out = 4
-        usage.last_ctr_in = 0
-        usage.last_ctr_out = 0
+                        'bw_in': 1, 'bw_out': 2},
+                       {'uuid': 'fake-uuid', 'mac_address': 'same-mac',
+                        'bw_in': 5, 'bw_out': 6}]
+        usage = objects.BandwidthUsage(instance_uuid='fake-uuid',
+                                       mac='fake-mac', bw_in=3, bw_out=4,
+                                       last_ctr_in=0, last_ctr_out=0)
+        same_usage = objects.BandwidthUsage(instance_uuid='fake-uuid',
+                                            mac='same-mac', bw_in=7, bw_out=8,
+                                            last_ctr_in=5, last_ctr_out=6)
         self.flags(bandwidth_poll_interval=1)
-        get_by_uuid_mac.return_value = usage
-        _time = timeutils.utcnow()
-        bw_usage_update.return_value = {'uuid': '', 'mac': '',
-                'start_period': _time, 'last_refreshed': _time, 'bw_in': 0,
-                'bw_out': 0, 'last_ctr_in': 0, 'last_ctr_out': 0, 'deleted': 0,
-                'created_at': _time, 'updated_at': _time, 'deleted_at': _time}
+        get_by_uuids.return_value = [usage, same_usage]
         with mock.patch.object(self.compute.driver,
                 'get_all_bw_counters', return_value=bw_counters):
             self.compute._poll_bandwidth_usage(self.context)
-            get_by_uuid_mac.assert_called_once_with(self.context, 'fake-uuid',
-                    'fake-mac', start_period=0, use_slave=True)
+            get_by_uuids.assert_called_once_with(self.context, ['fake-uuid'],
+                    start_period=0, use_slave=True)
             # NOTE(sdague): bw_usage_update happens at some time in
             # the future, so what last_refreshed is is irrelevant.
-            bw_usage_update.assert_called_once_with(self.context, 'fake-uuid',
-                    'fake-mac', 0, 4, 6, 1, 2,
+            # The unchanged counters of same-mac are not updated.
+            update_all.assert_called_once_with(self.context, 0,
+                    [{'uuid': 'fake-uuid', 'mac': 'fake-mac',
+                      'bw_in': 4, 'bw_out': 6,
+                      'last_ctr_in': 1, 'last_ctr_out': 2}],
                     last_refreshed=mock.ANY,
                     update_cells=False)
 
+    @mock.patch.object(utils, 'last_completed_audit_period',
+                       return_value=(0, 10))
+    def test_update_volume_usage_cache(self, last_completed_audit):
+        instance = objects.Instance(uuid='fake-uuid',
+                                    project_id='fake-project',
+                                    user_id='fake-user',
+                                    availability_zone='fake-az')
+        vol_usages = [{'volume': 'vol-%s' % i, 'instance': instance,
+                       'rd_req': 1, 'rd_bytes': 2,
+                       'wr_req': 3, 'wr_bytes': 4}
+                      for i in range(2)]
+        with mock.patch.object(self.compute.conductor_api,
+                               'vol_usage_update_bulk') as mock_update:
+            self.compute._update_volume_usage_cache(self.context, vol_usages)
+            self.assertEqual(1, mock_update.call_count)
+            self.assertEqual(
+                [{'volume_id': 'vol-0', 'rd_req': 1, 'rd_bytes': 2,
+                  'wr_req': 3, 'wr_bytes': 4, 'instance_uuid': 'fake-uuid',
+                  'project_id': 'fake-project', 'user_id': 'fake-user',
+                  'availability_zone': 'fake-az'}],
+                mock_update.call_args[0][1][:1])
+
+            # Only the changed usages are sent again
+            vol_usages[1]['rd_req'] = 5
+            self.compute._update_volume_usage_cache(self.context, vol_usages)
+            self.assertEqual(2, mock_update.call_count)
+            self.assertEqual(['vol-1'],
+                             [usage['volume_id']
+                              for usage in mock_update.call_args[0][1]])
+
+            # The unchanged usages are sent again in a new audit period
+            last_completed_audit.return_value = (10, 20)
+            self.compute._update_volume_usage_cache(self.context, vol_usages)
+            self.assertEqual(2, len(mock_update.call_args[0][1]))
+
     def test_reverts_task_state_instance_not_found(self):
         # Tests that the reverts_task_state decorator in the compute manager
         # will not trace when an InstanceNotFound is raised.
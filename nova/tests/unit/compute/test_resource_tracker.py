@@ -744,7 +744,9 @@ class SchedulerClientTrackerTestCase(BaseTrackerTestCase):
         # change a compute node value to simulate a change
         self.tracker.compute_node.local_gb_used += 1
         self.tracker._update(self.context)
-        urs_mock.assert_called_once_with(self.tracker.compute_node)
+        self.assertEqual(1, urs_mock.call_count)
+        self.assertTrue(obj_base.obj_equal_prims(self.tracker.compute_node,
+                                                 urs_mock.call_args[0][0]))
 
     def test_no_update_resource(self):
         # NOTE(pmurray): we are not doing a full pass through the resource
@@ -224,3 +224,28 @@ class StatsTestCase(test.NoDBTestCase):
 
         self.assertEqual(0, len(self.stats))
         self.assertEqual(0, len(self.stats.states))
+
+
+class PhaseTimingsTestCase(test.NoDBTestCase):
+    def test_add_and_report(self):
+        timings = stats.PhaseTimings(buckets=(1, 10))
+        timings.add('spawn', 0.5)
+        timings.add('spawn', 1)
+        timings.add('spawn', 20)
+        timings.add('network', 3)
+
+        report = timings.report()
+        self.assertEqual({'count': 3, 'total': 21.5, 'max': 20,
+                          'buckets': {'1': 2, '10': 0, '+Inf': 1}},
+                         report['spawn'])
+        self.assertEqual({'count': 1, 'total': 3, 'max': 3,
+                          'buckets': {'1': 0, '10': 1, '+Inf': 0}},
+                         report['network'])
+        self.assertEqual(2, len(timings))
+
+    def test_report_reset(self):
+        timings = stats.PhaseTimings()
+        timings.add('claim', 0.1)
+        self.assertEqual(1, timings.report(reset=True)['claim']['count'])
+        self.assertEqual(0, len(timings))
+        self.assertEqual({}, timings.report())
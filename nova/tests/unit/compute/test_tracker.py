@@ -13,6 +13,7 @@
 import contextlib
 import copy
 
+import eventlet
 import mock
 from oslo_utils import units
 
@@ -542,6 +543,107 @@ class TestUpdateAvailableResources(BaseTestCase):
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
+    @mock.patch('nova.objects.Service.get_by_compute_host')
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_incremental_audit(self, get_mock, migr_mock, get_cn_mock,
+                               service_mock):
+        self.flags(reserved_host_disk_mb=0,
+                   reserved_host_memory_mb=0,
+                   resource_tracker_full_audit_interval=3600)
+        self._setup_rt()
+
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        get_cn_mock.return_value = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        service_mock.return_value = _SERVICE_FIXTURE
+        self.driver_mock.get_per_instance_usage.return_value = {}
+
+        # The first audit is a full one
+        self._update_available_resources()
+        self.assertEqual(0, self.rt.compute_node.memory_mb_used)
+
+        get_mock.return_value = [_INSTANCE_FIXTURES[0]]
+        with mock.patch.object(self.rt,
+                               '_update_available_resource') as full_mock:
+            update_mock = self._update_available_resources()
+            self.assertEqual(128, self.rt.compute_node.memory_mb_used)
+            self.assertEqual(1, self.rt.compute_node.local_gb_used)
+            self.assertEqual(1, self.rt.compute_node.running_vms)
+
+            get_mock.return_value = []
+            self._update_available_resources()
+            self.assertEqual(0, self.rt.compute_node.memory_mb_used)
+            self.assertEqual(0, self.rt.compute_node.local_gb_used)
+            self.assertEqual(0, self.rt.compute_node.running_vms)
+
+        self.assertFalse(full_mock.called)
+        update_mock.assert_called_once_with(mock.sentinel.ctx)
+
+    @mock.patch('nova.objects.Service.get_by_compute_host')
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_incremental_audit_falls_back_on_drift(self, get_mock, migr_mock,
+                                                   get_cn_mock, service_mock):
+        self.flags(resource_tracker_full_audit_interval=3600)
+        self._setup_rt()
+
+        get_mock.return_value = [_INSTANCE_FIXTURES[0]]
+        migr_mock.return_value = []
+        get_cn_mock.return_value = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        service_mock.return_value = _SERVICE_FIXTURE
+        self.driver_mock.get_per_instance_usage.return_value = {}
+        self._update_available_resources()
+
+        resized = _INSTANCE_FIXTURES[0].obj_clone()
+        resized.memory_mb += 128
+        get_mock.return_value = [resized]
+        with mock.patch.object(self.rt,
+                               '_update_available_resource') as full_mock:
+            self._update_available_resources()
+        full_mock.assert_called_once_with(mock.sentinel.ctx, mock.ANY)
+
+    @mock.patch('nova.objects.Service.get_by_compute_host')
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_incremental_audit_skips_released_instances(self, get_mock,
+                                                        migr_mock,
+                                                        get_cn_mock,
+                                                        service_mock):
+        self.flags(reserved_host_disk_mb=0,
+                   reserved_host_memory_mb=0,
+                   resource_tracker_full_audit_interval=3600)
+        self._setup_rt()
+
+        get_mock.return_value = [_INSTANCE_FIXTURES[0]]
+        migr_mock.return_value = []
+        get_cn_mock.return_value = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        service_mock.return_value = _SERVICE_FIXTURE
+        self.driver_mock.get_per_instance_usage.return_value = {}
+        self._update_available_resources()
+        self.assertEqual(128, self.rt.compute_node.memory_mb_used)
+
+        def _release_during_query(*args, **kwargs):
+            # The claim of the instance is aborted while the instances are
+            # queried, before the instance leaves the node
+            released = _INSTANCE_FIXTURES[0].obj_clone()
+            released.vm_state = vm_states.DELETED
+            self.rt._update_usage_from_instance(mock.sentinel.ctx, released)
+            return [_INSTANCE_FIXTURES[0]]
+
+        get_mock.side_effect = _release_during_query
+        with mock.patch.object(self.rt,
+                               '_update_available_resource') as full_mock:
+            self._update_available_resources()
+        self.assertFalse(full_mock.called)
+        self.assertNotIn(_INSTANCE_FIXTURES[0].uuid,
+                         self.rt.tracked_instances)
+        self.assertEqual(0, self.rt.compute_node.memory_mb_used)
+        self.assertEqual(0, self.rt.compute_node.running_vms)
+
     @mock.patch('nova.objects.Service.get_by_compute_host')
     @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
     @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
@@ -1016,7 +1118,37 @@ class TestUpdateComputeNode(BaseTestCase):
         self.assertFalse(self.rt.disabled)
         self.assertFalse(service_mock.called)
         urs_mock = self.sched_client_mock.update_resource_stats
-        urs_mock.assert_called_once_with(self.rt.compute_node)
+        self.assertEqual(1, urs_mock.call_count)
+        self.assertTrue(obj_base.obj_equal_prims(self.rt.compute_node,
+                                                 urs_mock.call_args[0][0]))
+
+    def test_only_changed_fields_updated(self):
+        self._setup_rt()
+        changes = []
+        urs_mock = self.sched_client_mock.update_resource_stats
+        urs_mock.side_effect = lambda compute: changes.append(
+            compute.obj_get_changes())
+
+        compute = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        compute.metrics = '[{"name": "cpu.frequency", "value": 1000}]'
+        self.rt.compute_node = compute
+        self.rt._update(mock.sentinel.ctx)
+        self.assertEqual(1, urs_mock.call_count)
+
+        # Setting the same values, or equivalent JSON, doesn't trigger any
+        # update, and only the changed fields are written
+        compute.memory_mb_used = compute.memory_mb_used
+        compute.metrics = '[{"value": 1000, "name": "cpu.frequency"}]'
+        self.rt._update(mock.sentinel.ctx)
+        self.assertEqual(1, urs_mock.call_count)
+
+        compute.memory_mb_used += 128
+        compute.free_ram_mb -= 128
+        compute.local_gb = compute.local_gb
+        self.rt._update(mock.sentinel.ctx)
+        self.assertEqual(2, urs_mock.call_count)
+        self.assertEqual(set(['memory_mb_used', 'free_ram_mb']),
+                         set(changes[1]))
 
 
 class TestInstanceClaim(BaseTestCase):
@@ -1094,6 +1226,60 @@ class TestInstanceClaim(BaseTestCase):
             self.assertTrue(obj_base.obj_equal_prims(expected,
                                                      self.rt.compute_node))
 
+    @mock.patch('nova.objects.InstancePCIRequests.get_by_instance_uuid')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    def test_concurrent_claims(self, migr_mock, pci_mock):
+        pci_mock.return_value = objects.InstancePCIRequests(requests=[])
+        initial = copy.deepcopy(self.rt.compute_node)
+        memory_mb = self.rt.compute_node.memory_mb
+        reports = []
+        reporting = [0]
+        claimed_while_reporting = []
+
+        def report(compute_node):
+            reports.append(compute_node)
+            reporting[0] += 1
+            # Let the other claims run while the report is sent
+            eventlet.sleep(0)
+            reporting[0] -= 1
+
+        self.sched_client_mock.update_resource_stats.side_effect = report
+        update_usage = self.rt._update_usage
+
+        def fake_update_usage(usage, sign=1):
+            claimed_while_reporting.append(reporting[0] > 0)
+            update_usage(usage, sign=sign)
+
+        def claim_and_abort(instance):
+            with mock.patch.object(instance, 'save'):
+                claim = self.rt.instance_claim(self.ctx, instance, None)
+            eventlet.sleep(0)
+            claim.abort()
+
+        instances = []
+        for i in range(4):
+            instance = _INSTANCE_FIXTURES[0].obj_clone()
+            instance.uuid = '00000000-0000-0000-0000-00000000000%d' % i
+            instances.append(instance)
+
+        pool = eventlet.GreenPool()
+        with mock.patch.object(self.rt, '_update_usage',
+                               side_effect=fake_update_usage):
+            for instance in instances:
+                pool.spawn_n(claim_and_abort, instance)
+            pool.waitall()
+
+        self.assertTrue(any(claimed_while_reporting))
+        for compute_node in reports:
+            self.assertTrue(initial.memory_mb_used <=
+                            compute_node.memory_mb_used <= memory_mb)
+            self.assertTrue(0 <= compute_node.free_ram_mb <= memory_mb)
+            self.assertTrue(0 <= compute_node.running_vms <= len(instances))
+        for field in ('memory_mb_used', 'free_ram_mb', 'local_gb_used',
+                      'free_disk_gb', 'running_vms'):
+            self.assertEqual(initial[field], self.rt.compute_node[field])
+        self.assertEqual({}, self.rt.tracked_instances)
+
     @mock.patch('nova.objects.InstancePCIRequests.get_by_instance_uuid')
     @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
     def test_claim_limits(self, migr_mock, pci_mock):
@@ -16,6 +16,7 @@ import mock
 from mox3 import mox
 
 from nova.compute import manager as compute_manager
+from nova.compute import stats as compute_stats
 from nova import context
 from nova import db
 from nova import exception
@@ -89,6 +90,8 @@ class FakeCompute(object):
         self.conductor_api = mox.MockAnything()
         self.db = mox.MockAnything()
         self._events = []
+        self._build_timings = compute_stats.PhaseTimings()
+        self._spawning_instances = set()
         self.instance_events = mock.MagicMock()
         self.instance_events.prepare_for_instance_event.side_effect = \
             self._prepare_for_instance_event
@@ -143,6 +146,25 @@ class ComputeVirtAPITest(VirtAPIBaseTest):
             self.assertIn(event.event_name, events.values())
             event.wait.assert_called_once_with()
 
+    def _test_wait_for_instance_event_vif_plugged_timing(self, spawning):
+        # NOTE: task_state isn't set, the virtapi must not lazy-load it
+        instance = objects.Instance(uuid='fake-uuid')
+        if spawning:
+            self.compute._spawning_instances.add(instance.uuid)
+        with self.virtapi.wait_for_instance_event(
+                instance, [('network-vif-plugged', 'vif')]):
+            pass
+        return self.compute._build_timings.report()
+
+    def test_wait_for_instance_event_vif_plugged_timing(self):
+        phases = self._test_wait_for_instance_event_vif_plugged_timing(True)
+        self.assertEqual(['vif_plugged'], list(phases))
+        self.assertEqual(1, phases['vif_plugged']['count'])
+
+    def test_wait_for_instance_event_vif_plugged_timing_not_building(self):
+        phases = self._test_wait_for_instance_event_vif_plugged_timing(False)
+        self.assertEqual({}, phases)
+
     def test_wait_for_instance_event_failed(self):
         def _failer():
             event = mock.MagicMock()
@@ -174,6 +174,35 @@ class _BaseTestCase(object):
         self.assertEqual('INFO', msg.priority)
         self.assertEqual('fake-info', msg.payload)
 
+    def test_vol_usage_update_bulk(self):
+        self.mox.StubOutWithMock(db, 'vol_usage_update_bulk')
+        self.mox.StubOutWithMock(compute_utils, 'usage_volume_info')
+
+        fake_usages = [{'volume_id': 'fake-vol%s' % i,
+                        'rd_req': 22, 'rd_bytes': 33,
+                        'wr_req': 44, 'wr_bytes': 55,
+                        'instance_uuid': 'fake-uuid',
+                        'project_id': 'fake-project',
+                        'user_id': 'fake-user',
+                        'availability_zone': 'fake-az'}
+                       for i in range(2)]
+
+        db.vol_usage_update_bulk(self.context, fake_usages).AndReturn(
+            ['fake-usage1', 'fake-usage2'])
+        compute_utils.usage_volume_info('fake-usage1').AndReturn(
+            'fake-info1')
+        compute_utils.usage_volume_info('fake-usage2').AndReturn(
+            'fake-info2')
+
+        self.mox.ReplayAll()
+
+        self.conductor.vol_usage_update_bulk(self.context, fake_usages)
+
+        self.assertEqual(['fake-info1', 'fake-info2'],
+                         [msg.payload for msg in fake_notifier.NOTIFICATIONS])
+        for msg in fake_notifier.NOTIFICATIONS:
+            self.assertEqual('volume.usage', msg.event_type)
+
     def test_compute_node_create(self):
         self.mox.StubOutWithMock(db, 'compute_node_create')
         db.compute_node_create(self.context, 'fake-values').AndReturn(
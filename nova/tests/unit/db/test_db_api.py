@@ -20,6 +20,7 @@
 
 import copy
 import datetime
+import time
 import uuid as stdlib_uuid
 
 import iso8601
@@ -405,6 +406,63 @@ class UnsupportedDbRegexpTestCase(DbTestCase):
                     marker = insts[-1]['uuid']
                     self.assertEqual(correct[-1]['uuid'], marker)
 
+    def test_instance_get_all_by_filters_sort_keys_paginate_cursor(self,
+            mock_get_regexp):
+        '''Verifies sort order with keyset pagination cursors.'''
+        test1_active = self.create_instance_with_args(
+                            display_name='test1',
+                            vm_state=vm_states.ACTIVE)
+        test1_error = self.create_instance_with_args(
+                           display_name='test1',
+                           vm_state=vm_states.ERROR)
+        test1_error2 = self.create_instance_with_args(
+                            display_name='test1',
+                            vm_state=vm_states.ERROR)
+        test2_active = self.create_instance_with_args(
+                            display_name='test2',
+                            vm_state=vm_states.ACTIVE)
+        self.create_instance_with_args(display_name='other')
+        filters = {'display_name': '%test%'}
+        sort_keys = ['display_name', 'vm_state', 'created_at']
+        sort_dirs = ['asc', 'desc', 'asc']
+        correct_order = [test1_error, test1_error2, test1_active,
+                         test2_active]
+
+        for limit in range(1, 4):
+            marker = None
+            for i in range(0, 5, limit):
+                correct = correct_order[i:i + limit]
+                with mock.patch.object(sqlalchemy_api,
+                                       '_instance_get_by_uuid') as mock_get:
+                    insts = self._assert_equals_inst_order(
+                        correct, filters,
+                        sort_keys=sort_keys, sort_dirs=sort_dirs,
+                        limit=limit, marker=marker)
+                self.assertFalse(mock_get.called)
+                if correct:
+                    values = {key: insts[-1][key] for key in
+                              ('uuid', 'id', 'display_name', 'vm_state',
+                               'created_at')}
+                    marker = utils.encode_page_cursor(values)
+
+    def test_instance_get_all_by_filters_sort_cursor_fallback(self,
+            mock_get_regexp):
+        test1 = self.create_instance_with_args(display_name='test1')
+        test2 = self.create_instance_with_args(display_name='test2')
+        filters = {'display_name': '%test%'}
+        # NOTE: the cursor lacks the created_at sort key, so the instance
+        # it names is looked up like a plain uuid marker.
+        marker = utils.encode_page_cursor({'uuid': test1['uuid'],
+                                           'display_name': 'test1'})
+        self._assert_equals_inst_order(
+            [test2], filters, sort_keys=['display_name'],
+            sort_dirs=['asc'], marker=marker)
+
+        self.assertRaises(exception.MarkerNotFound,
+                          db.instance_get_all_by_filters_sort,
+                          self.context, filters,
+                          marker=utils.encode_page_cursor({'id': 1}))
+
     def test_instance_get_deleted_by_filters_sort_keys_paginate(self,
             mock_get_regexp):
         '''Verifies sort order with pagination for deleted instances.'''
@@ -1012,6 +1070,114 @@ class SqlAlchemyDbApiNoDbTestCase(test.NoDBTestCase):
         mock_facade.get_session.assert_called_once_with()
 
 
+class ReadRoutingTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(ReadRoutingTestCase, self).setUp()
+        self.flags(db_route_reads_to_slave=True, db_slave_max_lag=30)
+        self.flags(slave_connection='foo://bar', group='database')
+        self.context = context.get_admin_context()
+        patcher = mock.patch.dict(sqlalchemy_api._SLAVE_LAG,
+                                  {'checked_at': None, 'lag': None})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(sqlalchemy_api._RECENT_WRITES, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(sqlalchemy_api, '_track_writes')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(sqlalchemy_api, '_create_facade_lazily')
+        self.mock_facade = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    @sqlalchemy_api.reader
+    def _read(ctxt):
+        return sqlalchemy_api.get_session()
+
+    @mock.patch.object(sqlalchemy_api, '_measure_slave_lag', return_value=0)
+    def test_reader_uses_slave(self, mock_lag):
+        self._read(self.context)
+        self.mock_facade.get_session.assert_called_once_with(use_slave=True)
+        # Sessions created outside of readers stay on the main database
+        sqlalchemy_api.get_session()
+        self.mock_facade.get_session.assert_called_with(use_slave=False)
+
+    def test_reader_disabled(self):
+        self.flags(db_route_reads_to_slave=False)
+        self._read(self.context)
+        self.mock_facade.get_session.assert_called_once_with(use_slave=False)
+
+    def test_reader_no_slave_connection(self):
+        self.flags(slave_connection='', group='database')
+        self._read(self.context)
+        self.mock_facade.get_session.assert_called_once_with(use_slave=False)
+
+    @mock.patch.object(sqlalchemy_api, '_measure_slave_lag', return_value=0)
+    def test_reader_within_writer(self, mock_lag):
+        @sqlalchemy_api.writer
+        def write(ctxt):
+            return self._read(ctxt)
+
+        write(self.context)
+        self.mock_facade.get_session.assert_called_once_with(use_slave=False)
+
+    @mock.patch.object(sqlalchemy_api, '_measure_slave_lag', return_value=0)
+    def test_reader_after_write_in_request(self, mock_lag):
+        sqlalchemy_api._RECENT_WRITES[self.context.request_id] = time.time()
+        self._read(self.context)
+        self.mock_facade.get_session.assert_called_once_with(use_slave=False)
+
+    def test_reader_after_write_in_request_lag_unchecked(self):
+        # Not checking the lag does not stop reading the writes of a request
+        self.flags(db_slave_max_lag=0)
+        sqlalchemy_api._RECENT_WRITES[self.context.request_id] = time.time()
+        self._read(self.context)
+        self.mock_facade.get_session.assert_called_once_with(use_slave=False)
+
+    @mock.patch.object(sqlalchemy_api, '_measure_slave_lag', return_value=0)
+    def test_reader_after_write_stickiness_expired(self, mock_lag):
+        self.flags(db_slave_write_stickiness=5)
+        sqlalchemy_api._RECENT_WRITES[self.context.request_id] = (
+            time.time() - 10)
+        self._read(self.context)
+        self.mock_facade.get_session.assert_called_once_with(use_slave=True)
+
+    @mock.patch.object(sqlalchemy_api, '_measure_slave_lag', return_value=60)
+    def test_reader_slave_lagging(self, mock_lag):
+        self._read(self.context)
+        self._read(self.context)
+        self.assertEqual([mock.call(use_slave=False)] * 2,
+                         self.mock_facade.get_session.call_args_list)
+        # The estimate is cached for db_slave_lag_check_interval
+        mock_lag.assert_called_once_with()
+
+    @mock.patch.object(sqlalchemy_api, '_measure_slave_lag',
+                       side_effect=Exception)
+    def test_reader_slave_lag_unknown(self, mock_lag):
+        self._read(self.context)
+        self.mock_facade.get_session.assert_called_once_with(use_slave=False)
+
+    def test_record_write(self):
+        self.context.update_store()
+        sqlalchemy_api._record_write(None, None, 'SELECT 1', (), None, False)
+        self.assertEqual({}, sqlalchemy_api._RECENT_WRITES)
+        sqlalchemy_api._record_write(None, None, 'UPDATE instances', (),
+                                     None, False)
+        self.assertIn(self.context.request_id, sqlalchemy_api._RECENT_WRITES)
+
+    @mock.patch.object(sqlalchemy_api, 'get_engine')
+    def test_measure_slave_lag(self, mock_get_engine):
+        now = timeutils.utcnow()
+        main = mock.Mock()
+        main.scalar.return_value = now
+        slave = mock.Mock()
+        slave.scalar.return_value = now - datetime.timedelta(seconds=12)
+        mock_get_engine.side_effect = lambda use_slave=False: (
+            slave if use_slave else main)
+        self.assertEqual(12, sqlalchemy_api._measure_slave_lag())
+
+
 class SqlAlchemyDbApiTestCase(DbTestCase):
     def test_instance_get_all_by_host(self):
         ctxt = context.get_admin_context()
@@ -1515,6 +1681,57 @@ class ReservationTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertEqual(expected, db.quota_usage_get_all_by_project_and_user(
                                             self.ctxt, 'project1', 'user1'))
 
+    def _reserve(self, deltas):
+        quotas = {'resource0': 10, 'resource1': 10, 'fixed_ips': 10}
+        resources = {res: quota.ReservableResource(res, '_sync_%s' % res)
+                     for res in deltas}
+        return db.quota_reserve(self.ctxt, resources, quotas, quotas, deltas,
+                                timeutils.utcnow(), 0, 0, 'project1', 'user1')
+
+    @mock.patch.object(sqlalchemy_api, '_get_project_user_quota_usages')
+    def test_quota_reserve_fast_path(self, mock_locked_usages):
+        reservations = self._reserve({'resource1': 2, 'fixed_ips': -1})
+        self.assertFalse(mock_locked_usages.called)
+        self.assertEqual(2, len(reservations))
+        self.assertEqual([-1, 2], sorted(
+            _reservation_get(self.ctxt, r).delta for r in reservations))
+        expected = {'project_id': 'project1', 'user_id': 'user1',
+                'resource0': {'reserved': 0, 'in_use': 0},
+                'resource1': {'reserved': 3, 'in_use': 1},
+                'fixed_ips': {'reserved': 2, 'in_use': 2}}
+        self.assertEqual(expected, db.quota_usage_get_all_by_project_and_user(
+                                            self.ctxt, 'project1', 'user1'))
+
+    def test_quota_reserve_fast_path_usages_changed(self):
+        calls = []
+
+        def change_usage(*args):
+            # Only change the usage between the read and the conditional
+            # update of the fast path.
+            if not calls:
+                db.quota_usage_update(self.ctxt, 'project1', 'user1',
+                                      'resource1', in_use=3)
+            calls.append(args)
+            return []
+
+        with mock.patch.object(sqlalchemy_api, '_calculate_overquota',
+                               side_effect=change_usage), \
+                mock.patch.object(
+                    sqlalchemy_api, '_get_project_user_quota_usages',
+                    side_effect=sqlalchemy_api._get_project_user_quota_usages
+                ) as mock_locked_usages:
+            reservations = self._reserve({'resource1': 2})
+        self.assertTrue(mock_locked_usages.called)
+        self.assertEqual(1, len(reservations))
+        usage = db.quota_usage_get(self.ctxt, 'project1', 'resource1',
+                                   'user1')
+        self.assertEqual(3, usage.in_use)
+        self.assertEqual(3, usage.reserved)
+
+    def test_quota_reserve_fast_path_over_quota(self):
+        self.assertRaises(exception.OverQuota, self._reserve,
+                          {'resource1': 9})
+
     def test_reservation_expire(self):
         db.reservation_expire(self.ctxt)
 
@@ -2076,6 +2293,23 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
             sys_meta = utils.metadata_to_dict(inst['system_metadata'])
             self.assertEqual(sys_meta, {})
 
+    def test_instance_get_all_by_host_without_meta(self):
+        self.create_instance_with_args()
+        result = db.instance_get_all_by_host(self.ctxt, 'h1',
+                                             columns_to_join=['metadata'])
+        self.assertEqual(1, len(result))
+        meta = utils.metadata_to_dict(result[0]['metadata'])
+        self.assertEqual(meta, self.sample_data['metadata'])
+        self.assertEqual([], result[0]['system_metadata'])
+
+    def test_instance_get_all_by_host_and_not_type_without_meta(self):
+        self.create_instance_with_args(instance_type_id=1)
+        result = db.instance_get_all_by_host_and_not_type(
+            self.ctxt, 'h1', type_id=2, columns_to_join=[])
+        self.assertEqual(1, len(result))
+        self.assertEqual([], result[0]['metadata'])
+        self.assertEqual([], result[0]['system_metadata'])
+
     def test_instance_get_all_by_filters(self):
         instances = [self.create_instance_with_args() for i in range(3)]
         filtered_instances = db.instance_get_all_by_filters(self.ctxt, {})
@@ -5350,6 +5584,60 @@ class VolumeUsageDBApiTestCase(test.TestCase):
         for key, value in expected_vol_usage.items():
             self.assertEqual(vol_usage[key], value, key)
 
+    def test_vol_usage_update_bulk(self):
+        ctxt = context.get_admin_context()
+        now = timeutils.utcnow()
+        start_time = now - datetime.timedelta(seconds=10)
+
+        db.vol_usage_update(ctxt, u'1',
+                            rd_req=10000, rd_bytes=20000,
+                            wr_req=30000, wr_bytes=40000,
+                            instance_id='fake-instance-uuid1',
+                            project_id='fake-project-uuid1',
+                            availability_zone='fake-az',
+                            user_id='fake-user-uuid1')
+
+        def _usage(volume_id, stat):
+            return {'volume_id': volume_id,
+                    'rd_req': stat, 'rd_bytes': stat * 2,
+                    'wr_req': stat * 3, 'wr_bytes': stat * 4,
+                    'instance_uuid': 'fake-instance-uuid%s' % volume_id,
+                    'project_id': 'fake-project-uuid%s' % volume_id,
+                    'user_id': 'fake-user-uuid%s' % volume_id,
+                    'availability_zone': 'fake-az'}
+
+        # The stats of the first volume were reset
+        updated = db.vol_usage_update_bulk(ctxt, [_usage(u'1', 100),
+                                                  _usage(u'2', 300)])
+        self.assertEqual(set([u'1', u'2']),
+                         set(usage['volume_id'] for usage in updated))
+
+        vol_usages = {usage['volume_id']: usage for usage in
+                      db.vol_get_usage_by_time(ctxt, start_time)}
+        expected_vol_usages = {
+            u'1': {'instance_uuid': 'fake-instance-uuid1',
+                   'curr_reads': 100,
+                   'curr_read_bytes': 200,
+                   'curr_writes': 300,
+                   'curr_write_bytes': 400,
+                   'tot_reads': 10000,
+                   'tot_read_bytes': 20000,
+                   'tot_writes': 30000,
+                   'tot_write_bytes': 40000},
+            u'2': {'instance_uuid': 'fake-instance-uuid2',
+                   'curr_reads': 300,
+                   'curr_read_bytes': 600,
+                   'curr_writes': 900,
+                   'curr_write_bytes': 1200,
+                   'tot_reads': 0,
+                   'tot_read_bytes': 0,
+                   'tot_writes': 0,
+                   'tot_write_bytes': 0}}
+        self.assertEqual(2, len(vol_usages))
+        for volume_id, expected in expected_vol_usages.items():
+            for key, value in expected.items():
+                self.assertEqual(value, vol_usages[volume_id][key], key)
+
 
 class TaskLogTestCase(test.TestCase):
 
@@ -6755,6 +7043,28 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
             # Clean up the service
             db.service_destroy(self.ctxt, service['id'])
 
+    def test_compute_node_get_all_changed_since(self):
+        since = timeutils.utcnow() + datetime.timedelta(seconds=10)
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, since)
+        self.assertEqual([], nodes)
+
+        self.useFixture(test.TimeOverride())
+        timeutils.set_time_override(since + datetime.timedelta(seconds=1))
+        db.compute_node_update(self.ctxt, self.item['id'],
+                               {'vcpus_used': 1})
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, since)
+        self.assertEqual([self.item['id']], [node['id'] for node in nodes])
+
+    def test_compute_node_get_all_changed_since_deleted(self):
+        since = timeutils.utcnow() + datetime.timedelta(seconds=10)
+        self.useFixture(test.TimeOverride())
+        timeutils.set_time_override(since + datetime.timedelta(seconds=1))
+        db.compute_node_delete(self.ctxt, self.item['id'])
+        self.assertEqual([], db.compute_node_get_all(self.ctxt))
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, since)
+        self.assertEqual(1, len(nodes))
+        self.assertTrue(nodes[0]['deleted'])
+
     def test_compute_node_get_all_mult_compute_nodes_one_service_entry(self):
         service_data = self.service_dict.copy()
         service_data['host'] = 'host2'
@@ -7530,6 +7840,39 @@ class BwUsageTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self._assertEqualObjects(expected_bw_usage, bw_usage,
                                  ignored_keys=self._ignored_keys)
 
+    def test_bw_usage_update_bulk(self):
+        now = timeutils.utcnow()
+        start_period = now - datetime.timedelta(seconds=10)
+        start_period_str = timeutils.strtime(start_period)
+
+        db.bw_usage_update(self.ctxt, 'fake_uuid1',
+                'fake_mac1', start_period_str,
+                100, 200, 12345, 67890)
+        usages = [{'uuid': 'fake_uuid1', 'mac': 'fake_mac1',
+                   'bw_in': 200, 'bw_out': 300,
+                   'last_ctr_in': 22345, 'last_ctr_out': 77890},
+                  {'uuid': 'fake_uuid2', 'mac': 'fake_mac2',
+                   'bw_in': 100, 'bw_out': 200,
+                   'last_ctr_in': 42, 'last_ctr_out': 42}]
+        db.bw_usage_update_bulk(self.ctxt, start_period_str, usages,
+                                update_cells=False)
+
+        # Unchanged counters are not written back
+        timeutils.advance_time_seconds(10)
+        db.bw_usage_update_bulk(self.ctxt, start_period_str, usages,
+                                update_cells=False)
+
+        bw_usages = db.bw_usage_get_by_uuids(self.ctxt,
+                ['fake_uuid1', 'fake_uuid2'], start_period_str)
+        self.assertEqual(2, len(bw_usages))
+        expected_bw_usages = {
+            usage['uuid']: dict(usage, start_period=start_period,
+                                last_refreshed=now)
+            for usage in usages}
+        for usage in bw_usages:
+            self._assertEqualObjects(expected_bw_usages[usage['uuid']], usage,
+                                     ignored_keys=self._ignored_keys)
+
 
 class Ec2TestCase(test.TestCase):
 
@@ -8281,6 +8624,59 @@ class ArchiveTestCase(test.TestCase):
             'shadow_instance_id_mappings'
         )
 
+    def test_archive_deleted_rows_batches(self):
+        for uuidstr in self.uuidstrs:
+            ins_stmt = self.instance_id_mappings.insert().values(uuid=uuidstr)
+            self.conn.execute(ins_stmt)
+        update_statement = self.instance_id_mappings.update().\
+                where(self.instance_id_mappings.c.uuid.in_(self.uuidstrs[:5]))\
+                .values(deleted=1)
+        self.conn.execute(update_statement)
+        qsiim = sql.select([self.shadow_instance_id_mappings]).\
+                where(self.shadow_instance_id_mappings.c.uuid.in_(
+                                                                self.uuidstrs))
+        progress = {}
+        with mock.patch.object(sqlalchemy_api,
+                               '_archive_deleted_rows_for_table',
+                side_effect=sqlalchemy_api._archive_deleted_rows_for_table
+                ) as mock_archive, \
+                mock.patch.object(sqlalchemy_api, '_get_shadow_table',
+                    side_effect=sqlalchemy_api._get_shadow_table
+                ) as mock_shadow:
+            num = db.archive_deleted_rows(self.context, max_rows=4,
+                                          batch_size=2, progress=progress)
+        self.assertEqual(4, num)
+        calls = [c for c in mock_archive.call_args_list
+                 if c[0][0] == 'instance_id_mappings']
+        self.assertEqual(2, len(calls))
+        # The batches of a table share its shadow table and a connection
+        self.assertEqual(1, mock_shadow.call_args_list.count(
+            mock.call('instance_id_mappings')))
+        self.assertIs(calls[0][1]['conn'], calls[1][1]['conn'])
+        self.assertIs(calls[0][1]['shadow_table'],
+                      calls[1][1]['shadow_table'])
+        entry = progress['instance_id_mappings']
+        self.assertEqual(4, entry['rows'])
+        self.assertIsNotNone(entry['marker'])
+        self.assertEqual(4, len(self.conn.execute(qsiim).fetchall()))
+        # Resuming carries on after the marker and finishes the table
+        num = db.archive_deleted_rows(self.context, batch_size=2,
+                                      progress=progress)
+        self.assertEqual(1, num)
+        self.assertEqual(5, entry['rows'])
+        self.assertIsNone(entry['marker'])
+        self.assertEqual(5, len(self.conn.execute(qsiim).fetchall()))
+
+    def test_archive_table_levels(self):
+        levels = sqlalchemy_api._archive_table_levels()
+        level_of = {}
+        for level, tablenames in enumerate(levels):
+            for tablename in tablenames:
+                level_of[tablename] = level
+        self.assertLess(level_of['instance_extra'], level_of['instances'])
+        self.assertLess(level_of['consoles'], level_of['console_pools'])
+        self.assertEqual(0, level_of['instance_id_mappings'])
+
 
 class InstanceGroupDBApiTestCase(test.TestCase, ModelsObjectComparatorMixin):
     def setUp(self):
@@ -747,6 +747,17 @@ class NovaMigrationsCheckers(test_migrations.ModelsMigrationsSync,
         self.assertIndexMembers(engine, 'virtual_interfaces',
                                 'virtual_interfaces_uuid_idx', ['uuid'])
 
+    def _check_296(self, engine, data):
+        self.assertIndexMembers(engine, 'instances',
+                                'instances_created_at_id_idx',
+                                ['created_at', 'id'])
+        self.assertIndexMembers(engine, 'instances',
+                                'instances_updated_at_id_idx',
+                                ['updated_at', 'id'])
+        self.assertIndexMembers(engine, 'instances',
+                                'instances_display_name_id_idx',
+                                ['display_name', 'id'])
+
 
 class TestNovaMigrationsSQLite(NovaMigrationsCheckers,
                                test_base.DbTestCase,
@@ -2345,7 +2345,8 @@ class TestNeutronv2(TestNeutronv2Base):
         fake_ips = [model.IP(x['ip_address']) for x in fake_port['fixed_ips']]
         api = neutronapi.API()
         self.mox.StubOutWithMock(api, '_get_subnets_from_port')
-        api._get_subnets_from_port(self.context, fake_port).AndReturn(
+        api._get_subnets_from_port(self.context, fake_port,
+                                   client=None).AndReturn(
             [fake_subnet])
         self.mox.ReplayAll()
         neutronapi.get_client('fake')
@@ -2565,8 +2566,8 @@ class TestNeutronv2(TestNeutronv2Base):
                 self.moxed_client, '1.1.1.1', requested_port['id']).AndReturn(
                     [{'floating_ip_address': '10.0.0.1'}])
         for requested_port in requested_ports:
-            api._get_subnets_from_port(self.context, requested_port
-                ).AndReturn(fake_subnets)
+            api._get_subnets_from_port(self.context, requested_port,
+                                       client=None).AndReturn(fake_subnets)
 
         self.mox.StubOutWithMock(api, '_get_preexisting_port_ids')
         api._get_preexisting_port_ids(fake_inst).AndReturn(['port5'])
@@ -3416,6 +3417,134 @@ class TestNeutronv2WithMock(test.TestCase):
         mock_unbind.assert_called_once_with(mock.sentinel.ctx, ['2'],
                                             mock_client)
 
+    @mock.patch.object(objects.InstanceInfoCache, 'get_by_instance_uuid')
+    @mock.patch('nova.network.base_api.update_instance_cache_with_nw_info')
+    @mock.patch('nova.network.neutronv2.api.get_client')
+    def test_get_instances_nw_info(self, mock_get_client, mock_update,
+                                   mock_get_cache):
+        ports = [{'id': 'port-%s' % i,
+                  'device_id': 'inst-%s' % i,
+                  'tenant_id': 'proj-1',
+                  'network_id': 'net-1',
+                  'admin_state_up': True,
+                  'status': 'ACTIVE',
+                  'mac_address': 'de:ad:be:ef:00:0%s' % i,
+                  'fixed_ips': [{'ip_address': '10.0.0.%s' % (i + 2),
+                                 'subnet_id': 'subnet-1'}]}
+                 for i in range(2)]
+        dhcp_port = {'id': 'dhcp-port',
+                     'network_id': 'net-1',
+                     'device_owner': 'network:dhcp',
+                     'fixed_ips': [{'ip_address': '10.0.0.1',
+                                    'subnet_id': 'subnet-1'}]}
+
+        def list_ports(**search_opts):
+            if 'device_owner' in search_opts:
+                return {'ports': [dhcp_port]}
+            device_ids = search_opts['device_id']
+            if not isinstance(device_ids, list):
+                device_ids = [device_ids]
+            return {'ports': [port for port in ports
+                              if port['device_id'] in device_ids]}
+
+        mock_client = mock_get_client.return_value
+        mock_client.list_ports.side_effect = list_ports
+        mock_client.list_networks.return_value = {'networks': [
+            {'id': 'net-1', 'name': 'net', 'tenant_id': 'proj-1',
+             'shared': False}]}
+        mock_client.list_subnets.return_value = {'subnets': [
+            {'id': 'subnet-1', 'network_id': 'net-1',
+             'cidr': '10.0.0.0/24', 'gateway_ip': '10.0.0.254'}]}
+        mock_client.list_floatingips.return_value = {'floatingips': [
+            {'port_id': 'port-0', 'fixed_ip_address': '10.0.0.2',
+             'floating_ip_address': '172.24.4.2'}]}
+        instances = [objects.Instance(
+            uuid='inst-%s' % i, project_id='proj-1',
+            info_cache=objects.InstanceInfoCache(
+                network_info=model.NetworkInfo()))
+            for i in range(2)]
+        # The info caches did not change since they were prefetched
+        mock_get_cache.side_effect = lambda context, uuid: [
+            instance.info_cache for instance in instances
+            if instance.uuid == uuid][0]
+
+        nw_infos = self.api.get_instances_nw_info(self.context, instances)
+        self.assertEqual(2, mock_client.list_ports.call_count)
+        self.assertEqual(1, mock_client.list_networks.call_count)
+        self.assertEqual(1, mock_client.list_subnets.call_count)
+        self.assertEqual(1, mock_client.list_floatingips.call_count)
+        self.assertEqual(2, mock_update.call_count)
+        self.assertEqual(['port-0'], [vif['id'] for vif in nw_infos['inst-0']])
+        self.assertEqual(['172.24.4.2'],
+                         [ip['address']
+                          for ip in nw_infos['inst-0'].floating_ips()])
+        subnet = nw_infos['inst-1'][0]['network']['subnets'][0]
+        self.assertEqual('10.0.0.1', subnet['meta']['dhcp_server'])
+        self.assertEqual(['10.0.0.3'], [ip['address'] for ip in subnet['ips']])
+
+        # The caches which did not change are not written back
+        mock_update.reset_mock()
+        instances[0].info_cache.network_info = nw_infos['inst-0']
+        self.api.get_instances_nw_info(self.context, instances)
+        mock_update.assert_called_once_with(
+            self.api, self.context, instances[1], nw_info=mock.ANY,
+            update_cells=False)
+
+    @mock.patch.object(objects.InstanceInfoCache, 'get_by_instance_uuid')
+    @mock.patch('nova.network.base_api.update_instance_cache_with_nw_info')
+    @mock.patch('nova.network.neutronv2.api.API._get_instance_nw_info')
+    @mock.patch('nova.network.neutronv2.api.API.'
+                '_get_prefetched_instance_nw_info')
+    @mock.patch('nova.network.neutronv2.api.API.'
+                '_prefetch_instances_nw_info')
+    def test_get_instances_nw_info_cache_changed(self, mock_prefetch,
+                                                 mock_get_prefetched,
+                                                 mock_get_nw_info,
+                                                 mock_update,
+                                                 mock_get_cache):
+        instance = objects.Instance(
+            uuid='inst-1', project_id='proj-1',
+            info_cache=objects.InstanceInfoCache(
+                network_info=model.NetworkInfo()))
+        # An interface was attached since the network info was prefetched
+        info_cache = objects.InstanceInfoCache(
+            network_info=model.NetworkInfo([model.VIF(id='port-1')]))
+        mock_get_cache.return_value = info_cache
+        mock_get_nw_info.return_value = model.NetworkInfo(
+            [model.VIF(id='port-1')])
+
+        nw_infos = self.api.get_instances_nw_info(self.context, [instance])
+        self.assertFalse(mock_get_prefetched.called)
+        mock_get_cache.assert_called_once_with(self.context, 'inst-1')
+        mock_get_nw_info.assert_called_once_with(self.context, instance)
+        self.assertIs(info_cache, instance.info_cache)
+        self.assertEqual({'inst-1': mock_get_nw_info.return_value},
+                         nw_infos)
+        # The rebuilt network info matches the cache written meanwhile
+        self.assertFalse(mock_update.called)
+
+    @mock.patch('nova.network.base_api.update_instance_cache_with_nw_info')
+    @mock.patch('nova.network.neutronv2.api.API.'
+                '_get_prefetched_instance_nw_info_locked')
+    @mock.patch('nova.network.neutronv2.api.API.'
+                '_prefetch_instances_nw_info')
+    def test_get_instances_nw_info_skips_failures(self, mock_prefetch,
+                                                  mock_get_nw_info,
+                                                  mock_update):
+        instances = [objects.Instance(uuid='inst-%s' % i, info_cache=None)
+                     for i in range(3)]
+        nw_info = model.NetworkInfo()
+        mock_get_nw_info.side_effect = [
+            exception.InstanceNotFound(instance_id='inst-0'),
+            test.TestingException(),
+            nw_info]
+
+        nw_infos = self.api.get_instances_nw_info(self.context, instances)
+        self.assertEqual({'inst-2': nw_info}, nw_infos)
+        mock_update.assert_called_once_with(
+            self.api, self.context, instances[2], nw_info=nw_info,
+            update_cells=False)
+
 
 class TestNeutronv2ModuleMethods(test.NoDBTestCase):
 
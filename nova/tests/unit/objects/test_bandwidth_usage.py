@@ -116,6 +116,20 @@ class _TestBandwidthUsage(test.TestCase):
                         start_period=self.expected_bw_usage['start_period'])
         self._compare(self, self.expected_bw_usage, bw_usage)
 
+    @mock.patch.object(db, 'bw_usage_update_bulk')
+    def test_update_all(self, mock_update_bulk):
+        start_period = self.expected_bw_usage['start_period']
+        usages = [{'uuid': 'fake_uuid%s' % i, 'mac': 'fake_mac%s' % i,
+                   'bw_in': 100, 'bw_out': 200,
+                   'last_ctr_in': 12345, 'last_ctr_out': 67890}
+                  for i in range(2)]
+
+        bandwidth_usage.BandwidthUsageList.update_all(
+            self.context, start_period, usages, update_cells=False)
+        mock_update_bulk.assert_called_once_with(
+            mock.ANY, timeutils.strtime(at=start_period), usages,
+            last_refreshed=None, update_cells=False)
+
 
 class TestBandwidthUsageObject(test_objects._LocalTest,
                                _TestBandwidthUsage):
@@ -13,6 +13,8 @@
 #    under the License.
 
 import copy
+import datetime
+
 import mock
 import netaddr
 from oslo_serialization import jsonutils
@@ -380,6 +382,19 @@ class _TestComputeNodeObject(object):
                          subs=self.subs(),
                          comparators=self.comparators())
 
+    @mock.patch.object(db, 'compute_node_get_all_changed_since')
+    def test_get_all_changed_since(self, mock_get_all):
+        mock_get_all.return_value = [fake_compute_node]
+        since = datetime.datetime(2015, 5, 12, 10, 0, 0)
+        computes = compute_node.ComputeNodeList.get_all_changed_since(
+            self.context, since)
+        self.assertEqual(1, len(computes))
+        self.compare_obj(computes[0], fake_compute_node,
+                         subs=self.subs(),
+                         comparators=self.comparators())
+        db_since = mock_get_all.call_args[0][1]
+        self.assertEqual(since, timeutils.normalize_time(db_since))
+
     def test_get_by_hypervisor(self):
         self.mox.StubOutWithMock(db, 'compute_node_search_by_hypervisor')
         db.compute_node_search_by_hypervisor(self.context, 'hyper').AndReturn(
@@ -1461,7 +1461,7 @@ class _TestInstanceListObject(object):
             limit=100, marker='uuid', use_slave=True)
         mock_get_by_filters.assert_called_once_with(
             self.context, {'foo': 'bar'}, 'key', 'dir', limit=100,
-            marker='uuid', columns_to_join=None, use_slave=True)
+            marker='uuid', columns_to_join=[], use_slave=True)
         self.assertEqual(0, mock_get_by_filters_sort.call_count)
 
     @mock.patch.object(db, 'instance_get_all_by_filters_sort')
@@ -1477,7 +1477,7 @@ class _TestInstanceListObject(object):
             sort_dirs=['dir1', 'dir2'])
         mock_get_by_filters_sort.assert_called_once_with(
             self.context, {'foo': 'bar'}, limit=100,
-            marker='uuid', columns_to_join=None, use_slave=True,
+            marker='uuid', columns_to_join=[], use_slave=True,
             sort_keys=['key1', 'key2'], sort_dirs=['dir1', 'dir2'])
         self.assertEqual(0, mock_get_by_filters.call_count)
 
@@ -1507,7 +1507,7 @@ class _TestInstanceListObject(object):
                  self.fake_instance(2)]
         self.mox.StubOutWithMock(db, 'instance_get_all_by_host')
         db.instance_get_all_by_host(self.context, 'foo',
-                                    columns_to_join=None,
+                                    columns_to_join=[],
                                     use_slave=False).AndReturn(fakes)
         self.mox.ReplayAll()
         inst_list = instance.InstanceList.get_by_host(self.context, 'foo')
@@ -1522,7 +1522,7 @@ class _TestInstanceListObject(object):
                  self.fake_instance(2)]
         self.mox.StubOutWithMock(db, 'instance_get_all_by_host_and_node')
         db.instance_get_all_by_host_and_node(self.context, 'foo', 'bar',
-                                             columns_to_join=None).AndReturn(
+                                             columns_to_join=[]).AndReturn(
                                                  fakes)
         self.mox.ReplayAll()
         inst_list = instance.InstanceList.get_by_host_and_node(self.context,
@@ -1536,7 +1536,8 @@ class _TestInstanceListObject(object):
                  self.fake_instance(2)]
         self.mox.StubOutWithMock(db, 'instance_get_all_by_host_and_not_type')
         db.instance_get_all_by_host_and_not_type(self.context, 'foo',
-                                                 type_id='bar').AndReturn(
+                                                 type_id='bar',
+                                                 columns_to_join=[]).AndReturn(
                                                      fakes)
         self.mox.ReplayAll()
         inst_list = instance.InstanceList.get_by_host_and_not_type(
@@ -1659,6 +1660,49 @@ class _TestInstanceListObject(object):
         for inst in inst_list:
             self.assertEqual(inst.obj_what_changed(), set())
 
+    @mock.patch.object(db, 'instance_get_all_by_host')
+    def test_lazy_load_for_list(self, mock_get_by_host):
+        mock_get_by_host.return_value = [
+            fake_instance.fake_db_instance(id=1),
+            fake_instance.fake_db_instance(id=2),
+            fake_instance.fake_db_instance(id=3)]
+        inst_list = instance.InstanceList.get_by_host(self.context, 'foo')
+        mock_get_by_host.assert_called_once_with(
+            self.context, 'foo', columns_to_join=[], use_slave=False)
+        inst_list[2].metadata = {}
+        inst_list[2].obj_reset_changes()
+
+        loaded = instance.InstanceList(objects=[
+            instance.Instance(uuid=inst.uuid, metadata={'id': str(inst.id)})
+            for inst in inst_list.objects[:2]])
+        with mock.patch.object(instance.InstanceList, 'get_by_filters',
+                               return_value=loaded) as mock_get:
+            self.assertEqual({'id': '1'}, inst_list[0].metadata)
+            self.assertEqual({'id': '2'}, inst_list[1].metadata)
+            self.assertEqual({}, inst_list[2].metadata)
+        mock_get.assert_called_once_with(
+            mock.ANY, {'uuid': [inst_list[0].uuid, inst_list[1].uuid]},
+            expected_attrs=['metadata'])
+        for inst in inst_list:
+            self.assertEqual(set(), inst.obj_what_changed())
+
+    @mock.patch.object(objects.Instance, '_load_generic')
+    @mock.patch.object(db, 'instance_get_all_by_host')
+    def test_lazy_load_for_list_single(self, mock_get_by_host, mock_load):
+        mock_get_by_host.return_value = [
+            fake_instance.fake_db_instance(id=1)]
+        inst_list = instance.InstanceList.get_by_host(self.context, 'foo')
+
+        def fake_load(attrname):
+            inst_list[0].metadata = {}
+
+        mock_load.side_effect = fake_load
+        with mock.patch.object(instance.InstanceList,
+                               'get_by_filters') as mock_get:
+            self.assertEqual({}, inst_list[0].metadata)
+        self.assertFalse(mock_get.called)
+        mock_load.assert_called_once_with('metadata')
+
     def test_get_by_security_group(self):
         fake_secgroup = dict(test_security_group.fake_secgroup)
         fake_secgroup['instances'] = [
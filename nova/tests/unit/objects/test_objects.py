@@ -1058,12 +1058,12 @@ object_data = {
     'Aggregate': '1.1-1ab35c4516f71de0bef7087026ab10d1',
     'AggregateList': '1.2-79689d69db4de545a82fe09f30468c53',
     'BandwidthUsage': '1.2-c6e4c779c7f40f2407e3d70022e3cd1c',
-    'BandwidthUsageList': '1.2-77b4d43e641459f464a6aa4d53debd8f',
+    'BandwidthUsageList': '1.3-a027bf0cfe3f411465add6c41391d315',
     'BlockDeviceMapping': '1.9-72d92c263f03a5cbc1761b0ea4c66c22',
     'BlockDeviceMappingList': '1.10-972d431e07463ae1f68e752521937b01',
     'CellMapping': '1.0-7f1a7e85a22bbb7559fc730ab658b9bd',
     'ComputeNode': '1.11-71784d2e6f2814ab467d4e0f69286843',
-    'ComputeNodeList': '1.11-8d269636229e8a39fef1c3514f77d0c0',
+    'ComputeNodeList': '1.12-cac525053a0bb1cc7c4507a415885a09',
     'DNSDomain': '1.0-7b0b2dab778454b6a7b6c66afe163a1a',
     'DNSDomainList': '1.0-f876961b1a6afe400b49cf940671db86',
     'EC2Ids': '1.0-474ee1094c7ec16f8ce657595d8c49d9',
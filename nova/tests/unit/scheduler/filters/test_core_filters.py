@@ -83,3 +83,20 @@ class TestCoreFilter(test.NoDBTestCase):
         # use the minimum ratio from aggregates
         self.assertFalse(self.filt_cls.host_passes(host, filter_properties))
         self.assertEqual(4 * 2, host.limits['vcpu'])
+
+    @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
+    def test_aggregate_core_filter_all(self, agg_mock):
+        self.filt_cls = core_filter.AggregateCoreFilter()
+        filter_properties = {'context': mock.sentinel.ctx,
+                             'instance_type': {'vcpus': 1}}
+        self.flags(cpu_allocation_ratio=1)
+        host1 = fakes.FakeHostState('host1', 'node1',
+                {'vcpus_total': 4, 'vcpus_used': 7})
+        host2 = fakes.FakeHostState('host2', 'node2',
+                {'vcpus_total': 4, 'vcpus_used': 8})
+        agg_mock.return_value = set(['2'])
+        result = list(self.filt_cls.filter_all([host1, host2],
+                                               filter_properties))
+        self.assertEqual([host1], result)
+        agg_mock.assert_called_once_with(host1, 'cpu_allocation_ratio')
+        self.assertEqual(4 * 2, host2.limits['vcpu'])
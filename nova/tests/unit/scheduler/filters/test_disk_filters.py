@@ -96,3 +96,22 @@ class TestDiskFilter(test.NoDBTestCase):
 
         agg_mock.return_value = set(['2'])
         self.assertTrue(filt_cls.host_passes(host, filter_properties))
+
+    @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
+    def test_aggregate_disk_filter_all(self, agg_mock):
+        filt_cls = disk_filter.AggregateDiskFilter()
+        self.flags(disk_allocation_ratio=1.0)
+        filter_properties = {
+            'context': mock.sentinel.ctx,
+            'instance_type': {'root_gb': 2,
+                              'ephemeral_gb': 0,
+                              'swap': 1024}}
+        host1 = fakes.FakeHostState('host1', 'node1',
+                {'free_disk_mb': 0, 'total_usable_disk_gb': 3})
+        host2 = fakes.FakeHostState('host2', 'node2',
+                {'free_disk_mb': 3 * 1024, 'total_usable_disk_gb': 3})
+        agg_mock.return_value = set(['2.0'])
+        result = list(filt_cls.filter_all([host1, host2], filter_properties))
+        self.assertEqual([host1, host2], result)
+        agg_mock.assert_called_once_with(host1, 'disk_allocation_ratio')
+        self.assertEqual(3 * 2.0, host1.limits['disk_gb'])
@@ -59,3 +59,16 @@ class TestNumInstancesFilter(test.NoDBTestCase):
         filter_properties = {'context': mock.sentinel.ctx}
         self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
         agg_mock.assert_called_once_with(host, 'max_io_ops_per_host')
+
+    @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
+    def test_aggregate_filter_num_iops_filter_all(self, agg_mock):
+        self.flags(max_io_ops_per_host=7)
+        self.filt_cls = io_ops_filter.AggregateIoOpsFilter()
+        host1 = fakes.FakeHostState('host1', 'node1', {'num_io_ops': 7})
+        host2 = fakes.FakeHostState('host2', 'node2', {'num_io_ops': 8})
+        agg_mock.return_value = set(['8'])
+        filter_properties = {'context': mock.sentinel.ctx}
+        result = list(self.filt_cls.filter_all([host1, host2],
+                                               filter_properties))
+        self.assertEqual([host1], result)
+        agg_mock.assert_called_once_with(host1, 'max_io_ops_per_host')
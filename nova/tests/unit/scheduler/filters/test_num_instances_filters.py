@@ -59,3 +59,16 @@ class TestNumInstancesFilter(test.NoDBTestCase):
         agg_mock.return_value = set(['XXX'])
         self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
         agg_mock.assert_called_once_with(host, 'max_instances_per_host')
+
+    @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
+    def test_filter_aggregate_num_instances_filter_all(self, agg_mock):
+        self.flags(max_instances_per_host=4)
+        self.filt_cls = num_instances_filter.AggregateNumInstancesFilter()
+        host1 = fakes.FakeHostState('host1', 'node1', {'num_instances': 5})
+        host2 = fakes.FakeHostState('host2', 'node2', {'num_instances': 6})
+        filter_properties = {'context': mock.sentinel.ctx}
+        agg_mock.return_value = set(['6'])
+        result = list(self.filt_cls.filter_all([host1, host2],
+                                               filter_properties))
+        self.assertEqual([host1], result)
+        agg_mock.assert_called_once_with(host1, 'max_instances_per_host')
@@ -87,3 +87,19 @@ class TestAggregateRamFilter(test.NoDBTestCase):
         # use the minimum ratio from aggregates
         self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
         self.assertEqual(1024 * 1.5, host.limits['memory_mb'])
+
+    def test_aggregate_ram_filter_all(self, agg_mock):
+        self.flags(ram_allocation_ratio=1.0)
+        filter_properties = {'context': mock.sentinel.ctx,
+                             'instance_type': {'memory_mb': 1024}}
+        host1 = fakes.FakeHostState('host1', 'node1',
+                {'free_ram_mb': 1023, 'total_usable_ram_mb': 1024})
+        host2 = fakes.FakeHostState('host2', 'node2',
+                {'free_ram_mb': 0, 'total_usable_ram_mb': 1024})
+        agg_mock.return_value = set(['2.0'])
+        result = list(self.filt_cls.filter_all([host1, host2],
+                                               filter_properties))
+        self.assertEqual([host1, host2], result)
+        # both hosts share the same aggregates
+        agg_mock.assert_called_once_with(host1, 'ram_allocation_ratio')
+        self.assertEqual(1024 * 2.0, host2.limits['memory_mb'])
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
+
 from nova import objects
 from nova.scheduler.filters import utils
 from nova import test
@@ -114,3 +116,21 @@ class TestUtils(test.NoDBTestCase):
         host_state.instances = {inst1.uuid: inst1}
         self.assertFalse(utils.other_types_on_host(host_state, 1))
         self.assertTrue(utils.other_types_on_host(host_state, 2))
+
+    def test_filter_hosts_by_aggregate_value(self):
+        agg1, agg2 = _AGGREGATE_FIXTURES[:2]
+        host1 = fakes.FakeHostState('host1', 'node1', {'aggregates': [agg1]})
+        host2 = fakes.FakeHostState('host2', 'node2', {'aggregates': [agg1]})
+        host3 = fakes.FakeHostState('host3', 'node3',
+                                    {'aggregates': [agg1, agg2]})
+        get_value = mock.Mock(side_effect=lambda host: host.host)
+        host_passes = mock.Mock(side_effect=lambda host, value:
+                                value == 'host1')
+
+        result = list(utils.filter_hosts_by_aggregate_value(
+            [host1, host2, host3], get_value, host_passes))
+
+        # host2 shares the aggregates of host1, so it got host1's value
+        self.assertEqual([host1, host2], result)
+        self.assertEqual([mock.call(host1), mock.call(host3)],
+                         get_value.call_args_list)
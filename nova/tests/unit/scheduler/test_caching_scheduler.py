@@ -20,6 +20,7 @@ from six.moves import range
 from nova import exception
 from nova.scheduler import caching_scheduler
 from nova.scheduler import host_manager
+from nova.scheduler import tracing
 from nova.tests.unit.scheduler import test_scheduler
 
 ENABLE_PROFILER = False
@@ -42,6 +43,27 @@ class CachingSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.assertEqual([], self.driver.all_host_states)
         context.elevated.assert_called_with()
 
+    @mock.patch.object(caching_scheduler.CachingScheduler,
+                       "_get_up_hosts", return_value=[])
+    def test_run_periodic_tasks_reports_trace_totals(self, mock_up_hosts):
+        trace = tracing.RequestTrace()
+        trace.finish()
+        self.driver._trace_totals.merge(trace)
+
+        self.driver.run_periodic_tasks(mock.Mock())
+
+        self.assertEqual(0, self.driver._trace_totals.requests)
+
+    @mock.patch.object(host_manager.HostManager,
+                       "save_instance_info_snapshot")
+    @mock.patch.object(caching_scheduler.CachingScheduler,
+                       "_get_up_hosts", return_value=[])
+    def test_run_periodic_tasks_saves_instance_info_snapshot(
+            self, mock_up_hosts, mock_save):
+        self.driver.run_periodic_tasks(mock.Mock())
+
+        mock_save.assert_called_once_with()
+
     @mock.patch.object(caching_scheduler.CachingScheduler,
                        "_get_up_hosts")
     def test_get_all_host_states_returns_cached_value(self, mock_up_hosts):
@@ -16,11 +16,14 @@
 Tests For Filter Scheduler.
 """
 
+import contextlib
+
 import mock
 
 from nova import exception
 from nova.scheduler import filter_scheduler
 from nova.scheduler import host_manager
+from nova.scheduler import tracing
 from nova.scheduler import utils as scheduler_utils
 from nova.scheduler import weights
 from nova.tests.unit.scheduler import fakes
@@ -52,7 +55,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.next_weight = 1.0
 
-        def _fake_weigh_objects(_self, functions, hosts, options):
+        def _fake_weigh_objects(_self, functions, hosts, options,
+                                limit=None, trace=None):
             self.next_weight += 2.0
             host_state = hosts[0]
             return [weights.WeighedHost(host_state, self.next_weight)]
@@ -205,7 +209,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.next_weight = 50
 
-        def _fake_weigh_objects(_self, functions, hosts, options):
+        def _fake_weigh_objects(_self, functions, hosts, options,
+                                limit=None, trace=None):
             this_weight = self.next_weight
             self.next_weight = 0
             host_state = hosts[0]
@@ -256,7 +261,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         selected_hosts = []
         selected_nodes = []
 
-        def _fake_weigh_objects(_self, functions, hosts, options):
+        def _fake_weigh_objects(_self, functions, hosts, options,
+                                limit=None, trace=None):
             self.next_weight += 2.0
             host_state = hosts[0]
             selected_hosts.append(host_state.host)
@@ -328,3 +334,128 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                 # Make sure that the consumed hosts have chance to be reverted.
                 for host in consumed_hosts:
                     self.assertIsNone(host.obj.updated)
+
+    def _get_sharded_hosts(self, schedulers, host):
+        self.flags(scheduler_host_sharding=True, host=host)
+        hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i, {})
+                 for i in range(20)]
+        with mock.patch.object(self.driver, 'hosts_up',
+                               return_value=schedulers) as mock_up:
+            self.driver._update_shard_schedulers(self.context)
+            mock_up.assert_called_once_with(self.context, 'scheduler')
+        return hosts, self.driver._get_preferred_hosts(hosts)
+
+    def test_get_preferred_hosts_sharding_disabled(self):
+        hosts = [fakes.FakeHostState('host1', 'node1', {})]
+        self.assertEqual(hosts, self.driver._get_preferred_hosts(hosts))
+
+    def test_get_preferred_hosts_single_scheduler(self):
+        hosts, preferred = self._get_sharded_hosts(['sched1'], 'sched1')
+        self.assertEqual(hosts, preferred)
+
+    @staticmethod
+    def _host_keys(hosts):
+        return sorted((host.host, host.nodename) for host in hosts)
+
+    def test_get_preferred_hosts_spreads_hosts(self):
+        schedulers = ['sched1', 'sched2', 'sched3']
+        owned = []
+        for scheduler in schedulers:
+            hosts, preferred = self._get_sharded_hosts(schedulers, scheduler)
+            self.assertTrue(len(preferred) < len(hosts))
+            owned.extend(preferred)
+        # Every host is owned by exactly one scheduler
+        self.assertEqual(self._host_keys(hosts), self._host_keys(owned))
+
+    def test_get_preferred_hosts_stable_ownership(self):
+        hosts, preferred = self._get_sharded_hosts(['sched1', 'sched2'],
+                                                   'sched1')
+        # Adding a scheduler only takes hosts away from the existing ones
+        hosts, new_preferred = self._get_sharded_hosts(
+            ['sched1', 'sched2', 'sched3'], 'sched1')
+        self.assertTrue(set(self._host_keys(new_preferred)).issubset(
+            set(self._host_keys(preferred))))
+
+    def test_get_preferred_hosts_falls_back_to_all_hosts(self):
+        self.flags(scheduler_host_sharding=True, host='sched1')
+        self.driver._shard_schedulers = ('sched1', 'sched2')
+        hosts = [fakes.FakeHostState('host1', 'node1', {})]
+        self.driver._shard_owners = {('host1', 'node1'): 'sched2'}
+        self.assertEqual(hosts, self.driver._get_preferred_hosts(hosts))
+
+    def test_schedule_batch_only_refilters_chosen_host(self):
+        hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                     {'free_ram_mb': 1024 * (i + 1)})
+                 for i in range(3)]
+        full_host = hosts[2]
+
+        def fake_get_filtered_hosts(hosts, filter_properties, index):
+            return [host for host in hosts
+                    if host is not full_host or index == 0]
+
+        instance_properties = {'memory_mb': 512, 'root_gb': 0,
+                               'ephemeral_gb': 0, 'vcpus': 1}
+        with contextlib.nested(
+            mock.patch.object(self.driver.host_manager, 'get_filtered_hosts',
+                              side_effect=fake_get_filtered_hosts),
+            mock.patch.object(hosts[0], 'consume_from_instance'),
+            mock.patch.object(hosts[1], 'consume_from_instance'),
+            mock.patch.object(hosts[2], 'consume_from_instance'),
+        ) as (mock_filter, mock_c0, mock_c1, mock_c2):
+            selected = self.driver._schedule_batch(
+                hosts, instance_properties, {}, 3)
+
+        self.assertEqual(['host2', 'host1', 'host1'],
+                         [weighed.obj.host for weighed in selected])
+        # The first call filters all the hosts, then only the chosen one
+        self.assertEqual(3, mock_filter.call_count)
+        self.assertEqual([full_host], mock_filter.call_args_list[1][0][0])
+        self.assertEqual([hosts[1]], mock_filter.call_args_list[2][0][0])
+        mock_c2.assert_called_once_with(instance_properties)
+        self.assertEqual(2, mock_c1.call_count)
+        self.assertFalse(mock_c0.called)
+
+    @mock.patch.object(filter_scheduler.FilterScheduler, '_schedule_batch')
+    @mock.patch.object(filter_scheduler.FilterScheduler,
+                       '_get_all_host_states', return_value=[])
+    def test_schedule_group_not_batched(self, mock_get_hosts, mock_batch):
+        request_spec = {'num_instances': 2,
+                        'instance_properties': {'project_id': 1,
+                                                'os_type': 'Linux'}}
+        filter_properties = {'group_updated': True, 'group_hosts': set()}
+        self.driver._schedule(self.context, request_spec, filter_properties)
+        self.assertFalse(mock_batch.called)
+
+    @mock.patch.object(filter_scheduler.FilterScheduler, '_schedule')
+    def test_select_destinations_tracing(self, mock_schedule):
+        self.flags(scheduler_tracing=True,
+                   scheduler_tracing_notifications=True)
+
+        def fake_schedule(context, request_spec, filter_properties):
+            trace = filter_properties[tracing.TRACE_KEY]
+            trace.add_filter('RamFilter', 3, 2, 0.5)
+            trace.add_cache_lookups('ImagePropertiesFilter', 3, 1)
+            return [mock.Mock()]
+
+        mock_schedule.side_effect = fake_schedule
+        filter_properties = {}
+        with mock.patch.object(self.driver.notifier, 'info') as mock_info:
+            self.driver.select_destinations(self.context,
+                                            {'num_instances': 1},
+                                            filter_properties)
+
+        self.assertNotIn(tracing.TRACE_KEY, filter_properties)
+        self.assertEqual(3, mock_info.call_count)
+        name, record = mock_info.call_args_list[1][0][1:]
+        self.assertEqual('scheduler.select_destinations.trace', name)
+        self.assertEqual(1, record['requests'])
+        self.assertEqual({'calls': 1, 'time': 0.5, 'hosts_in': 3,
+                          'hosts_out': 2}, record['filters']['RamFilter'])
+        self.assertEqual(0.75,
+                         record['caches']['ImagePropertiesFilter']['hit_rate'])
+
+        with mock.patch.object(filter_scheduler.LOG, 'info') as mock_log:
+            self.driver.run_periodic_tasks(self.context)
+            self.assertEqual(1, mock_log.call_count)
+            self.driver.run_periodic_tasks(self.context)
+            self.assertEqual(1, mock_log.call_count)
@@ -22,6 +22,7 @@ from six.moves import range
 
 from nova import filters
 from nova import loadables
+from nova.scheduler import tracing
 from nova import test
 
 
@@ -201,3 +202,26 @@ class FiltersTestCase(test.NoDBTestCase):
                                                      filter_objs_initial,
                                                      filter_properties)
         self.assertIsNone(result)
+
+    def test_get_filtered_objects_traced(self):
+        class OddFilter(filters.BaseFilter):
+            def _filter_one(self, obj, filter_properties):
+                return obj % 2
+
+        def _fake_base_loader_init(*args, **kwargs):
+            pass
+
+        self.stubs.Set(loadables.BaseLoader, '__init__',
+                       _fake_base_loader_init)
+
+        trace = tracing.RequestTrace()
+        filter_handler = filters.BaseFilterHandler(filters.BaseFilter)
+        result = filter_handler.get_filtered_objects(
+            [OddFilter(), Filter1()], list(range(10)), {}, trace=trace)
+        self.assertEqual([1, 3, 5, 7, 9], result)
+        self.assertEqual(['OddFilter', 'Filter1'], list(trace.filters))
+        self.assertEqual(10, trace.filters['OddFilter']['hosts_in'])
+        self.assertEqual(5, trace.filters['OddFilter']['hosts_out'])
+        self.assertEqual(5, trace.filters['Filter1']['hosts_in'])
+        self.assertEqual(5, trace.filters['Filter1']['hosts_out'])
+        self.assertEqual(1, trace.filters['Filter1']['calls'])
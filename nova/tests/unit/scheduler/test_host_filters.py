@@ -15,6 +15,8 @@
 Tests For Scheduler Host Filters.
 """
 
+import mock
+
 from nova.scheduler import filters
 from nova.scheduler.filters import all_hosts_filter
 from nova.scheduler.filters import compute_filter
@@ -36,3 +38,63 @@ class HostFiltersTestCase(test.NoDBTestCase):
         filt_cls = all_hosts_filter.AllHostsFilter()
         host = fakes.FakeHostState('host1', 'node1', {})
         self.assertTrue(filt_cls.host_passes(host, {}))
+
+
+class FakeCachedFilter(filters.BaseHostFilter):
+    cached_request_keys = (('instance_type', 'name'),)
+
+    def __init__(self):
+        self.host_passes = mock.Mock(side_effect=lambda host_state, props:
+                                     host_state.host == 'host1')
+
+
+class HostFilterResultCacheTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(HostFilterResultCacheTestCase, self).setUp()
+        self.flags(scheduler_filter_cache_size=10)
+        self.filt_cls = FakeCachedFilter()
+        self.hosts = [fakes.FakeHostState('host1', 'node1', {}),
+                      fakes.FakeHostState('host2', 'node2', {})]
+        self.filter_properties = {'instance_type': {'name': 'm1.tiny',
+                                                    'memory_mb': 512}}
+
+    def _filter(self):
+        return list(self.filt_cls.filter_all(self.hosts,
+                                             self.filter_properties))
+
+    def test_results_are_cached(self):
+        self.assertEqual([self.hosts[0]], self._filter())
+        self.assertEqual([self.hosts[0]], self._filter())
+        self.assertEqual(2, self.filt_cls.host_passes.call_count)
+
+    def test_unrelated_request_keys_are_ignored(self):
+        self._filter()
+        self.filter_properties['instance_type']['memory_mb'] = 1024
+        self._filter()
+        self.assertEqual(2, self.filt_cls.host_passes.call_count)
+
+    def test_request_change_invalidates(self):
+        self._filter()
+        self.filter_properties['instance_type']['name'] = 'm1.small'
+        self._filter()
+        self.assertEqual(4, self.filt_cls.host_passes.call_count)
+
+    def test_host_generation_change_invalidates(self):
+        self._filter()
+        self.hosts[1].generation += 1
+        self._filter()
+        self.assertEqual(3, self.filt_cls.host_passes.call_count)
+
+    def test_cache_disabled(self):
+        self.flags(scheduler_filter_cache_size=0)
+        self._filter()
+        self._filter()
+        self.assertEqual(4, self.filt_cls.host_passes.call_count)
+
+    def test_cache_is_bounded(self):
+        self.flags(scheduler_filter_cache_size=1)
+        self._filter()
+        self._filter()
+        self.assertEqual(4, self.filt_cls.host_passes.call_count)
+        self.assertEqual(1, len(self.filt_cls._result_cache))
@@ -17,10 +17,14 @@ Tests For HostManager
 """
 
 import collections
+import datetime
+import os
 
+import fixtures
 import mock
 from oslo_config import cfg
 from oslo_serialization import jsonutils
+from oslo_utils import timeutils
 import six
 
 import nova
@@ -500,7 +504,7 @@ class HostManagerTestCase(test.NoDBTestCase):
         host_state = host_manager.HostState('host1', cn1)
         self.assertFalse(host_state.instances)
         mock_get_by_host.return_value = None
-        hm._add_instance_info(context, cn1, host_state)
+        hm._add_instance_info(context, cn1.host, host_state)
         self.assertFalse(mock_get_by_host.called)
         self.assertTrue(host_state.instances)
         self.assertEqual(host_state.instances['uuid1'], inst1)
@@ -522,7 +526,7 @@ class HostManagerTestCase(test.NoDBTestCase):
         host_state = host_manager.HostState('host1', cn1)
         self.assertFalse(host_state.instances)
         mock_get_by_host.return_value = objects.InstanceList(objects=[inst1])
-        hm._add_instance_info(context, cn1, host_state)
+        hm._add_instance_info(context, cn1.host, host_state)
         mock_get_by_host.assert_called_once_with(context, cn1.host)
         self.assertTrue(host_state.instances)
         self.assertEqual(host_state.instances['uuid1'], inst1)
@@ -570,6 +574,38 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertEqual(len(new_info['instances']), 4)
         self.assertTrue(new_info['updated'])
 
+    def test_update_instance_info_bumps_generation(self):
+        host_name = 'fake_host'
+        host_state = host_manager.HostState(host_name, 'fake-node')
+        other_state = host_manager.HostState('other_host', 'fake-node')
+        self.host_manager.host_state_map = {
+            (host_name, 'fake-node'): host_state,
+            ('other_host', 'fake-node'): other_state}
+        self.host_manager._instance_info = {
+                host_name: {
+                    'instances': {},
+                    'updated': False,
+                }}
+        generation = host_state.generation
+        other_generation = other_state.generation
+        inst1 = fake_instance.fake_instance_obj('fake_context', uuid='aaa',
+                                                host=host_name)
+        update = objects.InstanceList(objects=[inst1])
+        self.host_manager.update_instance_info('fake_context', host_name,
+                                               update)
+        self.assertNotEqual(generation, host_state.generation)
+        self.assertEqual(other_generation, other_state.generation)
+
+        generation = host_state.generation
+        self.host_manager.delete_instance_info('fake_context', host_name,
+                                               'aaa')
+        self.assertNotEqual(generation, host_state.generation)
+
+    def test_recreated_host_state_new_generation(self):
+        host_state = host_manager.HostState('fake_host', 'fake-node')
+        recreated = host_manager.HostState('fake_host', 'fake-node')
+        self.assertNotEqual(host_state.generation, recreated.generation)
+
     def test_update_instance_info_unknown_host(self):
         self.host_manager._recreate_instance_info = mock.MagicMock()
         host_name = 'fake_host'
@@ -673,6 +709,82 @@ class HostManagerTestCase(test.NoDBTestCase):
                 'fake_context', host_name)
         self.assertFalse(new_info['updated'])
 
+    def _test_sync_instance_info_checksum(self, compute_uuids):
+        self.host_manager._recreate_instance_info = mock.MagicMock()
+        host_name = 'fake_host'
+        inst1 = fake_instance.fake_instance_obj('fake_context', uuid='aaa',
+                                                host=host_name)
+        inst2 = fake_instance.fake_instance_obj('fake_context', uuid='bbb',
+                                                host=host_name)
+        self.host_manager._instance_info = {
+                host_name: {
+                    'instances': {inst1.uuid: inst1, inst2.uuid: inst2},
+                    'updated': False,
+                }}
+        self.host_manager.sync_instance_info(
+            'fake_context', host_name,
+            checksum=utils.get_set_hash_str(compute_uuids))
+        return self.host_manager._instance_info[host_name]
+
+    def test_sync_instance_info_checksum(self):
+        new_info = self._test_sync_instance_info_checksum(['bbb', 'aaa'])
+        self.assertFalse(self.host_manager._recreate_instance_info.called)
+        self.assertTrue(new_info['updated'])
+
+    def test_sync_instance_info_checksum_fail(self):
+        new_info = self._test_sync_instance_info_checksum(['aaa', 'new'])
+        self.host_manager._recreate_instance_info.assert_called_once_with(
+                'fake_context', 'fake_host')
+        self.assertFalse(new_info['updated'])
+
+    def test_instance_info_snapshot(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'snapshot.json')
+        self.flags(scheduler_instance_info_snapshot=path)
+        inst1 = objects.Instance(uuid='aaa', instance_type_id=1)
+        inst2 = objects.Instance(uuid='bbb', instance_type_id=2)
+        self.host_manager._instance_info = {
+            'host1': {'instances': {'aaa': inst1, 'bbb': inst2},
+                      'updated': True},
+            'host2': {'instances': {}, 'updated': False}}
+        self.host_manager.save_instance_info_snapshot()
+
+        with mock.patch('nova.utils.spawn_n') as mock_spawn:
+            self.host_manager._instance_info = {}
+            self.host_manager._init_instance_info()
+            self.assertFalse(mock_spawn.called)
+        instance_info = self.host_manager._instance_info
+        self.assertEqual(set(['host1', 'host2']), set(instance_info))
+        self.assertEqual({}, instance_info['host2']['instances'])
+        instances = instance_info['host1']['instances']
+        self.assertEqual(1, instances['aaa'].instance_type_id)
+        self.assertEqual(2, instances['bbb'].instance_type_id)
+        # The hosts must be confirmed by their compute node
+        self.assertFalse(instance_info['host1']['updated'])
+
+    @mock.patch('nova.utils.spawn_n')
+    def _test_instance_info_snapshot_invalid(self, content, mock_spawn):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'snapshot.json')
+        self.flags(scheduler_instance_info_snapshot=path)
+        with open(path, 'w') as snapshot_file:
+            snapshot_file.write(content)
+        self.host_manager._init_instance_info()
+        self.assertTrue(mock_spawn.called)
+
+    def test_instance_info_snapshot_invalid(self):
+        self._test_instance_info_snapshot_invalid('{"version": 1, ')
+
+    def test_instance_info_snapshot_no_hosts(self):
+        self._test_instance_info_snapshot_invalid('{"version": 1}')
+
+    def test_instance_info_snapshot_malformed_hosts(self):
+        self._test_instance_info_snapshot_invalid(
+            '{"version": 1, "hosts": {"host1": []}}')
+
+    def test_instance_info_snapshot_not_a_dict(self):
+        self._test_instance_info_snapshot_invalid('[]')
+
 
 class HostManagerChangedNodesTestCase(test.NoDBTestCase):
     """Test case for HostManager class."""
@@ -752,6 +864,119 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
         self.assertEqual(len(host_states_map), 0)
 
 
+@mock.patch('nova.objects.InstanceList.get_by_host',
+            return_value=objects.InstanceList())
+@mock.patch('nova.objects.ServiceList.get_by_binary',
+            return_value=fakes.SERVICES)
+@mock.patch('nova.objects.ComputeNodeList.get_all_changed_since')
+@mock.patch('nova.objects.ComputeNodeList.get_all')
+class HostManagerIncrementalTestCase(test.NoDBTestCase):
+    """Test case for HostManager with incremental host states."""
+
+    @mock.patch.object(host_manager.HostManager, '_init_instance_info')
+    @mock.patch.object(host_manager.HostManager, '_init_aggregates')
+    def setUp(self, mock_init_agg, mock_init_inst):
+        super(HostManagerIncrementalTestCase, self).setUp()
+        self.flags(scheduler_incremental_host_states=True)
+        self.useFixture(test.TimeOverride())
+        self.host_manager = host_manager.HostManager()
+        self.compute_nodes = []
+        for compute in fakes.COMPUTE_NODES:
+            compute = compute.obj_clone()
+            compute.updated_at = timeutils.utcnow()
+            compute.deleted = False
+            self.compute_nodes.append(compute)
+
+    def _changed_node(self, index, **updates):
+        compute = self.compute_nodes[index].obj_clone()
+        compute.updated_at = timeutils.utcnow()
+        for key, value in updates.items():
+            setattr(compute, key, value)
+        return compute
+
+    def test_first_call_loads_all(self, mock_get_all, mock_get_changed,
+                                  mock_get_svc, mock_get_by_host):
+        mock_get_all.return_value = self.compute_nodes
+        self.host_manager.get_all_host_states('fake_context')
+        mock_get_all.assert_called_once_with('fake_context')
+        self.assertFalse(mock_get_changed.called)
+        self.assertEqual(4, len(self.host_manager.host_state_map))
+
+    def test_only_changed_nodes_are_loaded(self, mock_get_all,
+                                           mock_get_changed, mock_get_svc,
+                                           mock_get_by_host):
+        mock_get_all.return_value = self.compute_nodes
+        self.host_manager.get_all_host_states('fake_context')
+        first_refresh = timeutils.utcnow()
+
+        timeutils.advance_time_seconds(10)
+        changed = self._changed_node(0, free_ram_mb=42)
+        mock_get_changed.return_value = objects.ComputeNodeList(
+            objects=[changed])
+        self.host_manager.get_all_host_states('fake_context')
+
+        mock_get_all.assert_called_once_with('fake_context')
+        mock_get_changed.assert_called_once_with(
+            'fake_context',
+            first_refresh - datetime.timedelta(
+                seconds=host_manager.HOST_STATE_DELTA_OVERLAP))
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(4, len(host_states_map))
+        self.assertEqual(42, host_states_map[('host1', 'node1')].free_ram_mb)
+        self.assertEqual(1024,
+                         host_states_map[('host2', 'node2')].free_ram_mb)
+
+    def test_deleted_node_is_removed(self, mock_get_all, mock_get_changed,
+                                     mock_get_svc, mock_get_by_host):
+        mock_get_all.return_value = self.compute_nodes
+        self.host_manager.get_all_host_states('fake_context')
+
+        timeutils.advance_time_seconds(10)
+        mock_get_changed.return_value = objects.ComputeNodeList(
+            objects=[self._changed_node(3, deleted=True)])
+        self.host_manager.get_all_host_states('fake_context')
+
+        self.assertEqual(3, len(self.host_manager.host_state_map))
+        self.assertNotIn(('host4', 'node4'), self.host_manager.host_state_map)
+
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    def test_reset_node_is_reloaded(self, mock_get_by_name, mock_get_all,
+                                    mock_get_changed, mock_get_svc,
+                                    mock_get_by_host):
+        mock_get_all.return_value = self.compute_nodes
+        host_states = list(
+            self.host_manager.get_all_host_states('fake_context'))
+        for host_state in host_states:
+            if host_state.host == 'host1':
+                host_state.free_ram_mb = 0
+                host_state.updated = None
+
+        timeutils.advance_time_seconds(10)
+        mock_get_changed.return_value = objects.ComputeNodeList(objects=[])
+        mock_get_by_name.return_value = self._changed_node(0)
+        self.host_manager.get_all_host_states('fake_context')
+
+        mock_get_by_name.assert_called_once_with('fake_context', 'host1',
+                                                 'node1')
+        self.assertEqual(
+            512, self.host_manager.host_state_map[('host1',
+                                                   'node1')].free_ram_mb)
+
+    def test_full_refresh_after_interval(self, mock_get_all, mock_get_changed,
+                                         mock_get_svc, mock_get_by_host):
+        self.flags(scheduler_host_states_full_refresh_interval=60)
+        mock_get_all.return_value = self.compute_nodes
+        self.host_manager.get_all_host_states('fake_context')
+
+        timeutils.advance_time_seconds(61)
+        mock_get_all.return_value = self.compute_nodes[:2]
+        self.host_manager.get_all_host_states('fake_context')
+
+        self.assertEqual(2, mock_get_all.call_count)
+        self.assertFalse(mock_get_changed.called)
+        self.assertEqual(2, len(self.host_manager.host_state_map))
+
+
 class HostStateTestCase(test.NoDBTestCase):
     """Test case for HostState class."""
 
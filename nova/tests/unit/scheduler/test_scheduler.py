@@ -102,7 +102,19 @@ class SchedulerManagerTestCase(test.NoDBTestCase):
                                             mock.sentinel.instance_uuids)
             mock_sync.assert_called_once_with(mock.sentinel.context,
                                               mock.sentinel.host_name,
-                                              mock.sentinel.instance_uuids)
+                                              mock.sentinel.instance_uuids,
+                                              checksum=None)
+
+    def test_sync_instance_info_checksum(self):
+        with mock.patch.object(self.manager.driver.host_manager,
+                               'sync_instance_info') as mock_sync:
+            self.manager.sync_instance_info(mock.sentinel.context,
+                                            mock.sentinel.host_name,
+                                            checksum=mock.sentinel.checksum)
+            mock_sync.assert_called_once_with(mock.sentinel.context,
+                                              mock.sentinel.host_name,
+                                              None,
+                                              checksum=mock.sentinel.checksum)
 
 
 class SchedulerV3PassthroughTestCase(test.NoDBTestCase):
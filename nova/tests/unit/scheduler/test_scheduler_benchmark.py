@@ -0,0 +1,59 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Smoke tests of tools/scheduler_benchmark.py.
+"""
+
+import argparse
+import imp
+import os
+
+from oslo_config import cfg
+
+from nova import test
+
+CONF = cfg.CONF
+CONF.import_opt('scheduler_default_filters', 'nova.scheduler.host_manager')
+
+BENCHMARK_PATH = os.path.join(os.path.dirname(__file__), os.pardir,
+                              os.pardir, os.pardir, os.pardir, 'tools',
+                              'scheduler_benchmark.py')
+
+
+class SchedulerBenchmarkTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(SchedulerBenchmarkTestCase, self).setUp()
+        self.benchmark = imp.load_source('scheduler_benchmark',
+                                         os.path.abspath(BENCHMARK_PATH))
+        self.flags(scheduler_default_filters=(
+            CONF.scheduler_default_filters + ['DiskFilter']))
+        self.args = argparse.Namespace(
+            hosts=4, aggregates=2, requests=6, instances_per_request=1,
+            numa_fraction=0.5, pci_fraction=0.5, pci_request_fraction=0.0,
+            seed=0)
+
+    def _test_run(self):
+        results = self.benchmark.run(self.args)
+        self.assertEqual(4, results['hosts'])
+        self.assertEqual(6, results['requests'])
+        self.assertEqual(0, results['failed_requests'])
+        self.assertGreater(results['hosts_used'], 0)
+
+    def test_run(self):
+        self._test_run()
+
+    def test_run_incremental_host_states(self):
+        self.flags(scheduler_incremental_host_states=True)
+        self._test_run()
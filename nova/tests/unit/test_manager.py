@@ -0,0 +1,131 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Tests for the periodic task runner of managers.
+"""
+
+import time
+
+from eventlet import event
+import mock
+
+from nova import manager
+from nova.openstack.common import periodic_task
+from nova import test
+
+
+class FakeManager(manager.Manager):
+
+    def __init__(self, *args, **kwargs):
+        super(FakeManager, self).__init__(*args, **kwargs)
+        self.runs = []
+        self.blocking_event = None
+
+    @periodic_task.periodic_task(spacing=10, run_immediately=True)
+    def _fast_task(self, context):
+        self.runs.append('fast')
+
+    @periodic_task.periodic_task(spacing=10, run_immediately=True)
+    def _blocking_task(self, context):
+        self.runs.append('blocking')
+        if self.blocking_event is not None:
+            self.blocking_event.wait()
+
+
+class PeriodicTaskRunnerTestCase(test.NoDBTestCase):
+
+    def test_run_periodic_tasks(self):
+        mgr = FakeManager(host='fake-host')
+        idle_for = mgr.periodic_tasks(mock.sentinel.context)
+        self.assertEqual(['blocking', 'fast'], sorted(mgr.runs))
+        self.assertEqual(10, idle_for)
+
+        # Not due yet
+        mgr.periodic_tasks(mock.sentinel.context)
+        self.assertEqual(2, len(mgr.runs))
+
+        stats = mgr.get_periodic_task_stats()
+        self.assertEqual(1, stats['_fast_task']['runs'])
+        self.assertEqual(0, stats['_fast_task']['overruns'])
+        self.assertEqual(10, stats['_fast_task']['interval'])
+
+    def test_errors_are_raised(self):
+        mgr = FakeManager(host='fake-host')
+        with mock.patch.object(mgr, 'runs') as runs:
+            runs.append.side_effect = test.TestingException
+            self.assertRaises(test.TestingException, mgr.periodic_tasks,
+                              mock.sentinel.context, raise_on_error=True)
+        self.assertEqual(
+            1, len(mgr.get_periodic_task_stats()))
+
+    def test_back_off_overrunning_task(self):
+        self.flags(periodic_task_max_backoff=4)
+        mgr = FakeManager(host='fake-host')
+
+        for interval in (20, 40, 40):
+            mgr._record_periodic_task_run('_fast_task', 11)
+            self.assertEqual(interval, mgr._get_periodic_spacing('_fast_task'))
+        stats = mgr.get_periodic_task_stats()['_fast_task']
+        self.assertEqual(3, stats['runs'])
+        self.assertEqual(3, stats['overruns'])
+        self.assertEqual(11, stats['max_time'])
+        self.assertEqual(40, stats['interval'])
+
+        mgr._record_periodic_task_run('_fast_task', 1)
+        self.assertEqual(10, mgr._get_periodic_spacing('_fast_task'))
+
+    def test_no_back_off(self):
+        self.flags(periodic_task_max_backoff=1)
+        mgr = FakeManager(host='fake-host')
+        mgr._record_periodic_task_run('_fast_task', 11)
+        self.assertEqual(10, mgr._get_periodic_spacing('_fast_task'))
+        self.assertEqual(
+            1, mgr.get_periodic_task_stats()['_fast_task']['overruns'])
+
+    @mock.patch.object(time, 'time', return_value=1000.0)
+    def test_stagger_periodic_tasks(self, mock_time):
+        self.flags(periodic_task_jitter=10)
+        last_runs = []
+        for host in ('host1', 'host2', 'host3'):
+            mgr = FakeManager(host=host)
+            last_run = mgr._periodic_last_run['_fast_task']
+            self.assertTrue(990 <= last_run < 991)
+            last_runs.append(last_run)
+            # The delay is the same after a restart
+            self.assertEqual(
+                last_run,
+                FakeManager(host=host)._periodic_last_run['_fast_task'])
+        self.assertEqual(3, len(set(last_runs)))
+
+    def test_parallel_workers(self):
+        self.flags(periodic_task_workers=2)
+        mgr = FakeManager(host='fake-host')
+        mgr.blocking_event = event.Event()
+
+        mgr.periodic_tasks(mock.sentinel.context)
+        time.sleep(0)
+        self.assertEqual(['blocking', 'fast'], sorted(mgr.runs))
+        self.assertEqual(set(['_blocking_task']), mgr._periodic_running)
+
+        # The blocking task is not run again while it is still running
+        for name in ('_fast_task', '_blocking_task'):
+            mgr._periodic_last_run[name] = None
+        mgr.periodic_tasks(mock.sentinel.context)
+        time.sleep(0)
+        self.assertEqual(['blocking', 'fast', 'fast'], sorted(mgr.runs))
+
+        mgr.blocking_event.send()
+        mgr._periodic_pool.waitall()
+        self.assertEqual(set(), mgr._periodic_running)
+        self.assertEqual(
+            1, mgr.get_periodic_task_stats()['_blocking_task']['runs'])
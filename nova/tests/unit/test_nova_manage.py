@@ -13,11 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
 import StringIO
 import sys
 
 import fixtures
 import mock
+from oslo_serialization import jsonutils
 
 from nova.cmd import manage
 from nova import context
@@ -383,6 +385,35 @@ class DBCommandsTestCase(test.TestCase):
     def test_archive_deleted_rows_negative(self):
         self.assertEqual(1, self.commands.archive_deleted_rows(-1))
 
+    def test_archive_deleted_rows_negative_batch_size(self):
+        self.assertEqual(1, self.commands.archive_deleted_rows(None, 0))
+
+    @mock.patch.object(db, 'archive_deleted_rows')
+    def test_archive_deleted_rows_progress_file(self, mock_archive):
+        def fake_archive(context, max_rows, batch_size, concurrency,
+                         progress):
+            self.assertEqual({'instances': {'marker': 3, 'rows': 3,
+                                            'seconds': 1}}, progress)
+            progress['instances'].update(marker=5, rows=5, seconds=2)
+            return 2
+
+        mock_archive.side_effect = fake_archive
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout',
+                                             StringIO.StringIO()))
+        progress_file = os.path.join(self.useFixture(
+            fixtures.TempDir()).path, 'progress')
+        with open(progress_file, 'w') as f:
+            jsonutils.dump({'instances': {'marker': 3, 'rows': 3,
+                                          'seconds': 1}}, f)
+        self.commands.archive_deleted_rows(4, batch_size='2',
+                                           concurrency='3',
+                                           progress_file=progress_file)
+        with open(progress_file) as f:
+            self.assertEqual({'instances': {'marker': 5, 'rows': 5,
+                                            'seconds': 2}},
+                             jsonutils.load(f))
+        self.assertIn('instances: 5 rows', sys.stdout.getvalue())
+
     @mock.patch.object(migration, 'db_null_instance_uuid_scan',
                        return_value={'foo': 0})
     def test_null_instance_uuid_scan_no_records_found(self, mock_scan):
@@ -2472,6 +2472,8 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
                        fake_get_project_user_quota_usages)
         self.stubs.Set(sqa_api, '_quota_usage_create', fake_quota_usage_create)
         self.stubs.Set(sqa_api, '_reservation_create', fake_reservation_create)
+        # These tests cover the path locking the usages
+        self.stubs.Set(sqa_api, '_quota_reserve_fast', lambda *args: None)
 
         self.useFixture(test.TimeOverride())
 
@@ -214,6 +214,13 @@ class GenericUtilsTestCase(test.NoDBTestCase):
         self.assertEqual(
             value, utils.get_hash_str(base_str))
 
+    def test_get_set_hash_str(self):
+        value = utils.get_set_hash_str(['foo', 'bar', 'baz'])
+        self.assertEqual(32, len(value))
+        self.assertEqual(value, utils.get_set_hash_str(['baz', 'foo', 'bar']))
+        self.assertNotEqual(value, utils.get_set_hash_str(['foo', 'bar']))
+        self.assertEqual('0' * 32, utils.get_set_hash_str([]))
+
     def test_use_rootwrap(self):
         self.flags(disable_rootwrap=False, group='workarounds')
         self.flags(rootwrap_config='foo')
@@ -1065,6 +1072,32 @@ class SafeTruncateTestCase(test.NoDBTestCase):
         self.assertEqual(254, len(byte_message))
 
 
+class PageCursorTestCase(test.NoDBTestCase):
+    def test_encode_decode(self):
+        created_at = datetime.datetime(2015, 6, 1, 12, 30, 15, 123)
+        cursor = utils.encode_page_cursor({'id': 42, 'uuid': 'fake-uuid',
+                                           'created_at': created_at})
+        self.assertTrue(cursor.startswith(utils.PAGE_CURSOR_PREFIX))
+        values = utils.decode_page_cursor(cursor)
+        self.assertEqual(42, values['id'])
+        self.assertEqual('fake-uuid', values['uuid'])
+        self.assertEqual(created_at, timeutils.normalize_time(
+            timeutils.parse_isotime(values['created_at'])))
+
+    def test_decode_not_a_cursor(self):
+        self.assertIsNone(utils.decode_page_cursor(None))
+        self.assertIsNone(utils.decode_page_cursor(
+            '0e9b6e5d-3c2c-4b7b-8f43-2b6b4c6fa2ad'))
+
+    def test_decode_corrupted_cursor(self):
+        self.assertRaises(exception.MarkerNotFound,
+                          utils.decode_page_cursor,
+                          utils.PAGE_CURSOR_PREFIX + '!!!')
+        self.assertRaises(exception.MarkerNotFound,
+                          utils.decode_page_cursor,
+                          utils.PAGE_CURSOR_PREFIX + 'WzFd')
+
+
 class SpawnNTestCase(test.NoDBTestCase):
     def setUp(self):
         super(SpawnNTestCase, self).setUp()
@@ -71,3 +71,74 @@ class TestWeigher(test.NoDBTestCase):
         self.assertEqual(1, len(weighed_host))
         self.assertEqual('host1', weighed_host[0].obj.host)
         self.assertFalse(mock_weigh.called)
+
+    def _get_weighed_hosts(self, limit=None):
+        host_values = [
+            ('host1', 'node1', {'free_ram_mb': 512}),
+            ('host2', 'node2', {'free_ram_mb': 2048}),
+            ('host3', 'node3', {'free_ram_mb': 1024}),
+            ('host4', 'node4', {'free_ram_mb': 2048}),
+        ]
+        hostinfo = [fakes.FakeHostState(host, node, values)
+                    for host, node, values in host_values]
+
+        weight_handler = scheduler_weights.HostWeightHandler()
+        weighers = [scheduler_weights.ram.RAMWeigher()]
+        return weight_handler.get_weighed_objects(weighers, hostinfo, {},
+                                                  limit=limit)
+
+    def test_limit(self):
+        all_hosts = self._get_weighed_hosts()
+        self.assertEqual(['host2', 'host4', 'host3', 'host1'],
+                         [weighed.obj.host for weighed in all_hosts])
+        for limit in (1, 2, 3):
+            weighed_hosts = self._get_weighed_hosts(limit=limit)
+            self.assertEqual([weighed.obj.host
+                              for weighed in all_hosts[:limit]],
+                             [weighed.obj.host for weighed in weighed_hosts])
+
+    def test_limit_larger_than_hosts(self):
+        weighed_hosts = self._get_weighed_hosts(limit=10)
+        self.assertEqual(4, len(weighed_hosts))
+
+    @mock.patch('nova.weights.BaseWeigher.weigh_objects')
+    def test_zero_multiplier_skips_weigher(self, mock_weigh):
+        self.flags(ram_weight_multiplier=0.0)
+        weighed_hosts = self._get_weighed_hosts()
+        self.assertEqual([0.0] * 4,
+                         [weighed.weight for weighed in weighed_hosts])
+        self.assertFalse(mock_weigh.called)
+
+    def test_incremental_weighing(self):
+        host_values = [
+            ('host1', 'node1', {'free_ram_mb': 512}),
+            ('host2', 'node2', {'free_ram_mb': 2048}),
+            ('host3', 'node3', {'free_ram_mb': 1024}),
+        ]
+        hostinfo = [fakes.FakeHostState(host, node, values)
+                    for host, node, values in host_values]
+        weight_handler = scheduler_weights.HostWeightHandler()
+        weighers = [scheduler_weights.ram.RAMWeigher()]
+        weighing = weight_handler.get_incremental_weighing(weighers,
+                                                           hostinfo, {})
+        self.assertEqual(3, len(weighing))
+        self.assertEqual(['host2', 'host3'],
+                         [weighed.obj.host
+                          for weighed in weighing.get_best(2)])
+
+        hostinfo[1].free_ram_mb = 256
+        with mock.patch.object(weighers[0], '_weigh_object',
+                               wraps=weighers[0]._weigh_object) as mock_w:
+            weighing.update(hostinfo[1])
+            mock_w.assert_called_once_with(hostinfo[1], {})
+        expected = weight_handler.get_weighed_objects(weighers, hostinfo, {})
+        self.assertEqual([(weighed.obj, weighed.weight)
+                          for weighed in expected],
+                         [(weighed.obj, weighed.weight)
+                          for weighed in weighing.get_best(3)])
+
+        weighing.remove(hostinfo[2])
+        self.assertEqual(2, len(weighing))
+        self.assertEqual(['host1', 'host2'],
+                         [weighed.obj.host
+                          for weighed in weighing.get_best(3)])
@@ -4373,6 +4373,27 @@ class LibvirtConnTestCase(test.NoDBTestCase):
         self.assertEqual(uuids[3], vm4.UUIDString())
         mock_list.assert_called_with(only_running=False)
 
+    @mock.patch.object(host.Host, "get_domain_info")
+    @mock.patch.object(host.Host, "list_instance_domains")
+    def test_get_power_states(self, mock_list, mock_info):
+        vm1 = FakeVirtDomain(id=3, name="instance00000001")
+        vm2 = FakeVirtDomain(name="instance00000002")
+        vm3 = FakeVirtDomain(name="instance00000003")
+        mock_list.return_value = [vm1, vm2, vm3]
+        mock_info.side_effect = [
+            [fakelibvirt.VIR_DOMAIN_RUNNING, 2048, 1024, 1, 0],
+            [fakelibvirt.VIR_DOMAIN_SHUTOFF, 2048, 1024, 1, 0],
+            fakelibvirt.make_libvirtError(
+                fakelibvirt.libvirtError,
+                "No such domain",
+                error_code=fakelibvirt.VIR_ERR_NO_DOMAIN)]
+
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.assertEqual({vm1.UUIDString(): power_state.RUNNING,
+                          vm2.UUIDString(): power_state.SHUTDOWN},
+                         drvr.get_power_states())
+        mock_list.assert_called_once_with(only_running=False)
+
     @mock.patch.object(host.Host, "list_instance_domains")
     def test_get_all_block_devices(self, mock_list):
         xml = [
@@ -1464,6 +1464,41 @@ class VirtNUMAHostTopologyTestCase(test.NoDBTestCase):
                                                         pci_stats=pci_stats)
             self.assertIsNone(fitted_instance1)
 
+    def test_get_fitting_not_enough_resources(self):
+        instance = objects.InstanceNUMATopology(
+                cells=[
+                    objects.InstanceNUMACell(
+                        id=0, cpuset=set([1]), memory=3072),
+                    objects.InstanceNUMACell(
+                        id=1, cpuset=set([2]), memory=2048)])
+        with mock.patch.object(hw, '_numa_fit_instance_cell') as mock_fit:
+            self.assertIsNone(hw.numa_fit_instance_to_host(
+                self.host, instance, self.limits))
+            self.assertFalse(mock_fit.called)
+
+    def test_get_fitting_fits_cells_once(self):
+        host = objects.NUMATopology(
+                cells=[
+                    objects.NUMACell(id=i, cpuset=set([2 * i, 2 * i + 1]),
+                                     memory=1024 * (i + 1), cpu_usage=0,
+                                     memory_usage=0, mempages=[], siblings=[],
+                                     pinned_cpus=set([]))
+                    for i in range(4)])
+        # The first instance cell only fits on the last host cell
+        instance = objects.InstanceNUMATopology(
+                cells=[
+                    objects.InstanceNUMACell(
+                        id=0, cpuset=set([1, 2]), memory=4096),
+                    objects.InstanceNUMACell(
+                        id=1, cpuset=set([3, 4]), memory=1024)])
+        with mock.patch.object(hw, '_numa_fit_instance_cell',
+                               wraps=hw._numa_fit_instance_cell) as mock_fit:
+            fitted_instance = hw.numa_fit_instance_to_host(host, instance)
+        self.assertEqual([3, 0], [cell.id for cell in fitted_instance.cells])
+        # 4 host cells for the first instance cell, the first host cell for
+        # the second one, then both cells again for the result
+        self.assertEqual(7, mock_fit.call_count)
+
 
 class NumberOfSerialPortsTest(test.NoDBTestCase):
     def test_flavor(self):
@@ -17,6 +17,7 @@ import os
 import mock
 from oslo_concurrency import processutils
 
+from nova.compute import utils as compute_utils
 from nova import exception
 from nova import test
 from nova import utils
@@ -43,3 +44,31 @@ class QemuTestCase(test.NoDBTestCase):
         image_info = images.qemu_img_info('/fake/path')
         self.assertTrue(image_info)
         self.assertTrue(str(image_info))
+
+
+class FetchTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(FetchTestCase, self).setUp()
+        self.stubs.Set(images, '_DOWNLOAD_SEMAPHORE', None)
+
+    @mock.patch.object(images.IMAGE_API, 'download')
+    def test_fetch_unlimited(self, mock_download):
+        images.fetch(mock.sentinel.context, 'href', '/fake/path',
+                     None, None)
+        mock_download.assert_called_once_with(mock.sentinel.context, 'href',
+                                              dest_path='/fake/path')
+        self.assertIsInstance(images._DOWNLOAD_SEMAPHORE,
+                              compute_utils.UnlimitedSemaphore)
+
+    @mock.patch.object(images.IMAGE_API, 'download')
+    def test_fetch_limited(self, mock_download):
+        self.flags(max_concurrent_image_downloads=2)
+
+        def fake_download(*args, **kwargs):
+            self.assertEqual(1, images._DOWNLOAD_SEMAPHORE.balance)
+
+        mock_download.side_effect = fake_download
+        images.fetch(mock.sentinel.context, 'href', '/fake/path',
+                     None, None)
+        self.assertEqual(1, mock_download.call_count)
+        self.assertEqual(2, images._DOWNLOAD_SEMAPHORE.balance)
@@ -227,6 +227,32 @@ class VMwareVMOpsTestCase(test.NoDBTestCase):
         vms = ops._get_valid_vms_from_retrieve_result(fake_objects)
         self.assertEqual(1, len(vms))
 
+    def test_get_power_states(self):
+        fake_objects = vmwareapi_fake.FakeRetrieveResult()
+        running_vm = vmwareapi_fake.VirtualMachine(
+            name=uuidutils.generate_uuid())
+        stopped_vm = vmwareapi_fake.VirtualMachine(
+            name=uuidutils.generate_uuid(), powerstate='poweredOff')
+        invalid_vm = vmwareapi_fake.VirtualMachine(
+            name=uuidutils.generate_uuid())
+        invalid_vm.set('runtime.connectionState', 'orphaned')
+        for vm in (running_vm, stopped_vm, invalid_vm):
+            fake_objects.add_object(vm)
+
+        def fake_call_method(module, method, *args, **kwargs):
+            if method == 'continue_retrieval':
+                return
+            self.assertEqual('get_inner_objects', method)
+            return fake_objects
+
+        with mock.patch.object(self._session, '_call_method',
+                               side_effect=fake_call_method) as mock_call:
+            power_states = self._vmops.get_power_states()
+        self.assertEqual({running_vm.get('name'): power_state.RUNNING,
+                          stopped_vm.get('name'): power_state.SHUTDOWN},
+                         power_states)
+        self.assertEqual(2, mock_call.call_count)
+
     def test_delete_vm_snapshot(self):
         def fake_call_method(module, method, *args, **kwargs):
             self.assertEqual('RemoveSnapshot_Task', method)
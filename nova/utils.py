@@ -17,6 +17,7 @@
 
 """Utilities and helper functions."""
 
+import base64
 import contextlib
 import datetime
 import functools
@@ -42,6 +43,7 @@ from oslo_config import cfg
 from oslo_context import context as common_context
 from oslo_log import log as logging
 import oslo_messaging as messaging
+from oslo_serialization import jsonutils
 from oslo_utils import encodeutils
 from oslo_utils import excutils
 from oslo_utils import importutils
@@ -1191,6 +1193,16 @@ def get_hash_str(base_str):
     """returns string that represents hash of base_str (in hex format)."""
     return hashlib.md5(base_str).hexdigest()
 
+
+def get_set_hash_str(base_strs):
+    """returns string that represents hash of a set of strings (in hex
+    format), which doesn't depend on the order of the strings.
+    """
+    result = 0
+    for base_str in set(base_strs):
+        result ^= int(hashlib.md5(utf8(base_str)).hexdigest(), 16)
+    return '%032x' % result
+
 if hasattr(hmac, 'compare_digest'):
     constant_time_compare = hmac.compare_digest
 else:
@@ -1325,3 +1337,38 @@ def safe_truncate(value, length):
         except UnicodeDecodeError:
             b_value = b_value[:-1]
     return u_value
+
+
+PAGE_CURSOR_PREFIX = 'k1.'
+
+
+def encode_page_cursor(values):
+    """Return an opaque pagination marker holding the given sort key values.
+
+    The values are those of the last row of a page, keyed by column name,
+    so that the next page can be fetched without looking that row up.
+    """
+    data = encodeutils.safe_encode(jsonutils.dumps(values))
+    return PAGE_CURSOR_PREFIX + base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_page_cursor(marker):
+    """Return the sort key values of a pagination cursor.
+
+    Returns None if the marker is not a cursor built by encode_page_cursor,
+    e.g. the uuid of the last row of the previous page.
+
+    :raises: MarkerNotFound if the marker is a corrupted cursor
+    """
+    if (not isinstance(marker, six.string_types) or
+            not marker.startswith(PAGE_CURSOR_PREFIX)):
+        return None
+    try:
+        data = base64.urlsafe_b64decode(
+            encodeutils.safe_encode(marker[len(PAGE_CURSOR_PREFIX):]))
+        values = jsonutils.loads(data)
+    except (TypeError, ValueError):
+        raise exception.MarkerNotFound(marker=marker)
+    if not isinstance(values, dict):
+        raise exception.MarkerNotFound(marker=marker)
+    return values
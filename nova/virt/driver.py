@@ -196,6 +196,17 @@ class ComputeDriver(object):
         # TODO(Vek): Need to pass context in for access to auth_token
         raise NotImplementedError()
 
+    def get_power_states(self):
+        """Return the power states of all the instances known to the
+        virtualization layer, as a dict of power states keyed by instance
+        UUID.
+
+        This is used to sync the power states of the instances of a host
+        without calling get_info() for each of them. Drivers which can't
+        query them in bulk should not implement this method.
+        """
+        raise NotImplementedError()
+
     def get_num_instances(self):
         """Return the total number of virtual machines.
 
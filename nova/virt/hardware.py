@@ -1009,30 +1009,76 @@ def numa_fit_instance_to_host(
     by calling the _numa_fit_instance_cell method, and return a new
     InstanceNUMATopology with it's cell ids set to host cell id's of
     the first successful permutation, or None.
+
+    The permutations are walked in the same order as itertools.permutations()
+    would, but the permutations sharing a prefix which can't fit are
+    skipped, and each instance cell is only fitted once on each host cell.
     """
     if (not (host_topology and instance_topology) or
         len(host_topology) < len(instance_topology)):
         return
-    else:
+
+    host_cells = host_topology.cells
+    instance_cells = instance_topology.cells
+    # An instance cell can't fit on a host cell with less memory or CPUs, so
+    # no permutation fits if the host doesn't have enough of them overall
+    if (sum(cell.memory for cell in instance_cells) >
+            sum(cell.memory for cell in host_cells) or
+            sum(len(cell.cpuset) for cell in instance_cells) >
+            sum(len(cell.cpuset) for cell in host_cells)):
+        return
+
+    # Fitting an instance cell overwrites its page size and CPU topology,
+    # which are restored before each fit so that the result of fitting an
+    # instance cell on a host cell doesn't depend on the previous fits.
+    requested = [(cell.pagesize,
+                  cell.cpu_topology if cell.obj_attr_is_set('cpu_topology')
+                  else None)
+                 for cell in instance_cells]
+    fits = {}
+
+    def _fit_cell(host_index, cell_index):
+        instance_cell = instance_cells[cell_index]
+        pagesize, cpu_topology = requested[cell_index]
+        instance_cell.pagesize = pagesize
+        if (instance_cell.obj_attr_is_set('cpu_topology') and
+                instance_cell.cpu_topology is not cpu_topology):
+            instance_cell.cpu_topology = cpu_topology
+        return _numa_fit_instance_cell(host_cells[host_index], instance_cell,
+                                       limits)
+
+    def _cell_fits(host_index, cell_index):
+        key = (host_index, cell_index)
+        if key not in fits:
+            fits[key] = _fit_cell(host_index, cell_index) is not None
+        return fits[key]
+
+    def _host_cell_assignments(used_host_indexes):
         # TODO(ndipanov): We may want to sort permutations differently
         # depending on whether we want packing/spreading over NUMA nodes
-        for host_cell_perm in itertools.permutations(
-                host_topology.cells, len(instance_topology)):
-            cells = []
-            for host_cell, instance_cell in zip(
-                    host_cell_perm, instance_topology.cells):
-                got_cell = _numa_fit_instance_cell(
-                    host_cell, instance_cell, limits)
-                if got_cell is None:
-                    break
-                cells.append(got_cell)
-            if len(cells) == len(host_cell_perm):
-                if not pci_requests:
-                    return objects.InstanceNUMATopology(cells=cells)
-                elif ((pci_stats is not None) and
-                    pci_stats.support_requests(pci_requests,
-                                                     cells)):
-                    return objects.InstanceNUMATopology(cells=cells)
+        cell_index = len(used_host_indexes)
+        if cell_index == len(instance_cells):
+            yield list(used_host_indexes)
+            return
+        for host_index in range(len(host_cells)):
+            if (host_index in used_host_indexes or
+                    not _cell_fits(host_index, cell_index)):
+                continue
+            used_host_indexes.append(host_index)
+            for assignment in _host_cell_assignments(used_host_indexes):
+                yield assignment
+            used_host_indexes.pop()
+
+    for assignment in _host_cell_assignments([]):
+        # Fit the cells again, as they were also fitted on other host cells
+        cells = [_fit_cell(host_index, cell_index)
+                 for cell_index, host_index in enumerate(assignment)]
+        if not pci_requests:
+            return objects.InstanceNUMATopology(cells=cells)
+        elif ((pci_stats is not None) and
+            pci_stats.support_requests(pci_requests,
+                                             cells)):
+            return objects.InstanceNUMATopology(cells=cells)
 
 
 def _numa_pagesize_usage_from_cell(hostcell, instancecell, sign):
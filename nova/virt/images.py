@@ -24,6 +24,7 @@ import os
 from oslo_config import cfg
 from oslo_log import log as logging
 
+from nova.compute import utils as compute_utils
 from nova import exception
 from nova.i18n import _, _LE
 from nova import image
@@ -37,12 +38,27 @@ image_opts = [
     cfg.BoolOpt('force_raw_images',
                 default=True,
                 help='Force backing images to raw format'),
+    cfg.IntOpt('max_concurrent_image_downloads',
+               default=0,
+               help='Maximum number of images downloaded from the image '
+                    'service concurrently. A value of 0 means unlimited'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(image_opts)
 IMAGE_API = image.API()
 
+_DOWNLOAD_SEMAPHORE = None
+
+
+def _get_download_semaphore():
+    """Return the semaphore bounding image downloads."""
+    global _DOWNLOAD_SEMAPHORE
+    if _DOWNLOAD_SEMAPHORE is None:
+        _DOWNLOAD_SEMAPHORE = compute_utils.get_semaphore(
+            CONF.max_concurrent_image_downloads)
+    return _DOWNLOAD_SEMAPHORE
+
 
 def qemu_img_info(path):
     """Return an object containing the parsed output from qemu-img info."""
@@ -74,7 +90,8 @@ def convert_image(source, dest, out_format, run_as_root=False):
 
 def fetch(context, image_href, path, _user_id, _project_id, max_size=0):
     with fileutils.remove_path_on_error(path):
-        IMAGE_API.download(context, image_href, dest_path=path)
+        with _get_download_semaphore():
+            IMAGE_API.download(context, image_href, dest_path=path)
 
 
 def get_info(context, image_href):
@@ -613,6 +613,21 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return uuids
 
+    def get_power_states(self):
+        power_states = {}
+        for dom in self._host.list_instance_domains(only_running=False):
+            try:
+                dom_info = self._host.get_domain_info(dom)
+            except libvirt.libvirtError as ex:
+                # NOTE: The domain may have been undefined since it was
+                # listed, in which case it is reported as not found.
+                if ex.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+                    continue
+                raise
+            power_states[dom.UUIDString()] = LIBVIRT_POWER_STATE[dom_info[0]]
+
+        return power_states
+
     def plug_vifs(self, instance, network_info):
         """Plug VIFs into networks."""
         for vif in network_info:
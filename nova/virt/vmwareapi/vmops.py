@@ -1828,6 +1828,34 @@ class VMwareVMOps(object):
         LOG.debug("Got total of %s instances", str(len(lst_vm_names)))
         return lst_vm_names
 
+    def get_power_states(self):
+        """Return the power states of the VM instances registered with the
+        vCenter cluster, keyed by instance UUID, with a single query.
+        """
+        properties = ['name', 'runtime.connectionState', 'runtime.powerState']
+        retrieve_result = None
+        if self._root_resource_pool:
+            retrieve_result = self._session._call_method(
+                vim_util, 'get_inner_objects', self._root_resource_pool, 'vm',
+                'VirtualMachine', properties)
+
+        power_states = {}
+        while retrieve_result:
+            for vm in retrieve_result.objects:
+                props = {prop.name: prop.val for prop in vm.propSet}
+                vm_name = props.get('name')
+                # Ignoring the orphaned or inaccessible VMs
+                if (props.get('runtime.connectionState') in
+                        ["orphaned", "inaccessible"] or
+                        not uuidutils.is_uuid_like(vm_name)):
+                    continue
+                power_states[vm_name] = VMWARE_POWER_STATES.get(
+                    props.get('runtime.powerState'), power_state.NOSTATE)
+            retrieve_result = self._session._call_method(vutil,
+                                                         'continue_retrieval',
+                                                         retrieve_result)
+        return power_states
+
     def get_vnc_console(self, instance):
         """Return connection info for a vnc console using vCenter logic."""
 
@@ -18,6 +18,8 @@ Pluggable Weighing support
 """
 
 import abc
+import heapq
+import time
 
 import six
 
@@ -121,23 +123,160 @@ class BaseWeigher(object):
 class BaseWeightHandler(loadables.BaseLoader):
     object_class = WeighedObject
 
-    def get_weighed_objects(self, weighers, obj_list, weighing_properties):
-        """Return a sorted (descending), normalized list of WeighedObjects."""
+    def get_weighed_objects(self, weighers, obj_list, weighing_properties,
+                            limit=None, trace=None):
+        """Return a sorted (descending), normalized list of WeighedObjects.
+
+        If limit is set, only the limit best WeighedObjects are returned,
+        which spares sorting the whole list. If trace is set, its
+        add_weigher() method is called with the name, object count and
+        duration of each weigher run.
+        """
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
 
         if len(weighed_objs) <= 1:
             return weighed_objs
 
         for weigher in weighers:
+            multiplier = weigher.weight_multiplier()
+            if not multiplier:
+                # The weigher can't change the order of the objects
+                continue
+            start = time.time()
             weights = weigher.weigh_objects(weighed_objs, weighing_properties)
+            if trace is not None:
+                trace.add_weigher(weigher.__class__.__name__,
+                                  len(weighed_objs), time.time() - start)
 
             # Normalize the weights
             weights = normalize(weights,
                                 minval=weigher.minval,
                                 maxval=weigher.maxval)
 
-            for i, weight in enumerate(weights):
-                obj = weighed_objs[i]
-                obj.weight += weigher.weight_multiplier() * weight
+            for obj, weight in six.moves.zip(weighed_objs, weights):
+                obj.weight += multiplier * weight
 
+        if limit is not None and limit < len(weighed_objs):
+            # NOTE: nlargest() keeps the same order as sorted() for objects
+            # with equal weights.
+            return heapq.nlargest(limit, weighed_objs,
+                                  key=lambda x: x.weight)
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+
+    def get_incremental_weighing(self, weighers, obj_list,
+                                 weighing_properties, trace=None):
+        """Return an IncrementalWeighing of the objects."""
+        return IncrementalWeighing(self.object_class, weighers, obj_list,
+                                   weighing_properties, trace=trace)
+
+
+class IncrementalWeighing(object):
+    """Weighs a list of objects once, then only weighs again the objects
+    which changed.
+
+    The best objects returned by get_best() are the same as the ones
+    returned by BaseWeightHandler.get_weighed_objects() for the remaining
+    objects, since the weights of the unchanged objects are only normalized
+    again when the bounds of a weigher change.
+    """
+
+    def __init__(self, object_class, weighers, obj_list, weighing_properties,
+                 trace=None):
+        self.weighing_properties = weighing_properties
+        self._trace = trace
+        self.weighed_objs = [object_class(obj, 0.0) for obj in obj_list]
+        self._indexes = {id(weighed_obj.obj): i
+                         for i, weighed_obj in enumerate(self.weighed_objs)}
+        self._removed = set()
+        self._weighers = []
+        self._weights = []
+        if len(self.weighed_objs) <= 1:
+            return
+
+        for weigher in weighers:
+            multiplier = weigher.weight_multiplier()
+            if not multiplier:
+                # The weigher can't change the order of the objects
+                continue
+            self._weighers.append((weigher, multiplier))
+            self._weights.append(self._weigh(weigher, self.weighed_objs))
+        self._bounds = self._get_bounds()
+        self._normalize()
+
+    def __len__(self):
+        return len(self.weighed_objs) - len(self._removed)
+
+    def _get_bounds(self):
+        return [(weigher.minval, weigher.maxval)
+                for weigher, multiplier in self._weighers]
+
+    @staticmethod
+    def _weighs_objects_independently(weigher):
+        # Weighers overriding weigh_objects() may need all the objects
+        return (six.get_unbound_function(type(weigher).weigh_objects) is
+                six.get_unbound_function(BaseWeigher.weigh_objects))
+
+    def _weigh(self, weigher, weighed_objs):
+        start = time.time()
+        weights = list(weigher.weigh_objects(weighed_objs,
+                                             self.weighing_properties))
+        if self._trace is not None:
+            self._trace.add_weigher(weigher.__class__.__name__,
+                                    len(weighed_objs), time.time() - start)
+        return weights
+
+    def _normalize(self):
+        for weighed_obj in self.weighed_objs:
+            weighed_obj.weight = 0.0
+        for (weigher, multiplier), weights in six.moves.zip(self._weighers,
+                                                            self._weights):
+            weights = normalize(weights,
+                                minval=weigher.minval,
+                                maxval=weigher.maxval)
+            for weighed_obj, weight in six.moves.zip(self.weighed_objs,
+                                                     weights):
+                weighed_obj.weight += multiplier * weight
+
+    def update(self, obj):
+        """Weigh again an object whose attributes changed."""
+        if not self._weighers:
+            return
+        i = self._indexes[id(obj)]
+        weighed_obj = self.weighed_objs[i]
+        renormalize = False
+        for (weigher, multiplier), weights in six.moves.zip(self._weighers,
+                                                            self._weights):
+            if self._weighs_objects_independently(weigher):
+                weights[i] = self._weigh(weigher, [weighed_obj])[0]
+            else:
+                weights[:] = self._weigh(weigher, self.weighed_objs)
+                renormalize = True
+
+        bounds = self._get_bounds()
+        if renormalize or bounds != self._bounds:
+            self._bounds = bounds
+            self._normalize()
+            return
+
+        weighed_obj.weight = 0.0
+        for (weigher, multiplier), weights in six.moves.zip(self._weighers,
+                                                            self._weights):
+            weight = normalize([weights[i]],
+                               minval=weigher.minval,
+                               maxval=weigher.maxval)
+            weighed_obj.weight += multiplier * next(iter(weight))
+
+    def remove(self, obj):
+        """Remove an object, which won't be returned by get_best() anymore."""
+        self._removed.add(self._indexes[id(obj)])
+
+    def get_best(self, limit):
+        """Return the limit best remaining WeighedObjects, in descending
+        order.
+        """
+        weighed_objs = self.weighed_objs
+        if self._removed:
+            weighed_objs = [weighed_obj
+                            for i, weighed_obj in enumerate(weighed_objs)
+                            if i not in self._removed]
+        return heapq.nlargest(limit, weighed_objs, key=lambda x: x.weight)
@@ -0,0 +1,290 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Offline benchmark of the filter scheduler.
+
+This script builds a synthetic cloud of compute nodes, with aggregates, NUMA
+topologies, PCI device pools and metrics, and replays a stream of requests
+through FilterScheduler.select_destinations(). The database is not used: the
+queries of the scheduler return the synthetic cloud instead. The instances
+consumed on the hosts are kept by the scheduler, so the cloud fills up as
+the requests are replayed.
+
+It reports the p50/p99 latency of the requests, the throughput and the
+quality of the placement. Any argument the script doesn't know is handed to
+the nova configuration, e.g.:
+
+    python tools/scheduler_benchmark.py --hosts 2000 --requests 1000 \\
+        --scheduler_default_filters=RamFilter,CoreFilter,ComputeFilter
+
+Use --max-p99 to make the script fail when the p99 latency regresses.
+"""
+
+from __future__ import print_function
+
+import argparse
+import math
+import random
+import sys
+import time
+import uuid
+
+import mock
+from oslo_config import cfg
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+
+from nova import context as nova_context
+from nova import exception
+from nova import objects
+from nova.scheduler import filter_scheduler
+from nova.scheduler import host_manager
+
+CONF = cfg.CONF
+
+# memory_mb, vcpus, local_gb
+HOST_SIZES = [(65536, 16, 1000), (131072, 32, 2000), (262144, 48, 4000)]
+# memory_mb, vcpus, root_gb
+FLAVORS = [(512, 1, 1), (2048, 1, 20), (4096, 2, 40), (8192, 4, 80),
+           (16384, 8, 160)]
+PCI_DEVICE = {'vendor_id': '8086', 'product_id': '1520'}
+METRICS = ('cpu.percent', 'cpu.frequency')
+
+
+def build_numa_topology(memory_mb, vcpus, num_cells=2):
+    cpus_per_cell = vcpus // num_cells
+    cells = [objects.NUMACell(
+                 id=i,
+                 cpuset=set(range(i * cpus_per_cell,
+                                  (i + 1) * cpus_per_cell)),
+                 memory=memory_mb // num_cells, cpu_usage=0,
+                 memory_usage=0, mempages=[], siblings=[],
+                 pinned_cpus=set())
+             for i in range(num_cells)]
+    return objects.NUMATopology(cells=cells)._to_json()
+
+
+def build_cloud(args, rand):
+    """Return the compute nodes, services and aggregates of a cloud."""
+    now = timeutils.utcnow()
+    compute_nodes = []
+    services = []
+    for i in range(args.hosts):
+        host = 'host%05d' % i
+        memory_mb, vcpus, local_gb = rand.choice(HOST_SIZES)
+        numa_topology = None
+        if rand.random() < args.numa_fraction:
+            numa_topology = build_numa_topology(memory_mb, vcpus)
+        pools = []
+        if rand.random() < args.pci_fraction:
+            pools.append(objects.PciDevicePool(numa_node=0, tags={},
+                                               count=8, **PCI_DEVICE))
+        metrics = [dict(name=name, value=rand.random() * 100,
+                        source='benchmark', timestamp=timeutils.isotime(now))
+                   for name in METRICS]
+        compute_nodes.append(objects.ComputeNode(
+            id=i + 1, host=host, hypervisor_hostname=host,
+            memory_mb=memory_mb, free_ram_mb=memory_mb, vcpus=vcpus,
+            vcpus_used=0, local_gb=local_gb, free_disk_gb=local_gb,
+            local_gb_used=0, disk_available_least=local_gb,
+            updated_at=now, host_ip='127.0.0.1', hypervisor_type='QEMU',
+            hypervisor_version=2000000, numa_topology=numa_topology,
+            supported_hv_specs=[], cpu_info=None, stats={},
+            pci_device_pools=objects.PciDevicePoolList(objects=pools),
+            metrics=jsonutils.dumps(metrics)))
+        services.append(objects.Service(
+            id=i + 1, host=host, binary='nova-compute', topic='compute',
+            disabled=False, created_at=now, updated_at=now,
+            last_seen_up=now))
+
+    aggregates = []
+    for i in range(args.aggregates):
+        hosts = [node.host for node in compute_nodes[i::args.aggregates]]
+        aggregates.append(objects.Aggregate(
+            id=i + 1, name='agg%d' % i, hosts=hosts,
+            metadata={'cpu_allocation_ratio': str(rand.choice((4, 8, 16))),
+                      'ram_allocation_ratio': '1.5'}))
+    return compute_nodes, services, aggregates
+
+
+def build_request(args, rand):
+    """Return the request_spec and filter_properties of a request."""
+    memory_mb, vcpus, root_gb = rand.choice(FLAVORS)
+    flavor = dict(memory_mb=memory_mb, vcpus=vcpus, root_gb=root_gb,
+                  ephemeral_gb=0, swap=0)
+    instance_uuid = str(uuid.uuid4())
+    # NOTE: Without a numa_topology, consuming the instance would look its
+    # topology up in the database.
+    instance_properties = dict(flavor, project_id='benchmark',
+                               os_type='linux', uuid=instance_uuid,
+                               availability_zone=None, numa_topology=None)
+    filter_properties = {}
+    if rand.random() < args.pci_request_fraction:
+        spec = [dict(PCI_DEVICE)]
+        instance_properties['pci_requests'] = {
+            'instance_uuid': instance_uuid,
+            'requests': [{'count': 1, 'spec': spec}]}
+        filter_properties['pci_requests'] = objects.InstancePCIRequests(
+            instance_uuid=instance_uuid,
+            requests=[objects.InstancePCIRequest(count=1, spec=spec)])
+    request_spec = {
+        'num_instances': args.instances_per_request,
+        'instance_type': dict(flavor, id=FLAVORS.index(
+            (memory_mb, vcpus, root_gb)) + 1, name='m%d' % memory_mb,
+            extra_specs={}),
+        'instance_properties': instance_properties,
+        'image': {'properties': {}},
+    }
+    return request_spec, filter_properties
+
+
+def percentile(values, fraction):
+    """Return the value at the given fraction of the sorted values."""
+    if not values:
+        return 0.0
+    return values[int(round(fraction * (len(values) - 1)))]
+
+
+def placement_quality(host_states):
+    """Return statistics about the RAM usage of the hosts."""
+    usages = [1.0 - float(state.free_ram_mb) / state.total_usable_ram_mb
+              for state in host_states if state.total_usable_ram_mb]
+    used = [usage for usage in usages if usage > 0]
+    mean = sum(usages) / len(usages) if usages else 0.0
+    stddev = math.sqrt(sum((usage - mean) ** 2 for usage in usages) /
+                       len(usages)) if usages else 0.0
+    return {'hosts_used': len(used),
+            'ram_usage_mean': mean,
+            'ram_usage_stddev': stddev,
+            'ram_usage_mean_used_hosts': (sum(used) / len(used)
+                                          if used else 0.0)}
+
+
+def run(args):
+    rand = random.Random(args.seed)
+    compute_nodes, services, aggregates = build_cloud(args, rand)
+    context = nova_context.get_admin_context()
+
+    with mock.patch.object(objects.AggregateList, 'get_all',
+                           return_value=aggregates), \
+            mock.patch.object(host_manager.HostManager,
+                              '_init_instance_info'), \
+            mock.patch('nova.rpc.get_notifier'):
+        scheduler = filter_scheduler.FilterScheduler()
+    # The instance info is sent by the compute nodes and no instance runs on
+    # the synthetic cloud before the benchmark
+    scheduler.host_manager._instance_info = {
+        service.host: {'instances': {}, 'updated': True}
+        for service in services}
+
+    # The synthetic compute nodes never change, but the incremental refresh
+    # of the host states reloads the ones a failed request released
+    nodes_by_key = {(node.host, node.hypervisor_hostname): node
+                    for node in compute_nodes}
+
+    latencies = []
+    failures = 0
+    start = time.time()
+    with mock.patch.object(objects.ServiceList, 'get_by_binary',
+                           return_value=services), \
+            mock.patch.object(objects.ComputeNodeList, 'get_all',
+                              return_value=compute_nodes), \
+            mock.patch.object(
+                objects.ComputeNodeList, 'get_all_changed_since',
+                side_effect=lambda context, since: objects.ComputeNodeList(
+                    objects=[])), \
+            mock.patch.object(
+                objects.ComputeNode, 'get_by_host_and_nodename',
+                side_effect=lambda context, host, node: nodes_by_key[
+                    (host, node)]), \
+            mock.patch.object(scheduler, 'hosts_up',
+                              return_value=[CONF.host]):
+        for i in range(args.requests):
+            request_spec, filter_properties = build_request(args, rand)
+            request_start = time.time()
+            try:
+                scheduler.select_destinations(context, request_spec,
+                                              filter_properties)
+            except exception.NoValidHost:
+                failures += 1
+            latencies.append(time.time() - request_start)
+    elapsed = time.time() - start
+
+    latencies.sort()
+    results = {
+        'hosts': args.hosts,
+        'requests': args.requests,
+        'failed_requests': failures,
+        'time': elapsed,
+        'requests_per_second': args.requests / elapsed if elapsed else 0.0,
+        'latency_p50_ms': percentile(latencies, 0.5) * 1000,
+        'latency_p99_ms': percentile(latencies, 0.99) * 1000,
+        'latency_max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+    }
+    results.update(placement_quality(
+        scheduler.host_manager.host_state_map.values()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the filter scheduler on a synthetic cloud.')
+    parser.add_argument('--hosts', type=int, default=1000,
+                        help='Number of compute nodes.')
+    parser.add_argument('--aggregates', type=int, default=10,
+                        help='Number of aggregates the hosts are spread '
+                             'across.')
+    parser.add_argument('--requests', type=int, default=500,
+                        help='Number of requests to replay.')
+    parser.add_argument('--instances-per-request', type=int, default=1,
+                        help='Number of instances of each request.')
+    parser.add_argument('--numa-fraction', type=float, default=0.5,
+                        help='Fraction of the hosts with a NUMA topology.')
+    parser.add_argument('--pci-fraction', type=float, default=0.2,
+                        help='Fraction of the hosts with PCI devices.')
+    parser.add_argument('--pci-request-fraction', type=float, default=0.0,
+                        help='Fraction of the requests asking for a PCI '
+                             'device.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the cloud and request generation.')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as JSON.')
+    parser.add_argument('--max-p99', type=float,
+                        help='Fail if the p99 latency, in milliseconds, is '
+                             'higher than this value.')
+    args, conf_args = parser.parse_known_args()
+
+    objects.register_all()
+    CONF(conf_args, project='nova')
+    if args.aggregates < 1:
+        parser.error('--aggregates must be at least 1')
+
+    results = run(args)
+    if args.json:
+        print(jsonutils.dumps(results, indent=2, sort_keys=True))
+    else:
+        for key in sorted(results):
+            print('%-28s %s' % (key, results[key]))
+
+    if args.max_p99 is not None and results['latency_p99_ms'] > args.max_p99:
+        print('p99 latency %.2fms is higher than %.2fms' %
+              (results['latency_p99_ms'], args.max_p99), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())